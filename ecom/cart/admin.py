@@ -1,3 +1,11 @@
 from django.contrib import admin
+from .models import CartItem
 
 # Register your models here.
+
+
+@admin.register(CartItem)
+class CartItemAdmin(admin.ModelAdmin):
+    list_display = ("cart_key", "product", "quantity", "updated_at")
+    search_fields = ("cart_key",)
+    raw_id_fields = ("product",)
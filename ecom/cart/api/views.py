@@ -3,7 +3,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
 from store.models import Product
-from ..cart import Cart
+from ..cart import get_cart
 
 class CartAPIView(APIView):
     """
@@ -14,18 +14,11 @@ class CartAPIView(APIView):
         """
         Get cart summary.
         """
-        cart = Cart(request)
-        cart_products = cart.get_prods()
-        quantities = cart.get_quants()
-        total = cart.car_total()
+        snapshot = get_cart(request).snapshot()
 
         products_data = []
-        for product in cart_products:
-            qty = quantities[str(product.id)]
-            # Fix legacy format if needed
-            if isinstance(qty, dict):
-                qty = qty['quantity']
-            
+        for line in snapshot.lines:
+            product = line.product
             products_data.append({
                 'id': product.id,
                 'name': product.name,
@@ -33,14 +26,14 @@ class CartAPIView(APIView):
                 'sale_price': float(product.sale_price) if product.is_sale else None,
                 'is_sale': product.is_sale,
                 'image': product.image.url if product.image else None,
-                'quantity': qty,
-                'total_price': float((product.sale_price if product.is_sale else product.price) * qty)
+                'quantity': line.quantity,
+                'total_price': float(line.total_price)
             })
 
         return Response({
             'products': products_data,
-            'total': float(total),
-            'count': len(cart_products)
+            'total': float(snapshot.total),
+            'count': len(snapshot.lines)
         })
 
     def post(self, request):
@@ -48,12 +41,14 @@ class CartAPIView(APIView):
         Add product to cart.
         Expected JSON: { "product_id": 1, "quantity": 1 }
         """
-        cart = Cart(request)
+        cart = get_cart(request)
         product_id = request.data.get('product_id')
         quantity = int(request.data.get('quantity', 1))
 
         if not product_id:
             return Response({'error': 'Product ID required'}, status=status.HTTP_400_BAD_REQUEST)
+        if quantity < 1:
+            return Response({'error': 'Quantity must be at least 1'}, status=status.HTTP_400_BAD_REQUEST)
 
         product = get_object_or_404(Product, id=product_id)
         cart.add(product=product, quantity=quantity)
@@ -63,9 +58,10 @@ class CartAPIView(APIView):
     def patch(self, request):
         """
         Update product quantity in cart.
-        Expected JSON: { "product_id": 1, "quantity": 2 }
+        Expected JSON: { "product_id": 1, "quantity": 2 }; a quantity below 1
+        removes the product.
         """
-        cart = Cart(request)
+        cart = get_cart(request)
         product_id = request.data.get('product_id')
         quantity = int(request.data.get('quantity', 1))
 
@@ -83,7 +79,7 @@ class CartAPIView(APIView):
         Remove product from cart.
         Expected JSON: { "product_id": 1 }
         """
-        cart = Cart(request)
+        cart = get_cart(request)
         product_id = request.data.get('product_id')
         
         if not product_id:
@@ -1,130 +1,310 @@
+"""
+Shopping cart backed by the CartItem table.
 
+The cart used to be a dict in the session: every construction ran a
+legacy-format fixup loop over it, every mutation rewrote the whole session,
+and Cart.add also wrote `str(cart)` into the 255-char Profile.old_cart with
+an extra UPDATE per add. Now:
+
+- each line is a CartItem row, so add/update/remove are one statement each
+  (INSERT ... ON CONFLICT, UPDATE, DELETE) and a cart has no size limit,
+- a guest cart is keyed by a random token kept in the session (written once),
+  and is merged into the user's cart when they log in,
+- reads load the cart's lines once per Cart instance, and
+- Profile.old_cart is refreshed by a debounced Celery task
+  (CART_PROFILE_SYNC_DELAY_SECONDS after the first change) instead of on
+  every write.
+
+Rendering a cart page used to build one Cart in the context processor and
+another in the view, and get_prods(), car_total() and __iter__ each ran their
+own product query. get_cart() now returns one Cart per request, and its
+snapshot() loads the products once (PRODUCT_FIELDS only) and prices every
+line and the total in one pass; all of those read from it. A request that
+only needs the total (billing, order placement) gets it from the cart-total
+cache in store/pricing.py without loading products.
+
+Quantities are at least 1: add() ignores anything less, and update() to
+less than 1 removes the line.
+
+`Cart.cart` keeps the old {product id (str): {'quantity': n}} shape for callers.
+"""
+import json
+import logging
+import uuid
+from dataclasses import dataclass
 from decimal import Decimal
-from store.models import Product,Profile
 
-class Cart(): 
-    def __init__(self, request): 
-        self.session = request.session 
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from cart.models import CartItem
+from store import pricing
+from store.models import Product, Profile
+
+logger = logging.getLogger(__name__)
+
+# Session key holding the guest cart token
+CART_SESSION_KEY = 'cart_id'
+# Session key of the pre-CartItem session cart, imported once if present
+LEGACY_SESSION_KEY = 'session_key'
+
+PROFILE_SYNC_PREFIX = 'cart_profile_sync'
+
+# Product fields the cart pages, the cart API and pricing read
+PRODUCT_FIELDS = ('id', 'name', 'description', 'image', 'price', 'is_sale', 'sale_price')
+
+
+@dataclass(frozen=True)
+class CartLine:
+    product: Product
+    quantity: int
+    price: Decimal
+    total_price: Decimal
+
+    def as_dict(self) -> dict:
+        return {'product': self.product, 'quantity': self.quantity,
+                'price': self.price, 'total_price': self.total_price}
+
+
+@dataclass(frozen=True)
+class CartSnapshot:
+    lines: list[CartLine]
+    total: Decimal
+    # Evaluated QuerySet: count(), len() and iteration reuse its results
+    products: QuerySet
+
+
+def get_cart(request) -> 'Cart':
+    """
+    The Cart of this request, created on first use and shared by the context
+    processor, views and API.
+    """
+    # DRF wraps the HttpRequest; memoize on the underlying one
+    http_request = getattr(request, '_request', request)
+    cart = getattr(http_request, '_cart', None)
+    user_id = request.user.id if request.user.is_authenticated else None
+    if cart is None or cart.user_id != user_id:
+        # First use, or the user logged in or out since
+        cart = http_request._cart = Cart(request)
+    return cart
+
+
+def sync_profile_cart(user_id):
+    """
+    Write a user's cart into Profile.old_cart as JSON.
+    """
+    cache.delete(f'{PROFILE_SYNC_PREFIX}:{user_id}')
+    items = CartItem.objects.filter(cart_key=f'user:{user_id}').values_list('product_id', 'quantity')
+    snapshot = json.dumps({str(product_id): {'quantity': quantity} for product_id, quantity in items})
+    Profile.objects.filter(user_id=user_id).update(old_cart=snapshot)
+
+
+def schedule_profile_sync(user_id):
+    """
+    Queue one profile sync per user per CART_PROFILE_SYNC_DELAY_SECONDS,
+    however many cart writes happen in that window.
+    """
+    from cart.tasks import sync_profile_cart_task
+
+    delay = getattr(settings, 'CART_PROFILE_SYNC_DELAY_SECONDS', 30)
+    if cache.add(f'{PROFILE_SYNC_PREFIX}:{user_id}', 1, timeout=delay * 2):
+        transaction.on_commit(lambda: sync_profile_cart_task.apply_async((user_id,), countdown=delay))
+
+
+class Cart():
+    def __init__(self, request):
+        self.session = request.session
         #Get request
         self.request = request
-        cart = self.session.get("session_key")
-        #if the user is new, no session key! create one
-        if 'session_key' not in request.session:
-            cart = self.session["session_key"] = {}
-        #Make sure cart is available on all pages of the site
-        self.cart = cart
-        
-        # Temporary fix for legacy cart data that stored quantity as int directly
-        # checks if key is int and converts to dictionary if so
-        changed = False
-        for key, value in self.cart.items():
-            if isinstance(value, int):
-                self.cart[key] = {'quantity': value}
-                changed = True
-        if changed:
-            self.save()
-    def db_add(self, product, quantity): 
-        product_id = str(product )
-        product_qty = str(quantity)
-        if product_id in self.cart:
-            #self.cart[product_id]['quantity'] += int(product_qty)
-            pass
-        else:
-            self.cart[product_id] = {'quantity': int(product_qty)} 
-        self.save() 
-    
-    
-    def add(self, product, quantity): 
-        product_id = str(product.id)
-        product_qty = str(quantity)
-        if product_id in self.cart:
-            pass
-        else:
-            self.cart[product_id] = {'quantity': int(product_qty)} 
-        self.save() 
-        #Deal with logged in users
-        if self.request.user.is_authenticated:
-            #Get the current user profile
-            current_user = Profile.objects.filter(user__id=self.request.user.id)
-            #Convert
-            cart_user = str(self.cart)
-            cart_user = cart_user.replace("\'", "\"")
-            #Save our carty to the profile model
-            current_user.update(old_cart=str(cart_user))
-            
-           
-    def save(self): 
-        self.session["session_key"] = self.cart
+        self.user_id = request.user.id if request.user.is_authenticated else None
+        self._items = None
+        self._snapshot = None
+
+        if LEGACY_SESSION_KEY in self.session:
+            self._import_legacy_session_cart()
+        if self.user_id is not None and CART_SESSION_KEY in self.session:
+            self._merge_guest_cart()
+
+    @property
+    def key(self):
+        """
+        Storage key of this cart, or None for a guest who has no cart yet.
+        """
+        if self.user_id is not None:
+            return f'user:{self.user_id}'
+        token = self.session.get(CART_SESSION_KEY)
+        return f'guest:{token}' if token else None
+
+    def _key_for_write(self):
+        key = self.key
+        if key is None:
+            self.session[CART_SESSION_KEY] = uuid.uuid4().hex
+            key = self.key
+        return key
+
+    def _import_legacy_session_cart(self):
+        """
+        Carry a pre-CartItem session cart over in one INSERT, dropping lines
+        whose product is gone or that cannot be parsed.
+        """
+        legacy = self.session.pop(LEGACY_SESSION_KEY) or {}
+        quantities = {}
+        for product_id, value in legacy.items():
+            try:
+                quantity = int(value['quantity'] if isinstance(value, dict) else value)
+                quantities[int(product_id)] = quantity
+            except (KeyError, TypeError, ValueError):
+                continue
+        existing = list(Product.objects.filter(
+            id__in=[product_id for product_id, quantity in quantities.items() if quantity >= 1]
+        ).values_list('id', flat=True))
+        if existing:
+            key = self._key_for_write()
+            CartItem.objects.bulk_create(
+                [CartItem(cart_key=key, product_id=product_id, quantity=quantities[product_id]) for product_id in existing],
+                ignore_conflicts=True,
+            )
+            self._items = None
+            self._changed()
+
+    def _merge_guest_cart(self):
+        """
+        Move the lines of the guest cart in the session into the user's cart;
+        guest quantities win, as they are the more recent.
+        """
+        guest_key = f'guest:{self.session.pop(CART_SESSION_KEY)}'
+        with transaction.atomic():
+            guest_items = list(CartItem.objects.filter(cart_key=guest_key).values_list('product_id', 'quantity'))
+            if guest_items:
+                CartItem.objects.bulk_create(
+                    [CartItem(cart_key=self.key, product_id=product_id, quantity=quantity)
+                     for product_id, quantity in guest_items],
+                    update_conflicts=True,
+                    unique_fields=['cart_key', 'product'],
+                    update_fields=['quantity', 'updated_at'],
+                )
+                CartItem.objects.filter(cart_key=guest_key).delete()
+        if guest_items:
+            self._items = None
+            self._changed()
+
+    def _changed(self):
+        self._snapshot = None
+        if self.user_id is not None:
+            schedule_profile_sync(self.user_id)
+
+    @property
+    def cart(self):
+        """
+        {product id (str): {'quantity': n}}, loaded once per Cart and kept in
+        step with this Cart's own writes.
+        """
+        if self._items is None:
+            key = self.key
+            rows = CartItem.objects.filter(cart_key=key).order_by('id').values_list('product_id', 'quantity') if key else []
+            self._items = {str(product_id): {'quantity': quantity} for product_id, quantity in rows}
+        return self._items
+
+    def db_add(self, product, quantity):
+        """
+        Add a product by id; a product already in the cart keeps its quantity,
+        and a quantity below 1 adds nothing.
+        """
+        if int(quantity) < 1:
+            return
+        CartItem.objects.bulk_create(
+            [CartItem(cart_key=self._key_for_write(), product_id=int(product), quantity=int(quantity))],
+            ignore_conflicts=True,
+        )
+        if self._items is not None:
+            self._items.setdefault(str(product), {'quantity': int(quantity)})
+        self._changed()
+
+    def add(self, product, quantity):
+        self.db_add(product.id, quantity)
+
+    def save(self):
+        # Lines are written as they change; kept for callers of the session cart
         self.session.modified = True
-    def remove(self, product): 
-        product_id = str(product.id)
-        if product_id in self.cart: 
-            del self.cart[product_id]
-            self.save()
-    def __iter__(self): 
-        product_ids = self.cart.keys()
-        products = Product.objects.filter(id__in=product_ids)
-        cart = self.cart.copy()
-        for key in cart:
-            cart[key] = cart[key].copy()
-
-        for product in products: 
-            cart[str(product.id)]['product'] = product
-            
-        for item in cart.values(): 
-            # Ensure price is handled correctly from the product object if available
-            if 'product' in item:
-                item['price'] = item['product'].sale_price if item['product'].is_sale else item['product'].price
-            else:
-                item['price'] = Decimal(item.get('price', 0))
-                
-            item['total_price'] = item['price'] * item['quantity']
-            yield item
-    def __len__(self): 
-        #return sum(item['quantity'] for item in self.cart.values())
+
+    def remove(self, product):
+        self._remove_id(product.id)
+
+    def _remove_id(self, product_id):
+        key = self.key
+        if key is not None:
+            CartItem.objects.filter(cart_key=key, product_id=product_id).delete()
+            if self._items is not None:
+                self._items.pop(str(product_id), None)
+            self._changed()
+
+    def snapshot(self) -> CartSnapshot:
+        """
+        Products, line prices and total of the cart, with one product query;
+        rebuilt only after a change.
+        """
+        if self._snapshot is None:
+            quantities = self.cart
+            # Read before the prices, so a concurrent price change wins
+            version = pricing.price_version()
+            products_queryset = Product.objects.only(*PRODUCT_FIELDS).filter(id__in=[int(key) for key in quantities])
+            products = {product.id: product for product in products_queryset}
+            lines = []
+            total = Decimal('0')
+            for key, value in quantities.items():
+                product = products.get(int(key))
+                if product is None:
+                    continue
+                price = pricing.unit_price(product)
+                line = CartLine(product, value['quantity'], price, price * value['quantity'])
+                lines.append(line)
+                total += line.total_price
+            self._snapshot = CartSnapshot(lines, total, products_queryset)
+            if quantities:
+                pricing.remember_cart_total(quantities, total, version)
+        return self._snapshot
+
+    def __iter__(self):
+        for line in self.snapshot().lines:
+            yield line.as_dict()
+
+    def __len__(self):
         return len(self.cart)
+
     def get_prods(self):
-        #Get ids of products in cart
-        product_ids = self.cart.keys()
-        #Use ids to look up products in db
-        products = Product.objects.filter(id__in=product_ids)
-        #Return those looked up products
-        return products
+        return self.snapshot().products
+
     def get_quants(self):
-        quantities = self.cart
-        return quantities
+        return self.cart
+
     def update(self, product, quantity):
         # Handle both Product object and product_id (int/str)
-        if hasattr(product, 'id'):
-            product_id = str(product.id)
-        else:
-            product_id = str(product)
-            
-        product_qty = int(quantity)
-        
-        # Update the quantity in the cart
-        if product_id in self.cart:
-            self.cart[product_id]['quantity'] = product_qty
-            
-        self.save()
-        return self.cart
+        product_id = product.id if hasattr(product, 'id') else int(product)
+        if int(quantity) < 1:
+            self._remove_id(product_id)
+            return
+        key = self.key
+        if key is not None:
+            CartItem.objects.filter(cart_key=key, product_id=product_id).update(
+                quantity=int(quantity), updated_at=timezone.now()
+            )
+            if self._items is not None and str(product_id) in self._items:
+                self._items[str(product_id)]['quantity'] = int(quantity)
+            self._changed()
+
     def car_total(self):
-        # Get products IDs from cart keys
-        product_ids = self.cart.keys()
-        # Use ids to look up products in db
-        products = Product.objects.filter(id__in=product_ids)
-        
-        total = Decimal('0')
-        for product in products:
-            # Session keys are always strings
-            product_id_str = str(product.id)
-            if product_id_str in self.cart:
-                quantity = self.cart[product_id_str]['quantity']
-                # Use sale_price if applicable
-                price = product.sale_price if product.is_sale else product.price
-                total += price * quantity
-        return total
-
-    def clear(self): 
-        del self.session["session_key"]
-        self.session.modified = True  
\ No newline at end of file
+        if self._snapshot is not None:
+            return self._snapshot.total
+        return pricing.cart_total(self.cart)
+
+    def clear(self):
+        key = self.key
+        if key is not None:
+            CartItem.objects.filter(cart_key=key).delete()
+            self._changed()
+        self._items = {}
+        self.session.pop(CART_SESSION_KEY, None)
+        self.session.modified = True
@@ -1,8 +1,8 @@
-from .cart import Cart
+from .cart import get_cart
 
 # Create context processor so our Cart can work on all pages of the site
 # This will make the cart available to all templates
 # This is a function that returns a dictionary
 def cart(request):
     # Return the cart object
-    return {'cart': Cart(request)}
\ No newline at end of file
+    return {'cart': get_cart(request)}
\ No newline at end of file
@@ -0,0 +1,51 @@
+import json
+
+from django.db import migrations
+
+
+def import_profile_carts(apps, schema_editor):
+    """
+    Carry the carts saved in Profile.old_cart over to CartItem rows.
+    """
+    Profile = apps.get_model('store', 'Profile')
+    Product = apps.get_model('store', 'Product')
+    CartItem = apps.get_model('cart', 'CartItem')
+
+    items = []
+    for user_id, old_cart in Profile.objects.exclude(old_cart=None).exclude(old_cart='').values_list('user_id', 'old_cart'):
+        try:
+            saved = json.loads(old_cart)
+        except ValueError:
+            # Truncated at the old 255-char limit
+            continue
+        if not isinstance(saved, dict):
+            continue
+        for product_id, value in saved.items():
+            # Same filters as Cart._import_legacy_session_cart: the old cart_add
+            # accepted any quantity, and CartItem lines hold at least 1
+            try:
+                quantity = int(value['quantity'] if isinstance(value, dict) else value)
+                product_id = int(product_id)
+            except (KeyError, TypeError, ValueError):
+                continue
+            if quantity >= 1:
+                items.append((user_id, product_id, quantity))
+
+    existing = set(Product.objects.filter(id__in={p for _, p, _ in items}).values_list('id', flat=True))
+    CartItem.objects.bulk_create(
+        [CartItem(cart_key=f'user:{user_id}', product_id=product_id, quantity=quantity)
+         for user_id, product_id, quantity in items if product_id in existing],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(import_profile_carts, migrations.RunPython.noop),
+    ]
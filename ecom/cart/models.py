@@ -1,3 +1,25 @@
 from django.db import models
 
 # Create your models here.
+
+
+class CartItem(models.Model):
+    """
+    One product line of a shopping cart (see cart/cart.py).
+
+    Carts are identified by `cart_key`: 'user:<id>' for logged-in users and
+    'guest:<token>' for anonymous visitors, whose token lives in the session.
+    """
+    cart_key = models.CharField(max_length=64)
+    product = models.ForeignKey('store.Product', on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart_key', 'product'], name='unique_cart_product'),
+        ]
+
+    def __str__(self):
+        return f'{self.cart_key}: {self.quantity} x {self.product_id}'
@@ -0,0 +1,15 @@
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def sync_profile_cart_task(user_id):
+    """
+    Copy a user's cart into Profile.old_cart (see cart/cart.py).
+    """
+    from cart.cart import sync_profile_cart
+
+    sync_profile_cart(user_id)
+    return f"Synced cart of user {user_id}"
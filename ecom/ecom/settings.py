@@ -140,6 +140,17 @@ DATABASES = {
     }
 }
 
+# Shared cache. With REDIS_CACHE_URL set (e.g. redis://redis:6379/1) cached results,
+# singleflight refresh locks and query embeddings are shared by every process;
+# otherwise Django's per-process local-memory cache is used.
+if os.getenv('REDIS_CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_CACHE_URL'),
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -180,3 +191,102 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+
+# pgvector ANN search
+# Index type on recommendations_book.embedding ('hnsw' or 'ivfflat', see `manage.py rebuild_vector_index`)
+# and the recall/latency knob applied per query with SET LOCAL. Migrations declare the index as HNSW;
+# 'ivfflat' only matches after a `rebuild_vector_index --type ivfflat`.
+PGVECTOR_INDEX_TYPE = os.getenv('PGVECTOR_INDEX_TYPE', 'hnsw')
+PGVECTOR_HNSW_EF_SEARCH = int(os.getenv('PGVECTOR_HNSW_EF_SEARCH', '40'))
+PGVECTOR_IVFFLAT_PROBES = int(os.getenv('PGVECTOR_IVFFLAT_PROBES', '10'))
+
+# Similarity search backend for recommendations: 'pgvector' (Postgres) or 'memory'
+# (in-process NumPy index, see recommendations/memory_index.py)
+RECOMMENDATIONS_VECTOR_BACKEND = os.getenv('RECOMMENDATIONS_VECTOR_BACKEND', 'pgvector')
+# How often each process checks whether its in-memory index needs reloading
+RECOMMENDATIONS_MEMORY_INDEX_REFRESH_SECONDS = int(os.getenv('RECOMMENDATIONS_MEMORY_INDEX_REFRESH_SECONDS', '10'))
+
+# Query embedding cache (recommendations/embedding_cache.py): per-process LRU size
+# and TTL of the float32 vectors stored in the shared Django cache
+RECOMMENDATIONS_QUERY_EMBEDDING_LRU_SIZE = int(os.getenv('RECOMMENDATIONS_QUERY_EMBEDDING_LRU_SIZE', '2048'))
+RECOMMENDATIONS_QUERY_EMBEDDING_CACHE_TTL = int(os.getenv('RECOMMENDATIONS_QUERY_EMBEDDING_CACHE_TTL', str(60 * 60 * 24)))
+
+# Cross-encoder reranking (recommendations/reranking.py): how many vector search
+# candidates are scored, how long concurrent requests wait to share a predict() batch,
+# how long a request waits for its batch's scores before giving up, and how long
+# (query, book) scores stay cached
+RECOMMENDATIONS_RERANK_CANDIDATES = int(os.getenv('RECOMMENDATIONS_RERANK_CANDIDATES', '20'))
+RECOMMENDATIONS_RERANK_BATCH_WAIT_MS = float(os.getenv('RECOMMENDATIONS_RERANK_BATCH_WAIT_MS', '5'))
+RECOMMENDATIONS_RERANK_MAX_BATCH_PAIRS = int(os.getenv('RECOMMENDATIONS_RERANK_MAX_BATCH_PAIRS', '256'))
+RECOMMENDATIONS_RERANK_TIMEOUT_SECONDS = float(os.getenv('RECOMMENDATIONS_RERANK_TIMEOUT_SECONDS', '30'))
+RECOMMENDATIONS_RERANK_SCORE_CACHE_TTL = int(os.getenv('RECOMMENDATIONS_RERANK_SCORE_CACHE_TTL', str(60 * 60 * 24)))
+
+# Generate recommendation reasons in a Celery job instead of inside the request
+# (recommendations/reasons.py). Placeholder results are cached for
+# RECOMMENDATIONS_REASONS_PLACEHOLDER_TTL seconds while the job runs.
+RECOMMENDATIONS_ASYNC_REASONS = os.getenv('RECOMMENDATIONS_ASYNC_REASONS', 'False') == 'True'
+RECOMMENDATIONS_REASONS_PLACEHOLDER_TTL = int(os.getenv('RECOMMENDATIONS_REASONS_PLACEHOLDER_TTL', '120'))
+RECOMMENDATIONS_REASONS_CACHE_TTL = int(os.getenv('RECOMMENDATIONS_REASONS_CACHE_TTL', '3600'))
+
+# Ollama (recommendations/llm.py): server, models per use, per-model cap on
+# in-flight generations, how long to wait for a free slot and per-call HTTP timeout
+OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
+OLLAMA_CHAT_MODEL = os.getenv('OLLAMA_CHAT_MODEL', 'deepseek-r1:1.5b')
+OLLAMA_REASONS_MODEL = os.getenv('OLLAMA_REASONS_MODEL', 'deepseek-coder:1.3b')
+OLLAMA_CATEGORIZER_MODEL = os.getenv('OLLAMA_CATEGORIZER_MODEL', 'llama3.1:8b')
+OLLAMA_MAX_CONCURRENCY = int(os.getenv('OLLAMA_MAX_CONCURRENCY', '4'))
+OLLAMA_QUEUE_TIMEOUT_SECONDS = float(os.getenv('OLLAMA_QUEUE_TIMEOUT_SECONDS', '30'))
+OLLAMA_TIMEOUT_SECONDS = float(os.getenv('OLLAMA_TIMEOUT_SECONDS', '120'))
+
+# Query understanding (recommendations/query_understanding.py): threads running HyDE
+# and expansion concurrently, how long a request waits for them, and how long
+# their outputs are cached per normalised query
+RECOMMENDATIONS_QUERY_UNDERSTANDING_WORKERS = int(os.getenv('RECOMMENDATIONS_QUERY_UNDERSTANDING_WORKERS', '8'))
+RECOMMENDATIONS_QUERY_UNDERSTANDING_TIMEOUT = float(os.getenv('RECOMMENDATIONS_QUERY_UNDERSTANDING_TIMEOUT', '60'))
+RECOMMENDATIONS_QUERY_UNDERSTANDING_TTL = int(os.getenv('RECOMMENDATIONS_QUERY_UNDERSTANDING_TTL', str(60 * 60 * 24)))
+
+# Recommendation cache stampede protection (recommendations/singleflight.py): how long
+# an expired result may still be served while one worker refreshes it, the refresh
+# lock lease, and how long a request with nothing cached waits for that worker
+RECOMMENDATIONS_CACHE_STALE_SECONDS = int(os.getenv('RECOMMENDATIONS_CACHE_STALE_SECONDS', '600'))
+RECOMMENDATIONS_SINGLEFLIGHT_LEASE_SECONDS = int(os.getenv('RECOMMENDATIONS_SINGLEFLIGHT_LEASE_SECONDS', '30'))
+RECOMMENDATIONS_SINGLEFLIGHT_WAIT_SECONDS = float(os.getenv('RECOMMENDATIONS_SINGLEFLIGHT_WAIT_SECONDS', '30'))
+
+# User taste profiles (recommendations/taste_profile.py): purchase half-life in days
+# for the recency-weighted mean (0 = plain mean), and how many nearest books per
+# wanted candidate the ANN scan reads before purchased/unlisted books are dropped
+RECOMMENDATIONS_TASTE_HALF_LIFE_DAYS = float(os.getenv('RECOMMENDATIONS_TASTE_HALF_LIFE_DAYS', '0'))
+RECOMMENDATIONS_TASTE_CANDIDATE_OVERFETCH = int(os.getenv('RECOMMENDATIONS_TASTE_CANDIDATE_OVERFETCH', '3'))
+
+# Embedding versions (recommendations/embedding_versions.py): how often each process
+# re-reads which version is active after activate_embedding_version switches it
+RECOMMENDATIONS_EMBEDDING_VERSION_CHECK_SECONDS = int(os.getenv('RECOMMENDATIONS_EMBEDDING_VERSION_CHECK_SECONDS', '10'))
+
+# Product enrichment (store/enrichment.py, store/http_client.py): parallel fetches per
+# job, requests per second allowed to each external host, and retry policy for
+# connection errors / 429 / 5xx (exponential backoff from BACKOFF_SECONDS)
+STORE_ENRICHMENT_WORKERS = int(os.getenv('STORE_ENRICHMENT_WORKERS', '8'))
+STORE_ENRICHMENT_RATE_PER_HOST = float(os.getenv('STORE_ENRICHMENT_RATE_PER_HOST', '4'))
+STORE_ENRICHMENT_MAX_RETRIES = int(os.getenv('STORE_ENRICHMENT_MAX_RETRIES', '3'))
+STORE_ENRICHMENT_BACKOFF_SECONDS = float(os.getenv('STORE_ENRICHMENT_BACKOFF_SECONDS', '0.5'))
+STORE_ENRICHMENT_TIMEOUT = float(os.getenv('STORE_ENRICHMENT_TIMEOUT', '15'))
+
+# External metadata response cache (store/response_cache.py): how long Google Books /
+# Azacán search and detail responses are reused before revalidation, and how long
+# misses (unknown ISBN/reference, 404) are remembered
+STORE_EXTERNAL_CACHE_TTL = int(os.getenv('STORE_EXTERNAL_CACHE_TTL', str(60 * 60 * 24 * 7)))
+STORE_EXTERNAL_CACHE_NEGATIVE_TTL = int(os.getenv('STORE_EXTERNAL_CACHE_NEGATIVE_TTL', str(60 * 60 * 24)))
+
+# Product categorization (store/categorization.py): embedding-classifier margin (best
+# minus second-best centroid similarity) above which the LLM is not asked, and how
+# many ambiguous products share one LLM prompt
+CATEGORIZER_MIN_MARGIN = float(os.getenv('CATEGORIZER_MIN_MARGIN', '0.05'))
+CATEGORIZER_LLM_BATCH_SIZE = int(os.getenv('CATEGORIZER_LLM_BATCH_SIZE', '10'))
+
+# Shopping cart (cart/cart.py): carts live in the CartItem table; Profile.old_cart is
+# refreshed by a Celery task this many seconds after the first change in a burst
+CART_PROFILE_SYNC_DELAY_SECONDS = int(os.getenv('CART_PROFILE_SYNC_DELAY_SECONDS', '30'))
+
+# Pricing (store/pricing.py): how long effective product prices and cart totals stay
+# cached; a Product save bumps the catalog price version and invalidates them sooner
+CART_PRICING_CACHE_TTL = int(os.getenv('CART_PRICING_CACHE_TTL', str(60 * 60)))
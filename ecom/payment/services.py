@@ -0,0 +1,167 @@
+"""
+Order placement.
+
+process_order used to only clear the session: no Order, no OrderItem, no
+stock movement, and the recommender never heard of the purchase.
+place_order() records an order in one transaction:
+
+1. the Books backing the ordered products (matched by reference; Book.stock
+   is the catalog's stock) are locked with one SELECT ... FOR UPDATE, in id
+   order so concurrent checkouts cannot deadlock,
+2. stock is checked for every line and decremented with one UPDATE,
+3. the Order and all its OrderItems are written with create + bulk_create,
+   priced from the product rows read in the same transaction, and
+4. Purchase rows for the buyer are bulk-created; their taste profile is
+   rebuilt once, and the confirmation email queued on Celery
+   (store.tasks.send_email_task), after the transaction commits. Those
+   callbacks are robust: a failure is logged and never fails the checkout
+   of an order that is already committed.
+
+Several products can share a reference (and so a Book): their quantities are
+added up before the stock check. Products without a Book, or whose Book has
+no stock figure, are not stock-tracked.
+"""
+import logging
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, When
+
+from payment.models import Order, OrderItem
+from recommendations.models import Book, Purchase
+from store.models import Product
+from store.pricing import unit_price
+
+logger = logging.getLogger(__name__)
+
+
+class OrderError(Exception):
+    """
+    An order that cannot be placed.
+    """
+
+
+class OutOfStock(OrderError):
+    def __init__(self, shortages: dict):
+        # {book id: (units ordered across the cart, units available)}
+        self.shortages = shortages
+        super().__init__("Not enough stock: " + ', '.join(
+            f"book {book_id} ({requested} ordered, {available} available)"
+            for book_id, (requested, available) in shortages.items()
+        ))
+
+
+@dataclass(frozen=True)
+class ShippingDetails:
+    full_name: str
+    email: str
+    address: str
+
+
+def _send_confirmation(order: Order, lines):
+    from store.tasks import send_email_task
+
+    items = "\n".join(f"- {quantity} x {product.name}: {price * quantity}€" for product, quantity, price in lines)
+    send_email_task.delay(
+        f"Order #{order.id} confirmed",
+        f"Hello {order.full_name},\n\nThank you for your order.\n\n{items}\n\nTotal: {order.amount_paid}€\n",
+        [order.email],
+    )
+
+
+def place_order(user, shipping: ShippingDetails, quantities: dict) -> Order:
+    """
+    Record an order for a cart and reserve its stock.
+
+    Args:
+        user: Buyer, or None for a guest checkout
+        shipping (ShippingDetails): Name, email and address for the order
+        quantities (dict): {product id: quantity or {'quantity': n}}, e.g. Cart.cart
+
+    Returns:
+        Order
+
+    Raises:
+        OrderError: The cart is empty, names unknown products or has a quantity below 1
+        OutOfStock: The lines of a Book ask for more than it has in stock (nothing is written)
+    """
+    quantities = {
+        int(product_id): int(value['quantity'] if isinstance(value, dict) else value)
+        for product_id, value in quantities.items()
+    }
+    if not quantities:
+        raise OrderError("The cart is empty")
+    invalid = [product_id for product_id, quantity in quantities.items() if quantity < 1]
+    if invalid:
+        raise OrderError(f"Invalid quantity for product(s) {', '.join(str(p) for p in invalid)}")
+    user_id = user.id if user is not None and user.is_authenticated else None
+
+    with transaction.atomic():
+        products = Product.objects.only('id', 'name', 'price', 'is_sale', 'sale_price', 'reference').in_bulk(quantities)
+        if len(products) != len(quantities):
+            raise OrderError(f"Unknown product(s) {', '.join(str(p) for p in quantities.keys() - products.keys())}")
+
+        references = {product.reference for product in products.values() if product.reference}
+        books = {
+            book.reference: book
+            for book in Book.objects.select_for_update().filter(reference__in=references)
+            .order_by('id').only('id', 'reference', 'stock')
+        } if references else {}
+        stocked = {
+            product_id: books[product.reference] for product_id, product in products.items()
+            if product.reference in books
+        }
+
+        # Units per Book: products sharing a reference draw on the same stock
+        ordered = {}
+        for product_id, book in stocked.items():
+            ordered[book.id] = ordered.get(book.id, 0) + quantities[product_id]
+        books_by_id = {book.id: book for book in stocked.values()}
+
+        shortages = {
+            book_id: (quantity, books_by_id[book_id].stock) for book_id, quantity in ordered.items()
+            if books_by_id[book_id].stock is not None and books_by_id[book_id].stock < quantity
+        }
+        if shortages:
+            raise OutOfStock(shortages)
+
+        decrements = {
+            book_id: quantity for book_id, quantity in ordered.items() if books_by_id[book_id].stock is not None
+        }
+        if decrements:
+            Book.objects.filter(id__in=decrements).update(stock=Case(
+                *[When(id=book_id, then=F('stock') - quantity) for book_id, quantity in decrements.items()],
+                output_field=IntegerField(),
+            ))
+
+        lines = [(products[product_id], quantity, unit_price(products[product_id]))
+                 for product_id, quantity in quantities.items()]
+        order = Order.objects.create(
+            user_id=user_id,
+            full_name=shipping.full_name,
+            email=shipping.email,
+            shipping_address=shipping.address,
+            amount_paid=sum((price * quantity for _, quantity, price in lines), Decimal('0')),
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, user_id=user_id, quantity=quantity, price=price)
+            for product, quantity, price in lines
+        ])
+
+        if user_id is not None and stocked:
+            # bulk_create sends no post_save: rebuild the profile once for the whole order
+            Purchase.objects.bulk_create([Purchase(user_id=user_id, book_id=book_id) for book_id in books_by_id])
+            transaction.on_commit(lambda: _rebuild_taste_profile(user_id), robust=True)
+
+        if shipping.email:
+            transaction.on_commit(lambda: _send_confirmation(order, lines), robust=True)
+
+    logger.info(f"Placed order {order.id}: {len(lines)} line(s), {order.amount_paid}€")
+    return order
+
+
+def _rebuild_taste_profile(user_id):
+    from recommendations.taste_profile import rebuild_taste_profile
+
+    rebuild_taste_profile(user_id)
@@ -1,3 +1,169 @@
-from django.test import TestCase
+import logging
+import threading
+import time
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from payment.models import Order, OrderItem
+from payment.services import OrderError, OutOfStock, ShippingDetails, place_order
+from recommendations.models import Book, Purchase
+from store.models import Category, Product
 
 # Create your tests here.
+
+logger = logging.getLogger(__name__)
+
+SHIPPING = ShippingDetails(full_name='Ana Buyer', email='ana@example.com', address='Calle Mayor 1\nMadrid')
+
+
+def create_catalog(stock):
+    """A hot product backed by a stocked Book, plus a product with no Book."""
+    category = Category.objects.create(name='Libros')
+    with patch('recommendations.signals.generate_embeddings_task'):
+        book = Book.objects.create(title='Hot', reference='HOT1', stock=stock)
+    hot = Product.objects.create(name='Hot', reference='HOT1', price=Decimal('10.00'), category=category)
+    untracked = Product.objects.create(
+        name='Untracked', price=Decimal('8.00'), is_sale=True, sale_price=Decimal('6.00'), category=category
+    )
+    return book, hot, untracked
+
+
+class PlaceOrderTestCase(TestCase):
+    """Test cases for transactional order placement (payment/services.py)"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='testpass123')
+        self.book, self.hot, self.untracked = create_catalog(stock=5)
+
+    def test_order_items_stock_and_purchases_written_in_bulk(self):
+        """One order writes its items, stock and purchases with a fixed number of queries"""
+        with patch('store.tasks.send_email_task.delay') as mock_email, \
+                patch('recommendations.taste_profile.rebuild_taste_profile') as mock_rebuild, \
+                self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(8):
+                order = place_order(self.user, SHIPPING, {
+                    str(self.hot.id): {'quantity': 2}, str(self.untracked.id): {'quantity': 3},
+                })
+
+        self.assertEqual(order.amount_paid, Decimal('38.00'))
+        self.assertEqual(
+            sorted(OrderItem.objects.filter(order=order).values_list('product_id', 'quantity', 'price')),
+            sorted([(self.hot.id, 2, Decimal('10.00')), (self.untracked.id, 3, Decimal('6.00'))]),
+        )
+        self.assertEqual(Book.objects.get(id=self.book.id).stock, 3)
+        self.assertEqual(list(Purchase.objects.filter(user=self.user).values_list('book_id', flat=True)), [self.book.id])
+        mock_rebuild.assert_called_once_with(self.user.id)
+        self.assertEqual(mock_email.call_args.args[2], ['ana@example.com'])
+
+    def test_out_of_stock_writes_nothing(self):
+        """A line asking for more than the stock rejects the whole order"""
+        with self.assertRaises(OutOfStock) as raised:
+            place_order(self.user, SHIPPING, {self.hot.id: 6, self.untracked.id: 1})
+
+        self.assertEqual(raised.exception.shortages, {self.book.id: (6, 5)})
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Book.objects.get(id=self.book.id).stock, 5)
+
+    def test_products_sharing_a_reference_share_its_stock(self):
+        """Lines backed by the same Book are added up for the stock check and decrement"""
+        twin = Product.objects.create(
+            name='Hot (other edition)', reference='HOT1', price=Decimal('11.00'), category=self.hot.category
+        )
+        with self.assertRaises(OutOfStock) as raised:
+            place_order(self.user, SHIPPING, {self.hot.id: 3, twin.id: 3})
+        self.assertEqual(raised.exception.shortages, {self.book.id: (6, 5)})
+        self.assertEqual(Book.objects.get(id=self.book.id).stock, 5)
+
+        with patch('store.tasks.send_email_task.delay'):
+            place_order(self.user, SHIPPING, {self.hot.id: 2, twin.id: 2})
+        self.assertEqual(Book.objects.get(id=self.book.id).stock, 1)
+        self.assertEqual(Purchase.objects.filter(user=self.user, book=self.book).count(), 1)
+
+    def test_empty_cart_is_rejected(self):
+        with self.assertRaises(OrderError):
+            place_order(self.user, SHIPPING, {})
+
+    def test_quantities_below_one_are_rejected(self):
+        for quantity in (0, -2):
+            with self.assertRaises(OrderError):
+                place_order(self.user, SHIPPING, {self.hot.id: quantity})
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Book.objects.get(id=self.book.id).stock, 5)
+
+    def test_failures_after_commit_do_not_fail_checkout(self):
+        """A broker or profile error after commit is logged; the order stands"""
+        with patch('store.tasks.send_email_task.delay', side_effect=ConnectionError('broker down')), \
+                patch('recommendations.taste_profile.rebuild_taste_profile', side_effect=RuntimeError('boom')), \
+                self.assertLogs('django.test', level='ERROR') as logs, \
+                self.captureOnCommitCallbacks(execute=True):
+            order = place_order(self.user, SHIPPING, {self.hot.id: 1})
+
+        self.assertTrue(Order.objects.filter(id=order.id).exists())
+        self.assertEqual(len(logs.records), 2)
+
+    def test_process_order_view_places_order_and_clears_cart(self):
+        """Checkout persists the order from the cart and empties it"""
+        from cart.cart import Cart
+
+        self.client.login(username='buyer', password='testpass123')
+        Cart(self.client.get('/').wsgi_request).add(product=self.hot, quantity=1)
+        self.client.post('/payment/billing_info', {
+            'shipping_full_name': 'Ana Buyer', 'shipping_email': 'ana@example.com',
+            'shipping_address1': 'Calle Mayor 1', 'shipping_city': 'Madrid',
+        })
+
+        with patch('store.tasks.send_email_task.delay'):
+            response = self.client.post('/payment/process_order', {'card': 'x'})
+
+        self.assertRedirects(response, '/payment/payment_success', fetch_redirect_response=False)
+        order = Order.objects.get(user=self.user)
+        self.assertEqual((order.full_name, order.shipping_address), ('Ana Buyer', 'Calle Mayor 1\nMadrid'))
+        self.assertEqual(len(Cart(self.client.get('/').wsgi_request)), 0)
+
+
+class ConcurrentCheckoutTestCase(TransactionTestCase):
+    """Throughput and correctness of concurrent checkouts on one hot SKU"""
+
+    def test_hot_sku_never_oversells(self):
+        """Concurrent buyers of the same product sell exactly the stock, no more"""
+        stock, buyers, attempts = 20, 8, 5
+        book, hot, _ = create_catalog(stock=stock)
+        users = [User.objects.create_user(username=f'buyer{i}') for i in range(buyers)]
+        placed = []
+        rejected = []
+        errors = []
+
+        def checkout(user):
+            try:
+                for _ in range(attempts):
+                    try:
+                        placed.append(place_order(user, SHIPPING, {hot.id: 1}).id)
+                    except OutOfStock:
+                        rejected.append(user.id)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        with patch('store.tasks.send_email_task.delay'), \
+                patch('recommendations.taste_profile.rebuild_taste_profile'):
+            start = time.perf_counter()
+            threads = [threading.Thread(target=checkout, args=(user,)) for user in users]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(placed), stock)
+        self.assertEqual(len(rejected), buyers * attempts - stock)
+        self.assertEqual(Book.objects.get(id=book.id).stock, 0)
+        self.assertEqual(OrderItem.objects.filter(product=hot).count(), stock)
+        self.assertEqual(Purchase.objects.count(), stock)
+        logger.info(f"{buyers * attempts} concurrent checkouts on one SKU in {elapsed:.2f}s "
+                    f"({buyers * attempts / elapsed:.0f} checkouts/sec)")
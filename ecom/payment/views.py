@@ -1,15 +1,35 @@
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from cart.cart import Cart
+from cart.cart import get_cart
 from .forms import ShippingForm
 from .models import ShippingAddress
+from .services import OrderError, OutOfStock, ShippingDetails, place_order
+
+# ShippingForm fields that make up the order's shipping address, in order
+ADDRESS_FIELDS = ('shipping_address1', 'shipping_address2', 'shipping_city', 'shipping_state',
+                  'shipping_pincode', 'shipping_country')
+
+
+def _shipping_details(my_shipping):
+    """
+    ShippingDetails from the shipping form data kept in the session (a
+    QueryDict, whose values come back as lists once the session is reloaded).
+    """
+    def field(name):
+        value = (my_shipping or {}).get(name) or ''
+        return value[-1] if isinstance(value, list) else value
+
+    return ShippingDetails(
+        full_name=field('shipping_full_name'),
+        email=field('shipping_email'),
+        address='\n'.join(field(name) for name in ADDRESS_FIELDS if field(name)),
+    )
 
 def checkout(request):
     # Get the cart
-    cart = Cart(request)
-    cart_products = cart.get_prods()
-    quantities = cart.get_quants()
-    totals = cart.car_total()
+    cart = get_cart(request)
+    # The page lists the items too: price them and the total in one pass
+    totals = cart.snapshot().total
 
     if request.user.is_authenticated:
         # Checkout as logged in user
@@ -28,9 +48,7 @@ def checkout(request):
 def billing_info(request):
     if request.POST:
         # Get the cart
-        cart = Cart(request)
-        cart_products = cart.get_prods()
-        quantities = cart.get_quants()
+        cart = get_cart(request)
         totals = cart.car_total()
 
         # Create a session with Shipping Info
@@ -55,24 +73,26 @@ def billing_info(request):
 def process_order(request):
     if request.POST:
         # Get the cart
-        cart = Cart(request)
-        cart_products = cart.get_prods()
-        quantities = cart.get_quants()
-        totals = cart.car_total()
+        cart = get_cart(request)
 
         # Get Billing Info from the last page
         payment_form = request.POST
         # Get Shipping Info from session
         my_shipping = request.session.get('my_shipping')
 
-        # Create Order
-        # This is a simplified version, usually you'd create Order and OrderItem models here
-        # and integrate with a payment gateway like Stripe or PayPal.
-        
+        # Create the Order, its items and the purchases, and reserve stock
+        # (payment/services.py). No payment gateway is integrated yet.
+        try:
+            place_order(request.user, _shipping_details(my_shipping), cart.cart)
+        except OutOfStock:
+            messages.error(request, "Some items in your cart are no longer in stock.")
+            return redirect('cart_summary')
+        except OrderError as e:
+            messages.error(request, str(e))
+            return redirect('cart_summary')
+
         # After successful "payment"
-        for key in list(request.session.keys()):
-            if key == "session_key":
-                del request.session[key]
+        cart.clear()
         
         # Also clear my_shipping session
         if 'my_shipping' in request.session:
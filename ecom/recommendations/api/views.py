@@ -4,7 +4,11 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from ..models import Book
 from .serializers import BookSerializer, RecommendationFeedbackSerializer
-from ..rag import get_recommendations, get_recommendations_by_book_title, get_recommendations_by_query, get_recommendations_by_query_stream
+from ..rag import (
+    get_recommendations, get_recommendations_by_book_title, get_recommendations_by_query, get_recommendations_by_query_stream,
+    get_recommendations_cache_key, get_title_recommendations_cache_key, get_query_recommendations_cache_key,
+)
+from ..reasons import get_reasons_job, get_reasons_job_id
 from django.http import StreamingHttpResponse
 
 class BookViewSet(viewsets.ModelViewSet):
@@ -31,7 +35,10 @@ def recommend_by_user(request):
     
     top_k = int(request.data.get('top_k', 3))
     recommendations = get_recommendations(user_id, top_k=top_k)
-    return Response({"recommendations": recommendations})
+    return Response({
+        "recommendations": recommendations,
+        "reasons_job_id": get_reasons_job_id(get_recommendations_cache_key(user_id, top_k)),
+    })
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -45,7 +52,10 @@ def recommend_by_title(request):
     
     top_k = int(request.data.get('top_k', 5))
     recommendations = get_recommendations_by_book_title(title, top_k=top_k)
-    return Response({"recommendations": recommendations})
+    return Response({
+        "recommendations": recommendations,
+        "reasons_job_id": get_reasons_job_id(get_title_recommendations_cache_key(title, top_k)),
+    })
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -59,7 +69,10 @@ def recommend_by_query(request):
     
     top_k = int(request.data.get('top_k', 5))
     recommendations = get_recommendations_by_query(query, top_k=top_k)
-    return Response({"recommendations": recommendations})
+    return Response({
+        "recommendations": recommendations,
+        "reasons_job_id": get_reasons_job_id(get_query_recommendations_cache_key(query, top_k)),
+    })
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -78,6 +91,18 @@ def recommend_by_query_stream(request):
         content_type='text/plain'
     )
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def recommendation_reasons(request, job_id):
+    """
+    Poll a deferred reasons job returned as `reasons_job_id` by the recommend endpoints.
+    `result` is the list of reasons (user/query) or the HTML write-up (title) once status is "done".
+    """
+    job = get_reasons_job(job_id)
+    if job is None:
+        return Response({"error": "Unknown or expired job"}, status=status.HTTP_404_NOT_FOUND)
+    return Response({"job_id": job_id, **job})
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def submit_feedback(request):
@@ -0,0 +1,49 @@
+"""
+Small helpers shared by the vector search benchmark commands.
+"""
+import numpy as np
+
+
+def latency_summary(samples_ms) -> dict:
+    """
+    Summarise latency samples (milliseconds) as mean/p50/p99.
+    """
+    if not len(samples_ms):
+        return {'mean': 0.0, 'p50': 0.0, 'p99': 0.0}
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        'mean': float(samples.mean()),
+        'p50': float(np.percentile(samples, 50)),
+        'p99': float(np.percentile(samples, 99)),
+    }
+
+
+def recall_at_k(approx_ids, exact_ids, k: int) -> float:
+    """
+    Fraction of the exact top-k neighbours that the approximate search returned.
+    """
+    if k <= 0:
+        return 0.0
+    return len(set(approx_ids[:k]) & set(exact_ids[:k])) / k
+
+
+def cluster_centres(dimensions: int = 384, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """
+    Random cluster centres for synthetic_embeddings().
+    """
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((clusters, dimensions)).astype(np.float32)
+
+
+def synthetic_embeddings(n: int, centres: np.ndarray, seed: int = 0) -> np.ndarray:
+    """
+    Generate n unit-normalised float32 vectors scattered around the given
+    centres, which is closer to real sentence embeddings than uniform noise.
+    Call it in chunks (with different seeds) for large catalogs.
+    """
+    rng = np.random.default_rng(seed)
+    assignments = rng.integers(0, len(centres), size=n)
+    noise = rng.standard_normal((n, centres.shape[1])).astype(np.float32)
+    vectors = centres[assignments] + 0.35 * noise
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
@@ -0,0 +1,244 @@
+"""
+Zero-shot genre classifier: nearest category centroid in embedding space.
+
+Each category in CATEGORIES is embedded once (its name and a short
+description, averaged) with the active embedding version's model and query
+template, i.e. in the same space as Book.embedding; an item is assigned the
+category whose centroid is most similar to its own embedding. The gap
+between the best and second-best similarity (`margin`) says how clear-cut
+that is, so callers can send only ambiguous items to an LLM.
+
+The centroid matrix is cached per process and in the shared cache, keyed by
+the model, the templates and the descriptions, so it is computed once per
+embedding version. Classifying is then one matrix product:
+
+- classify_embeddings() for any (n, dims) matrix,
+- classify_books() / classify_products() for model instances, using the
+  stored Book embeddings and only encoding items that have none, and
+- classify_catalog() for every embedded Book in a single pass over the
+  in-memory index matrix (or one loaded for the purpose).
+"""
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_DESCRIPTIONS = {
+    "Fiction": "Literary and general fiction: novels and short stories about characters and their lives.",
+    "Non-Fiction": "General non-fiction: essays, reference works and factual books on many subjects.",
+    "Mystery & Thriller": "Crime, detective, mystery, suspense and thriller novels.",
+    "Science Fiction & Fantasy": "Science fiction, fantasy, space, magic, dragons and imagined worlds.",
+    "Romance": "Romance novels and love stories.",
+    "History": "History books about past eras, wars, civilizations and historical events.",
+    "Biography & Memoir": "Biographies, autobiographies, memoirs and diaries of real people.",
+    "Business & Economics": "Business, management, finance, investing, marketing and economics.",
+    "Self-Help": "Self-help, personal development, motivation, habits and psychology for everyday life.",
+    "Science & Nature": "Popular science, physics, biology, mathematics, animals, nature and the environment.",
+    "Children's Books": "Children's and young readers' books: picture books, stories and tales for kids.",
+    "Poetry": "Poetry collections and poems.",
+    "Art & Photography": "Art, painting, architecture, design and photography books.",
+    "Travel": "Travel guides, travel writing and books about places and countries.",
+    "Religion & Spirituality": "Religion, theology, spirituality, faith and mysticism.",
+    "Cooking & Food": "Cookbooks, recipes, cooking, gastronomy and food and drink.",
+    "Health & Wellness": "Health, medicine, fitness, nutrition and wellbeing.",
+    "Computers & Technology": "Computers, programming, software, the internet and technology.",
+    "Politics & Social Sciences": "Politics, sociology, philosophy, law, anthropology and society.",
+}
+CATEGORIES = list(CATEGORY_DESCRIPTIONS)
+
+
+@dataclass(frozen=True)
+class Prediction:
+    category: str
+    score: float
+    margin: float
+
+
+CENTROID_CACHE_PREFIX = 'category_centroids'
+
+_centroids = {}
+_centroids_lock = threading.Lock()
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def _centroid_key(version) -> str:
+    source = '\n'.join(
+        [version.model_name, version.query_template]
+        + [f'{name}\t{CATEGORY_DESCRIPTIONS[name]}' for name in CATEGORIES]
+    )
+    return f"{CENTROID_CACHE_PREFIX}:{hashlib.sha256(source.encode('utf-8')).hexdigest()}"
+
+
+def _compute_centroids(version) -> np.ndarray:
+    from recommendations.rag import get_sentence_transformer_model
+
+    model = get_sentence_transformer_model(version.model_name)
+    texts = [version.query_text(text) for name in CATEGORIES for text in (name, CATEGORY_DESCRIPTIONS[name])]
+    vectors = _normalize(np.asarray(model.encode(texts), dtype=np.float32))
+    # Average of the name and description embeddings of each category
+    return _normalize(vectors.reshape(len(CATEGORIES), 2, -1).mean(axis=1))
+
+
+def category_centroids() -> np.ndarray:
+    """
+    (len(CATEGORIES), dims) matrix of unit-length category centroids for the
+    active embedding version, computed once and cached.
+    """
+    from recommendations.embedding_versions import active_version
+
+    version = active_version()
+    key = _centroid_key(version)
+    centroids = _centroids.get(key)
+    if centroids is None:
+        with _centroids_lock:
+            centroids = _centroids.get(key)
+            if centroids is None:
+                raw = cache.get(key)
+                if raw is not None:
+                    centroids = np.frombuffer(raw, dtype=np.float32).reshape(len(CATEGORIES), -1)
+                else:
+                    centroids = _compute_centroids(version)
+                    cache.set(key, centroids.tobytes(), None)
+                _centroids[key] = centroids
+    return centroids
+
+
+def reset_centroid_cache():
+    with _centroids_lock:
+        _centroids.clear()
+
+
+def _classify_matrix(embeddings: np.ndarray, normalized: bool = False):
+    """
+    (category indices, best scores, margins) arrays for an (n, dims) matrix.
+    """
+    if not normalized:
+        embeddings = _normalize(embeddings)
+    scores = embeddings @ category_centroids().T
+    top2 = np.argpartition(-scores, 1, axis=1)[:, :2]
+    rows = np.arange(len(scores))
+    first, second = scores[rows, top2[:, 0]], scores[rows, top2[:, 1]]
+    swap = second > first
+    best_index = np.where(swap, top2[:, 1], top2[:, 0])
+    best = np.maximum(first, second)
+    return best_index, best, np.abs(first - second)
+
+
+def _predictions(indices, scores, margins) -> list[Prediction]:
+    return [
+        Prediction(CATEGORIES[index], float(score), float(margin))
+        for index, score, margin in zip(indices, scores, margins)
+    ]
+
+
+def classify_embeddings(embeddings) -> list[Prediction]:
+    """
+    Nearest-centroid category for each row of an (n, dims) embedding matrix.
+    """
+    embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    if not embeddings.size:
+        return []
+    return _predictions(*_classify_matrix(embeddings))
+
+
+def classify_texts(texts, batch_size: int = 64) -> list[Prediction]:
+    """
+    Encode texts in one batched call and classify them.
+    """
+    from recommendations.rag import get_sentence_transformer_model
+
+    texts = list(texts)
+    if not texts:
+        return []
+    model = get_sentence_transformer_model()
+    embeddings = model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+    return classify_embeddings(embeddings)
+
+
+def _classify_with_fallback(items, embeddings: dict, text_of) -> list[Prediction]:
+    """
+    Classify items by their stored embedding where there is one and by
+    encoding text_of(item) otherwise, keeping the input order.
+    """
+    predictions = [None] * len(items)
+    stored = [i for i, item in enumerate(items) if embeddings.get(i) is not None]
+    if stored:
+        for i, prediction in zip(stored, classify_embeddings(np.vstack([embeddings[i] for i in stored]))):
+            predictions[i] = prediction
+    missing = [i for i, prediction in enumerate(predictions) if prediction is None]
+    if missing:
+        for i, prediction in zip(missing, classify_texts([text_of(items[i]) for i in missing])):
+            predictions[i] = prediction
+    return predictions
+
+
+def classify_books(books) -> list[Prediction]:
+    """
+    Category for each Book, from Book.embedding (encoded on the fly if missing).
+    """
+    from recommendations.embedding_pipeline import book_embedding_text
+
+    books = list(books)
+    embeddings = {i: book.embedding for i, book in enumerate(books)}
+    return _classify_with_fallback(books, embeddings, book_embedding_text)
+
+
+def product_text(product) -> str:
+    """
+    Text a Product without a matching Book embedding is classified by.
+    """
+    return f"{product.name}. {(product.description or '')[:500]}"
+
+
+def classify_products(products) -> list[Prediction]:
+    """
+    Category for each store Product, from the embedding of the Book with the
+    same reference where there is one, else by encoding its name and description.
+    """
+    from recommendations.models import Book
+
+    products = list(products)
+    references = {p.reference for p in products if p.reference}
+    by_reference = dict(
+        Book.objects.filter(reference__in=references, embedding__isnull=False).values_list('reference', 'embedding')
+    ) if references else {}
+    embeddings = {i: by_reference.get(p.reference) for i, p in enumerate(products)}
+    return _classify_with_fallback(products, embeddings, product_text)
+
+
+def classify_catalog() -> dict:
+    """
+    Category for every embedded Book in one pass: {book id: Prediction}.
+
+    Reads the process's in-memory vector index if it is loaded, otherwise
+    loads the embedding matrix once for this call.
+    """
+    from recommendations.memory_index import InMemoryVectorIndex, loaded_memory_index
+
+    index = loaded_memory_index() or InMemoryVectorIndex().load()
+    ids, matrix = index.snapshot()
+    if not len(ids):
+        return {}
+    # Index rows are already unit length
+    return dict(zip(ids.tolist(), _predictions(*_classify_matrix(matrix, normalized=True))))
+
+
+def match_category(text: str) -> str | None:
+    """
+    The category in CATEGORIES that an LLM answer names, if any.
+    """
+    text = text.lower()
+    # Longest names first: "Non-Fiction" must not match as "Fiction"
+    for name in sorted(CATEGORIES, key=len, reverse=True):
+        if name.lower() in text:
+            return name
+    return None
@@ -0,0 +1,156 @@
+"""
+Two-tier cache for query embeddings.
+
+Popular and repeated searches used to pay a full SentenceTransformer forward
+pass on every request. encode_query()/encode_queries() look embeddings up by
+(model name, normalised query text) in:
+
+1. an in-process LRU (bounded by RECOMMENDATIONS_QUERY_EMBEDDING_LRU_SIZE), then
+2. the shared Django cache, where vectors are stored as raw float32 bytes
+   (1.5 KB for 384 dims) rather than pickled lists of Python floats,
+
+and only encode what is still missing, in a single batch. Hits and misses per
+tier are exported as a Prometheus counter through django_prometheus.
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+QUERY_EMBEDDING_CACHE_EVENTS = Counter(
+    'recommendations_query_embedding_cache_total',
+    'Query embedding cache lookups, by tier (local/shared) and result (hit/miss)',
+    ['tier', 'result'],
+)
+
+EMBEDDING_DTYPE = np.dtype('<f4')
+
+
+class LRUCache:
+    """
+    Minimal thread-safe LRU mapping with a size bound.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_cache = LRUCache(getattr(settings, 'RECOMMENDATIONS_QUERY_EMBEDDING_LRU_SIZE', 2048))
+
+
+def collapse_whitespace(text: str) -> str:
+    return ' '.join(str(text).split())
+
+
+def normalize_query(text: str) -> str:
+    """
+    Case- and whitespace-insensitive form of a query, for cache keys of results
+    that do not depend on letter case. Models are fed collapse_whitespace()
+    text instead, lowercased only where the model is uncased.
+    """
+    return collapse_whitespace(text).lower()
+
+
+def _cache_key(model_name: str, normalized: str) -> str:
+    digest = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+    return f'query_embedding:{model_name}:{digest}'
+
+
+def encode_query(text: str) -> np.ndarray:
+    """
+    Embedding for a single query, served from cache when possible.
+    """
+    return encode_queries([text])[0]
+
+
+def encode_queries(texts: list[str]) -> np.ndarray:
+    """
+    Embeddings for several queries. Cache misses are encoded in one model call.
+
+    Returns:
+        np.ndarray: (len(texts), dims) float32 matrix, in input order
+    """
+    from recommendations.embedding_versions import active_version
+    from recommendations.rag import get_sentence_transformer_model
+
+    # Queries are encoded like the catalog: same model, the version's query template
+    version = active_version()
+    queries = [collapse_whitespace(t) for t in texts]
+    if version.lowercase_queries:
+        queries = [q.lower() for q in queries]
+    # The exact encoder input is the cache key
+    normalized = [version.query_text(q) for q in queries]
+    keys = [_cache_key(version.model_name, n) for n in normalized]
+    vectors = [None] * len(texts)
+
+    # Tier 1: in-process LRU
+    for i, key in enumerate(keys):
+        vectors[i] = _local_cache.get(key)
+        QUERY_EMBEDDING_CACHE_EVENTS.labels('local', 'hit' if vectors[i] is not None else 'miss').inc()
+
+    # Tier 2: shared cache backend
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        shared = cache.get_many([keys[i] for i in missing])
+        for i in missing:
+            raw = shared.get(keys[i])
+            if raw is not None:
+                vectors[i] = np.frombuffer(raw, dtype=EMBEDDING_DTYPE)
+                _local_cache.put(keys[i], vectors[i])
+            QUERY_EMBEDDING_CACHE_EVENTS.labels('shared', 'hit' if raw is not None else 'miss').inc()
+
+    # Encode whatever is left, once per distinct query
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        to_encode = list(dict.fromkeys(normalized[i] for i in missing))
+        model = get_sentence_transformer_model(version.model_name)
+        encoded = np.asarray(model.encode(to_encode), dtype=EMBEDDING_DTYPE).reshape(len(to_encode), -1)
+        by_text = dict(zip(to_encode, encoded))
+
+        timeout = getattr(settings, 'RECOMMENDATIONS_QUERY_EMBEDDING_CACHE_TTL', 86400)
+        to_store = {}
+        for i in missing:
+            vectors[i] = by_text[normalized[i]]
+            _local_cache.put(keys[i], vectors[i])
+            to_store[keys[i]] = vectors[i].tobytes()
+        cache.set_many(to_store, timeout)
+
+    return np.vstack(vectors)
+
+
+def clear_local_cache():
+    """
+    Empty this process's LRU tier (the shared tier expires on its own).
+    """
+    _local_cache.clear()
@@ -0,0 +1,302 @@
+"""
+Bulk helpers for (re)generating Book embeddings.
+
+The old embed_books loop encoded one book per forward pass, saved one row per
+UPDATE and paged with OFFSET over a queryset whose filter
+(`embedding__isnull=True`) changed as rows were written, so it skipped books.
+These helpers let a run over a large catalog go batch by batch:
+
+- iter_book_batches() pages by primary key (keyset), so every page is an
+  index range scan and rows written by earlier pages cannot shift later ones,
+- encode_books() runs one batched model.encode() per page, and
+- write_embeddings() streams the vectors into a temporary table with COPY and
+  applies them with a single UPDATE ... FROM (bulk_update off PostgreSQL).
+
+Every write also stores Book.embedding_fingerprint, a hash of the model name
+and the exact text encoded. changed_books() uses it to skip books whose text
+(and model) are unchanged, so saves that do not touch the text, repeated
+imports and reruns never re-encode; record_encode_stats() counts the encodes
+this avoided (see `manage.py embedding_stats`).
+
+Texts, fingerprints and the model all come from an embedding version
+(embedding_versions.py): the active one by default, which every write records
+in Book.embedding_version. write_shadow_embeddings() fills a version that is
+still being built without touching the live column.
+"""
+import io
+import logging
+import numpy as np
+from dataclasses import replace
+from django.core.cache import cache
+from django.db import connection, transaction
+from prometheus_client import Counter
+
+from recommendations.embedding_versions import DOCUMENT_FIELDS, active_version
+from recommendations.models import Book, BookEmbeddingShadow
+from recommendations.vector_search import vector_literal
+
+logger = logging.getLogger(__name__)
+
+# Fields needed to build the embedding text; everything else stays unloaded
+TEXT_FIELDS = DOCUMENT_FIELDS
+
+EMBEDDING_ENCODES = Counter(
+    'recommendations_embedding_encodes_total',
+    'Book embedding requests by source (signal/task/command/worker) and result (encoded/skipped)',
+    ['source', 'result'],
+)
+STATS_CACHE_PREFIX = 'embedding_encode_stats'
+
+# NULL in COPY text format
+COPY_NULL = r'\N'
+
+
+def book_embedding_text(book, version=None) -> str:
+    """
+    Text fed to the encoder for a book (active embedding version by default).
+    """
+    return (version or active_version()).document_text(book)
+
+
+def embedding_fingerprint(text: str, model_name: str | None = None) -> str:
+    """
+    Hash identifying an embedding: the encoder model plus the exact text encoded.
+    """
+    if model_name is None:
+        return active_version().fingerprint(text)
+    return replace(active_version(), model_name=model_name).fingerprint(text)
+
+
+def changed_books(books, force: bool = False, version=None, current=None):
+    """
+    Split books into the ones that need encoding and a count of unchanged ones.
+
+    A book is unchanged when its stored fingerprint matches its current text
+    (fingerprints are only ever written together with the embedding).
+
+    Args:
+        books: Book objects
+        force (bool): Treat every book as changed
+        version: EmbeddingVersion to render and fingerprint with (default: active)
+        current (dict): Book id -> stored fingerprint to compare with instead of
+            Book.embedding_fingerprint (e.g. shadow_fingerprints())
+
+    Returns:
+        tuple: ([(book, text, fingerprint), ...], skipped)
+    """
+    version = version or active_version()
+    pending = []
+    skipped = 0
+    for book in books:
+        text = version.document_text(book)
+        fingerprint = version.fingerprint(text)
+        stored = current.get(book.id) if current is not None else book.embedding_fingerprint
+        if not force and stored == fingerprint:
+            skipped += 1
+        else:
+            pending.append((book, text, fingerprint))
+    return pending, skipped
+
+
+def record_encode_stats(source: str, encoded: int = 0, skipped: int = 0):
+    """
+    Count encodes performed and avoided, in Prometheus and in the shared cache.
+    """
+    for result, count in (('encoded', encoded), ('skipped', skipped)):
+        if not count:
+            continue
+        EMBEDDING_ENCODES.labels(source, result).inc(count)
+        key = f'{STATS_CACHE_PREFIX}:{source}:{result}'
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            # Evicted between add() and incr()
+            cache.set(key, count, None)
+
+
+def get_encode_stats(sources=('signal', 'task', 'command', 'worker')) -> dict:
+    """
+    Totals recorded by record_encode_stats(): {source: {'encoded': n, 'skipped': n}}.
+    """
+    keys = [f'{STATS_CACHE_PREFIX}:{source}:{result}' for source in sources for result in ('encoded', 'skipped')]
+    values = cache.get_many(keys)
+    return {
+        source: {
+            result: values.get(f'{STATS_CACHE_PREFIX}:{source}:{result}', 0)
+            for result in ('encoded', 'skipped')
+        }
+        for source in sources
+    }
+
+
+def iter_book_batches(queryset, batch_size: int = 256, start_after: int = 0):
+    """
+    Yield lists of books from queryset in primary-key order, batch_size at a time.
+    """
+    queryset = queryset.only('id', 'embedding_fingerprint', *TEXT_FIELDS).order_by('id')
+    last_id = start_after
+    while True:
+        batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+
+
+def encode_books(model, books, batch_size: int = 64) -> np.ndarray:
+    """
+    Encode a page of books in one call; returns a (len(books), dims) float32 array.
+    """
+    return encode_texts(model, [book_embedding_text(book) for book in books], batch_size=batch_size)
+
+
+def encode_texts(model, texts, batch_size: int = 64) -> np.ndarray:
+    """
+    Encode texts in one call; returns a (len(texts), dims) float32 array.
+    """
+    embeddings = model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def _copy_into_temp_table(cursor, book_ids, embeddings, fingerprints):
+    """
+    COPY (id, embedding, fingerprint) rows into the temporary embedding_updates table.
+    """
+    buffer = io.StringIO()
+    for book_id, vector, fingerprint in zip(book_ids, embeddings, fingerprints):
+        buffer.write(f'{int(book_id)}\t{vector_literal(vector)}\t{fingerprint or COPY_NULL}\n')
+    buffer.seek(0)
+    cursor.execute(
+        'CREATE TEMPORARY TABLE embedding_updates '
+        '(id bigint PRIMARY KEY, embedding vector, fingerprint varchar(64)) ON COMMIT DROP'
+    )
+    cursor.copy_expert('COPY embedding_updates (id, embedding, fingerprint) FROM STDIN', buffer)
+
+
+def write_embeddings(book_ids, embeddings, fingerprints=None, version=None) -> int:
+    """
+    Store embeddings (and their fingerprints, if given) for the given Book ids
+    in one statement, recording the embedding version (default: active).
+
+    On PostgreSQL the rows are COPYed into a temporary table that is joined in
+    a single UPDATE; other backends fall back to bulk_update().
+
+    Returns:
+        int: Number of rows updated
+    """
+    if not len(book_ids):
+        return 0
+
+    if fingerprints is None:
+        fingerprints = [None] * len(book_ids)
+    version_name = (version or active_version()).name
+
+    if connection.vendor != 'postgresql':
+        books = [
+            Book(
+                id=book_id,
+                embedding=list(map(float, vector)),
+                embedding_fingerprint=fingerprint,
+                embedding_version=version_name,
+            )
+            for book_id, vector, fingerprint in zip(book_ids, embeddings, fingerprints)
+        ]
+        Book.objects.bulk_update(books, ['embedding', 'embedding_fingerprint', 'embedding_version'])
+        return len(books)
+
+    table = Book._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        _copy_into_temp_table(cursor, book_ids, embeddings, fingerprints)
+        cursor.execute(
+            f'UPDATE {table} AS b SET embedding = u.embedding, embedding_fingerprint = u.fingerprint, '
+            f'embedding_version = %s '
+            f'FROM embedding_updates AS u WHERE b.id = u.id',
+            [version_name],
+        )
+        updated = cursor.rowcount
+        # ON COMMIT DROP only fires at the outermost commit; callers may hold a transaction open
+        cursor.execute('DROP TABLE embedding_updates')
+        return updated
+
+
+def shadow_fingerprints(version_name: str, book_ids) -> dict:
+    """
+    Book id -> fingerprint of the shadow embeddings already built for a version.
+    """
+    return dict(
+        BookEmbeddingShadow.objects.filter(version=version_name, book_id__in=book_ids)
+        .values_list('book_id', 'fingerprint')
+    )
+
+
+def write_shadow_embeddings(version_name: str, book_ids, embeddings, fingerprints) -> int:
+    """
+    Upsert embeddings for a version that is being built (BookEmbeddingShadow),
+    leaving the live Book.embedding column alone.
+
+    Returns:
+        int: Number of rows written
+    """
+    if not len(book_ids):
+        return 0
+
+    if connection.vendor != 'postgresql':
+        for book_id, vector, fingerprint in zip(book_ids, embeddings, fingerprints):
+            BookEmbeddingShadow.objects.update_or_create(
+                version=version_name, book_id=book_id,
+                defaults={'embedding': list(map(float, vector)), 'fingerprint': fingerprint},
+            )
+        return len(book_ids)
+
+    table = BookEmbeddingShadow._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        _copy_into_temp_table(cursor, book_ids, embeddings, fingerprints)
+        cursor.execute(
+            f'INSERT INTO {table} (book_id, version, embedding, fingerprint) '
+            f'SELECT u.id, %s, u.embedding, u.fingerprint FROM embedding_updates AS u '
+            f'ON CONFLICT (version, book_id) DO UPDATE '
+            f'SET embedding = EXCLUDED.embedding, fingerprint = EXCLUDED.fingerprint',
+            [version_name],
+        )
+        written = cursor.rowcount
+        cursor.execute('DROP TABLE embedding_updates')
+        return written
+
+
+def build_shadow_embeddings(version, queryset=None, page_size: int = 512, encode_batch_size: int = 64,
+                            ignore_fingerprints: bool = False, report=None) -> dict:
+    """
+    Encode books into a version's shadow rows in this process. Books whose
+    shadow fingerprint already matches are skipped, so re-running only
+    catches up on books added or edited since the last run.
+
+    Returns:
+        dict: processed, skipped, errors
+    """
+    from recommendations.rag import get_sentence_transformer_model
+
+    queryset = Book.objects.all() if queryset is None else queryset
+    model = get_sentence_transformer_model(version.model_name)
+    totals = {'processed': 0, 'skipped': 0, 'errors': 0}
+    for batch in iter_book_batches(queryset, batch_size=page_size):
+        ids = [book.id for book in batch]
+        current = shadow_fingerprints(version.name, ids)
+        pending, unchanged = changed_books(batch, force=ignore_fingerprints, version=version, current=current)
+        totals['skipped'] += unchanged
+        try:
+            if pending:
+                embeddings = encode_texts(model, [text for _, text, _ in pending], batch_size=encode_batch_size)
+                totals['processed'] += write_shadow_embeddings(
+                    version.name, [book.id for book, _, _ in pending], embeddings, [fp for _, _, fp in pending]
+                )
+            record_encode_stats('command', encoded=len(pending), skipped=unchanged)
+        except Exception as e:
+            totals['errors'] += len(pending)
+            logger.error(f"Error building {version.name} embeddings for books {ids[0]}-{ids[-1]}: {e}")
+        if report:
+            report(
+                f"Progress: {totals['processed'] + totals['skipped'] + totals['errors']} books "
+                f"({totals['skipped']} unchanged, {totals['errors']} errors)"
+            )
+    return totals
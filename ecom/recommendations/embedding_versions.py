@@ -0,0 +1,182 @@
+"""
+Embedding versions: which model and which text template produced a vector.
+
+A version pins the encoder model, the document template books are rendered
+with and the template queries are rendered with. Every path that writes
+Book.embedding (signal task, embed_books, worker pool) and every query
+encoder uses the *active* version, so the catalog and the queries always share
+one vector space, and each row records the version it was written with
+(Book.embedding_version).
+
+To change the model or a template, add a new entry to VERSIONS and:
+
+1. `manage.py build_embedding_version <name>` encodes the catalog into
+   BookEmbeddingShadow while live search keeps using the active version
+   (re-runs only encode books whose text changed since the last run), then
+2. `manage.py activate_embedding_version <name>` catches up on books edited
+   during the build and, in one transaction, copies the shadow vectors into
+   Book.embedding and marks the version active.
+
+New versions must keep the 384 dimensions of Book.embedding (or ship a
+migration widening the column and ANN index first).
+"""
+import hashlib
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Book fields the document templates may use
+DOCUMENT_FIELDS = ('title', 'author', 'infantil', 'category', 'description', 'subjects')
+
+
+@dataclass(frozen=True)
+class EmbeddingVersion:
+    name: str
+    model_name: str
+    document_template: str
+    query_template: str = '{query}'
+    # The encoder is uncased, so queries are lowercased and queries differing
+    # only in case share a cached embedding; leave False for cased models
+    lowercase_queries: bool = False
+
+    def document_text(self, book) -> str:
+        """
+        Text fed to the encoder for a book.
+        """
+        return self.document_template.format(**{name: getattr(book, name) for name in DOCUMENT_FIELDS})
+
+    def query_text(self, query: str) -> str:
+        """
+        Text fed to the encoder for a search query.
+        """
+        return self.query_template.format(query=query)
+
+    def fingerprint(self, text: str) -> str:
+        """
+        Hash identifying an embedding: the encoder model plus the exact text encoded.
+        """
+        return hashlib.sha256(f'{self.model_name}\n{text}'.encode('utf-8')).hexdigest()
+
+
+VERSIONS = {
+    'v1': EmbeddingVersion(
+        name='v1',
+        model_name='all-MiniLM-L6-v2',
+        document_template=(
+            'Title: {title}. Author: {author}. infantil: {infantil}. '
+            'Category: {category}. Description: {description}. Subjects: {subjects}.'
+        ),
+        lowercase_queries=True,
+    ),
+}
+DEFAULT_VERSION = 'v1'
+
+_active = {'name': None, 'checked_at': 0.0}
+_active_lock = threading.Lock()
+
+
+def get_version(name: str) -> EmbeddingVersion:
+    try:
+        return VERSIONS[name]
+    except KeyError:
+        raise ValueError(f"Unknown embedding version '{name}' (known: {', '.join(VERSIONS)})")
+
+
+def active_version() -> EmbeddingVersion:
+    """
+    The version live embeddings and queries use. Read from EmbeddingVersionState
+    at most every RECOMMENDATIONS_EMBEDDING_VERSION_CHECK_SECONDS per process;
+    DEFAULT_VERSION until one has been activated.
+    """
+    from recommendations.models import EmbeddingVersionState
+
+    interval = getattr(settings, 'RECOMMENDATIONS_EMBEDDING_VERSION_CHECK_SECONDS', 10)
+    now = time.monotonic()
+    if _active['name'] is None or now - _active['checked_at'] >= interval:
+        with _active_lock:
+            if _active['name'] is None or now - _active['checked_at'] >= interval:
+                name = (
+                    EmbeddingVersionState.objects.filter(status=EmbeddingVersionState.STATUS_ACTIVE)
+                    .values_list('name', flat=True).first()
+                )
+                if name not in VERSIONS:
+                    if name is not None:
+                        logger.error(f"Active embedding version '{name}' is not defined; using {DEFAULT_VERSION}")
+                    name = DEFAULT_VERSION
+                _active['name'] = name
+                _active['checked_at'] = now
+    return VERSIONS[_active['name']]
+
+
+def reset_active_version_cache():
+    """
+    Forget the cached active version (tests, and right after activation).
+    """
+    with _active_lock:
+        _active['name'] = None
+        _active['checked_at'] = 0.0
+
+
+def start_build(name: str):
+    """
+    Register a version as building (no-op if it is already known).
+    """
+    from recommendations.models import EmbeddingVersionState
+
+    get_version(name)
+    state, _ = EmbeddingVersionState.objects.get_or_create(name=name)
+    return state
+
+
+def shadow_coverage(name: str) -> tuple[int, int]:
+    """
+    (books with a shadow embedding for the version, books in the catalog)
+    """
+    from recommendations.models import Book, BookEmbeddingShadow
+
+    return BookEmbeddingShadow.objects.filter(version=name).count(), Book.objects.count()
+
+
+def activate(name: str) -> int:
+    """
+    Switch live search to a built version in one transaction: copy its shadow
+    embeddings into Book.embedding, mark it active (the previous version
+    retired) and drop the shadow rows.
+
+    Returns:
+        int: Number of books switched over
+    """
+    from recommendations.models import Book, BookEmbeddingShadow, EmbeddingVersionState
+
+    get_version(name)
+    book_table = Book._meta.db_table
+    shadow_table = BookEmbeddingShadow._meta.db_table
+
+    with transaction.atomic():
+        # Serialise concurrent activations
+        state = EmbeddingVersionState.objects.select_for_update().get(name=name)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {book_table} AS b '
+                f'SET embedding = s.embedding, embedding_fingerprint = s.fingerprint, embedding_version = s.version '
+                f'FROM {shadow_table} AS s WHERE s.book_id = b.id AND s.version = %s',
+                [name],
+            )
+            switched = cursor.rowcount
+        EmbeddingVersionState.objects.filter(status=EmbeddingVersionState.STATUS_ACTIVE).exclude(name=name).update(
+            status=EmbeddingVersionState.STATUS_RETIRED
+        )
+        state.status = EmbeddingVersionState.STATUS_ACTIVE
+        state.activated_at = timezone.now()
+        state.save(update_fields=['status', 'activated_at'])
+        BookEmbeddingShadow.objects.filter(version=name).delete()
+
+    reset_active_version_cache()
+    logger.info(f"Activated embedding version {name} for {switched} books")
+    return switched
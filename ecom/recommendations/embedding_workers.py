@@ -0,0 +1,218 @@
+"""
+Dedicated multi-process embedding workers for bulk reindexing.
+
+Queuing one generate_embeddings_task per 50 ids spreads a reindex over every
+Celery worker on the node, each running torch with as many threads as there
+are cores, so they fight over the CPU. run_embedding_pool() instead:
+
+- plans the work as contiguous primary-key ranges (a few thousand books each),
+- starts N spawned worker processes, each pinned to `threads` torch threads
+  and loading the model once at start-up,
+- hands the ranges out through the pool's task queue; a worker keyset-pages
+  through its range, encodes the books whose fingerprint changed in large
+  batches and writes with COPY (see embedding_pipeline.py), and
+- reports books/sec as ranges complete.
+
+Use it through `manage.py reindex_embeddings --workers N`, or
+`manage.py build_embedding_version --workers N`, which writes a version that
+is not live yet into the shadow table instead.
+"""
+import logging
+import multiprocessing
+import os
+import time
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+# torch/BLAS read these when first imported, so they are set before the worker imports anything
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'TOKENIZERS_PARALLELISM')
+
+
+@dataclass
+class RangeTask:
+    start_after: int
+    last_id: int
+    version: str
+    shadow: bool = False
+    missing_only: bool = False
+    page_size: int = 512
+    encode_batch_size: int = 64
+    ignore_fingerprints: bool = False
+
+
+@dataclass
+class RangeResult:
+    start_after: int
+    last_id: int
+    processed: int = 0
+    skipped: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    user_ids: set = field(default_factory=set)
+
+
+def default_threads_per_worker(workers: int) -> int:
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def plan_ranges(queryset, range_size: int = 5000) -> list:
+    """
+    Split the books in queryset into (start_after, last_id) primary-key ranges
+    of at most range_size books.
+    """
+    ids = list(queryset.order_by('id').values_list('id', flat=True))
+    ranges = []
+    start_after = 0
+    for i in range(0, len(ids), range_size):
+        chunk = ids[i:i + range_size]
+        ranges.append((start_after, chunk[-1]))
+        start_after = chunk[-1]
+    return ranges
+
+
+def _init_worker(threads: int, model_name: str):
+    """
+    Process initializer: pin thread pools, set up Django and pre-load the model.
+    """
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = 'false' if name == 'TOKENIZERS_PARALLELISM' else str(threads)
+
+    import django
+    django.setup()
+
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Only allowed before any inter-op work has started
+        pass
+
+    from recommendations.rag import get_sentence_transformer_model
+    get_sentence_transformer_model(model_name)
+    logger.info(f"Embedding worker {os.getpid()} ready ({threads} threads)")
+
+
+def embed_range(task: RangeTask) -> RangeResult:
+    """
+    Encode and store every matching book with start_after < id <= last_id,
+    into Book.embedding or, for task.shadow, the version's shadow rows.
+    """
+    from recommendations.embedding_pipeline import (
+        changed_books, encode_texts, iter_book_batches, record_encode_stats, shadow_fingerprints,
+        write_embeddings, write_shadow_embeddings,
+    )
+    from recommendations.embedding_versions import get_version
+    from recommendations.models import Book, Purchase
+    from recommendations.rag import get_sentence_transformer_model
+
+    version = get_version(task.version)
+    result = RangeResult(start_after=task.start_after, last_id=task.last_id)
+    start = time.perf_counter()
+
+    books = Book.objects.filter(id__lte=task.last_id)
+    if task.missing_only:
+        books = books.filter(embedding__isnull=True)
+
+    model = get_sentence_transformer_model(version.model_name)
+    for batch in iter_book_batches(books, batch_size=task.page_size, start_after=task.start_after):
+        ids = [book.id for book in batch]
+        current = shadow_fingerprints(version.name, ids) if task.shadow else None
+        pending, unchanged = changed_books(batch, force=task.ignore_fingerprints, version=version, current=current)
+        result.skipped += unchanged
+        try:
+            if pending:
+                pending_ids = [book.id for book, _, _ in pending]
+                fingerprints = [fp for _, _, fp in pending]
+                embeddings = encode_texts(
+                    model, [text for _, text, _ in pending], batch_size=task.encode_batch_size
+                )
+                if task.shadow:
+                    result.processed += write_shadow_embeddings(version.name, pending_ids, embeddings, fingerprints)
+                else:
+                    result.processed += write_embeddings(pending_ids, embeddings, fingerprints, version=version)
+                    result.user_ids.update(
+                        Purchase.objects.filter(book_id__in=pending_ids).values_list('user_id', flat=True)
+                    )
+            record_encode_stats('worker', encoded=len(pending), skipped=unchanged)
+        except Exception as e:
+            result.errors += len(pending)
+            logger.error(f"Embedding worker failed on books {ids[0]}-{ids[-1]}: {e}")
+
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def run_embedding_pool(queryset, workers: int, threads: int | None = None, range_size: int = 5000,
+                       page_size: int = 512, encode_batch_size: int = 64, missing_only: bool = False,
+                       ignore_fingerprints: bool = False, version: str | None = None, shadow: bool = False,
+                       report=None) -> dict:
+    """
+    Re-embed the books in queryset with a pool of dedicated worker processes.
+
+    Args:
+        queryset: Books to process
+        workers (int): Number of worker processes
+        threads (int): Torch threads per worker (default: cores / workers)
+        range_size (int): Books per unit of work handed to a worker
+        page_size (int): Books read and written per batch inside a worker
+        encode_batch_size (int): Texts per model forward pass
+        missing_only (bool): Skip books that gained an embedding since planning
+        ignore_fingerprints (bool): Re-encode books whose text and model are unchanged
+        version (str): Embedding version to encode with (default: active)
+        shadow (bool): Write to the version's shadow rows instead of Book.embedding
+        report (callable): Called with a progress line after each range
+
+    Returns:
+        dict: processed, skipped, errors, seconds, books_per_sec, user_ids
+    """
+    from django.db import connections
+    from recommendations.embedding_versions import active_version, get_version
+    from recommendations.memory_index import mark_memory_index_stale
+    from recommendations.taste_profile import rebuild_taste_profile
+
+    version = get_version(version) if version else active_version()
+    threads = threads or default_threads_per_worker(workers)
+    ranges = plan_ranges(queryset, range_size=range_size)
+    total = queryset.count()
+    tasks = [
+        RangeTask(
+            start_after=lo, last_id=hi, version=version.name, shadow=shadow, missing_only=missing_only,
+            page_size=page_size, encode_batch_size=encode_batch_size, ignore_fingerprints=ignore_fingerprints,
+        )
+        for lo, hi in ranges
+    ]
+
+    totals = {'processed': 0, 'skipped': 0, 'errors': 0, 'user_ids': set()}
+    start = time.perf_counter()
+    if tasks:
+        # Children open their own connections; never share the parent's socket
+        connections.close_all()
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(processes=workers, initializer=_init_worker,
+                          initargs=(threads, version.model_name)) as pool:
+            for result in pool.imap_unordered(embed_range, tasks):
+                totals['processed'] += result.processed
+                totals['skipped'] += result.skipped
+                totals['errors'] += result.errors
+                totals['user_ids'] |= result.user_ids
+                elapsed = time.perf_counter() - start
+                rate = totals['processed'] / elapsed if elapsed else 0.0
+                if report:
+                    report(
+                        f"Progress: {totals['processed'] + totals['skipped'] + totals['errors']}/{total} "
+                        f"({rate:.1f} books/sec, {totals['skipped']} unchanged, {totals['errors']} errors; "
+                        f"range {result.start_after + 1}-{result.last_id} at "
+                        f"{result.processed / result.seconds if result.seconds else 0:.1f} books/sec)"
+                    )
+
+    if totals['processed'] and not shadow:
+        # Bulk writes send no post_save
+        mark_memory_index_stale()
+        for user_id in totals['user_ids']:
+            rebuild_taste_profile(user_id)
+
+    totals['seconds'] = time.perf_counter() - start
+    totals['books_per_sec'] = totals['processed'] / totals['seconds'] if totals['seconds'] else 0.0
+    return totals
@@ -0,0 +1,148 @@
+"""
+Streaming input and checkpoints for bulk catalog imports (import_azacan).
+
+`json.load` on a 200k-record export holds the whole document, and every
+record decoded from it, in memory before the first row is written, and a
+crash halfway through meant starting over. iter_records() yields one record at
+a time from either a JSON array or JSON Lines, reading the file in chunks, and
+ImportCheckpoint remembers how many records have been committed so a rerun
+can skip them.
+"""
+import json
+import os
+from datetime import datetime
+
+from django.utils import timezone
+
+READ_CHUNK = 1 << 16
+_WHITESPACE = ' \t\r\n'
+
+
+def iter_records(path: str, chunk_size: int = READ_CHUNK):
+    """
+    Yield the records of a JSON array file or a JSON Lines file, one by one.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        head = f.read(chunk_size)
+        stripped = head.lstrip(_WHITESPACE + '\ufeff')
+        if stripped.startswith('['):
+            yield from _iter_array(f, stripped[1:], chunk_size)
+        else:
+            yield from _iter_lines(f)
+
+
+def _iter_lines(f):
+    f.seek(0)
+    for number, line in enumerate(f, start=1):
+        line = line.strip().lstrip('\ufeff')
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'Invalid JSON on line {number}: {e}')
+
+
+def _iter_array(f, buf: str, chunk_size: int):
+    """
+    Decode the elements of a top-level JSON array incrementally with
+    JSONDecoder.raw_decode, reading more input whenever an element is cut off.
+    """
+    decoder = json.JSONDecoder()
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    while True:
+        # Skip separators between elements
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE + ',':
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            fill()
+        if pos >= len(buf):
+            raise ValueError('Unexpected end of file: unterminated JSON array')
+        if buf[pos] == ']':
+            return
+
+        try:
+            record, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        if end == len(buf) and not eof and not isinstance(record, (dict, list, str)):
+            # A bare number may continue in the next chunk
+            fill()
+            continue
+        yield record
+        pos = end
+        if pos > chunk_size:
+            buf = buf[pos:]
+            pos = 0
+
+
+class ImportCheckpoint:
+    """
+    Progress of one import, persisted next to the input file.
+
+    The file records the input's size and modification time, so a checkpoint
+    is only reused for the file it was written for.
+    """
+
+    def __init__(self, path: str, source: str):
+        self.path = path
+        stat = os.stat(source)
+        self.source = {'path': os.path.abspath(source), 'size': stat.st_size, 'mtime': stat.st_mtime}
+        self.records = 0
+        self.phase = 'rows'
+        self.started_at = timezone.now()
+
+    def load(self) -> bool:
+        """
+        Restore saved progress. Returns False if there is none for this input.
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get('source') != self.source:
+            return False
+        self.records = data['records']
+        self.phase = data['phase']
+        self.started_at = datetime.fromisoformat(data['started_at'])
+        return True
+
+    def save(self, records: int | None = None, phase: str | None = None):
+        if records is not None:
+            self.records = records
+        if phase is not None:
+            self.phase = phase
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'source': self.source,
+                'records': self.records,
+                'phase': self.phase,
+                'started_at': self.started_at.isoformat(),
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        # Atomic: a crash leaves the previous checkpoint, never a torn one
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,138 @@
+"""
+Shared Ollama client for every LLM call in the project.
+
+Call sites used to build a new ChatOllama per request, so no HTTP connection
+was ever reused and a burst of searches could start any number of concurrent
+generations against a single Ollama server. Instead:
+
+- get_chat_model() caches one ChatOllama per (model, temperature, timeout) per
+  process; each keeps its own pooled httpx client, so connections are reused.
+- generate() / stream_generate() take a slot from a per-model semaphore
+  (OLLAMA_MAX_CONCURRENCY) before talking to Ollama. Callers wait at most
+  OLLAMA_QUEUE_TIMEOUT_SECONDS for a slot and then get LLMBusyError, which the
+  existing fallbacks handle like any other LLM failure.
+- Every HTTP call has a timeout (OLLAMA_TIMEOUT_SECONDS unless overridden).
+- Queue wait and generation time are exported as Prometheus histograms.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from langchain_core.output_parsers import StrOutputParser
+from langchain_ollama import ChatOllama
+from prometheus_client import Histogram
+
+logger = logging.getLogger(__name__)
+
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    'llm_queue_wait_seconds',
+    'Time spent waiting for an Ollama concurrency slot',
+    ['model'],
+)
+LLM_GENERATION_SECONDS = Histogram(
+    'llm_generation_seconds',
+    'Ollama generation time, by model and outcome (ok/error)',
+    ['model', 'outcome'],
+    buckets=(0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120),
+)
+
+
+class LLMBusyError(Exception):
+    """No concurrency slot for the model became free within the queue timeout."""
+
+
+_clients = {}
+_semaphores = {}
+_registry_lock = threading.Lock()
+
+
+def get_chat_model(model: str, temperature: float = 0.7, timeout: float | None = None) -> ChatOllama:
+    """
+    Get (creating on first use) the process-wide ChatOllama for these options.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'OLLAMA_TIMEOUT_SECONDS', 120)
+    key = (model, temperature, timeout)
+    client = _clients.get(key)
+    if client is None:
+        with _registry_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = ChatOllama(
+                    model=model,
+                    temperature=temperature,
+                    base_url=getattr(settings, 'OLLAMA_BASE_URL', 'http://localhost:11434'),
+                    client_kwargs={'timeout': timeout},
+                )
+                _clients[key] = client
+    return client
+
+
+def _get_semaphore(model: str) -> threading.BoundedSemaphore:
+    semaphore = _semaphores.get(model)
+    if semaphore is None:
+        with _registry_lock:
+            semaphore = _semaphores.get(model)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(getattr(settings, 'OLLAMA_MAX_CONCURRENCY', 4))
+                _semaphores[model] = semaphore
+    return semaphore
+
+
+@contextmanager
+def llm_slot(model: str):
+    """
+    Hold one of the model's in-flight generation slots for the enclosed block.
+    """
+    start = time.perf_counter()
+    semaphore = _get_semaphore(model)
+    acquired = semaphore.acquire(timeout=getattr(settings, 'OLLAMA_QUEUE_TIMEOUT_SECONDS', 30))
+    LLM_QUEUE_WAIT_SECONDS.labels(model).observe(time.perf_counter() - start)
+    if not acquired:
+        raise LLMBusyError(f"Timed out waiting for a free '{model}' slot")
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+def generate(model: str, prompt, inputs: dict, temperature: float = 0.7, timeout: float | None = None) -> str:
+    """
+    Run `prompt | model | StrOutputParser()` and return the generated text.
+    """
+    chain = prompt | get_chat_model(model, temperature, timeout) | StrOutputParser()
+    with llm_slot(model):
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = chain.invoke(inputs)
+            outcome = 'ok'
+            return result
+        finally:
+            LLM_GENERATION_SECONDS.labels(model, outcome).observe(time.perf_counter() - start)
+
+
+def stream_generate(model: str, prompt, inputs: dict, temperature: float = 0.7, timeout: float | None = None):
+    """
+    Like generate(), but yields text chunks. The slot is held until the
+    stream is exhausted or closed.
+    """
+    chain = prompt | get_chat_model(model, temperature, timeout) | StrOutputParser()
+    with llm_slot(model):
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            yield from chain.stream(inputs)
+            outcome = 'ok'
+        finally:
+            LLM_GENERATION_SECONDS.labels(model, outcome).observe(time.perf_counter() - start)
+
+
+def reset_clients():
+    """
+    Drop cached clients and semaphores (for tests and settings changes).
+    """
+    with _registry_lock:
+        _clients.clear()
+        _semaphores.clear()
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from recommendations.embedding_pipeline import build_shadow_embeddings, changed_books, encode_texts, iter_book_batches, write_embeddings
+from recommendations.embedding_versions import activate, get_version, shadow_coverage
+from recommendations.memory_index import mark_memory_index_stale
+from recommendations.models import Book, UserTasteProfile
+from recommendations.rag import get_sentence_transformer_model
+from recommendations.taste_profile import rebuild_taste_profile
+
+
+class Command(BaseCommand):
+    help = 'Atomically switch live search to an embedding version built with build_embedding_version.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('version', help='Embedding version name')
+        parser.add_argument(
+            '--allow-partial',
+            action='store_true',
+            help='Activate even if some books have no embedding for the version yet'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            version = get_version(options['version'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        # Catch up on books added or edited while the version was building
+        self.stdout.write(f'Catching up {version.name} on changed books...')
+        totals = build_shadow_embeddings(version)
+        self.stdout.write(f"Encoded {totals['processed']} changed books.")
+
+        built, total = shadow_coverage(version.name)
+        if built < total and not options['allow_partial']:
+            raise CommandError(
+                f'{version.name} covers only {built}/{total} books; run build_embedding_version '
+                f'or pass --allow-partial.'
+            )
+
+        switched = activate(version.name)
+        self.stdout.write(self.style.SUCCESS(f'{version.name} is now active ({switched} books switched).'))
+
+        # Books saved between the catch-up and the switch still carry the old vectors
+        model = get_sentence_transformer_model(version.model_name)
+        leftover = 0
+        for batch in iter_book_batches(Book.objects.exclude(embedding_version=version.name), batch_size=512):
+            pending, _ = changed_books(batch, force=True, version=version)
+            embeddings = encode_texts(model, [text for _, text, _ in pending])
+            leftover += write_embeddings(
+                [book.id for book, _, _ in pending], embeddings, [fp for _, _, fp in pending], version=version
+            )
+        if leftover:
+            self.stdout.write(f'Re-encoded {leftover} books saved during the switch.')
+
+        # Everything derived from the old vector space
+        mark_memory_index_stale()
+        user_ids = list(UserTasteProfile.objects.values_list('user_id', flat=True))
+        for user_id in user_ids:
+            rebuild_taste_profile(user_id)
+        self.stdout.write(f'Rebuilt {len(user_ids)} taste profiles.')
@@ -0,0 +1,101 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from recommendations.benchmarking import latency_summary, recall_at_k
+from recommendations.memory_index import get_memory_index
+from recommendations.models import Book
+from recommendations.vector_search import nearest_books, nearest_books_batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the pgvector and in-memory similarity backends on the real catalog: '
+        'p50/p99 latency and pgvector recall@k against the exact in-memory results.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200, help='Number of sample queries (default: 200)')
+        parser.add_argument('--k', type=int, default=10, help='Neighbours per query (default: 10)')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=4,
+            help='Queries per request for the looped vs batched multi-query comparison (default: 4)'
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for sampling query books')
+
+    def handle(self, *args, **options):
+        k = options['k']
+
+        ids = list(Book.objects.filter(embedding__isnull=False).values_list('id', flat=True))
+        if not ids:
+            self.stdout.write(self.style.WARNING('No books with embeddings to benchmark.'))
+            return
+
+        random.seed(options['seed'])
+        sample_ids = random.sample(ids, min(options['queries'], len(ids)))
+        queries = list(Book.objects.filter(id__in=sample_ids).values_list('embedding', flat=True))
+
+        start = time.perf_counter()
+        index = get_memory_index()
+        self.stdout.write(f'In-memory index: {len(index)} books loaded in {time.perf_counter() - start:.2f}s')
+
+        results = {}
+        for backend in ('pgvector', 'memory'):
+            latencies = []
+            ranked = []
+            for query in queries:
+                start = time.perf_counter()
+                books = nearest_books(query, top_k=k, backend=backend)
+                latencies.append((time.perf_counter() - start) * 1000)
+                ranked.append([b.id for b in books])
+            results[backend] = (ranked, latency_summary(latencies))
+
+        # The in-memory search is exact, so it serves as ground truth for recall
+        exact = results['memory'][0]
+        self.stdout.write(self.style.SUCCESS('=' * 60))
+        self.stdout.write(self.style.SUCCESS(
+            f"{'backend':>10} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'recall@' + str(k):>10}"
+        ))
+        self.stdout.write(self.style.SUCCESS('=' * 60))
+        for backend, (ranked, summary) in results.items():
+            recall = sum(recall_at_k(a, e, k) for a, e in zip(ranked, exact)) / len(exact)
+            self.stdout.write(
+                f"{backend:>10} {summary['mean']:>9.2f} {summary['p50']:>9.2f} "
+                f"{summary['p99']:>9.2f} {recall:>10.3f}"
+            )
+
+        self.benchmark_multi_query(queries, k, options['batch_size'])
+
+    def benchmark_multi_query(self, queries, k, batch_size):
+        """
+        Compare one search per query (the old get_reranked_books loop) with a
+        single batched search per group of queries.
+        """
+        groups = [queries[i:i + batch_size] for i in range(0, len(queries), batch_size)]
+        groups = [g for g in groups if len(g) == batch_size]
+        if not groups:
+            return
+
+        self.stdout.write(self.style.SUCCESS('=' * 60))
+        self.stdout.write(self.style.SUCCESS(f'Multi-query retrieval, {batch_size} queries per request'))
+        self.stdout.write(self.style.SUCCESS(
+            f"{'backend':>10} {'mode':>8} {'p50 ms':>9} {'p99 ms':>9} {'ms/query':>9}"
+        ))
+        self.stdout.write(self.style.SUCCESS('=' * 60))
+        for backend in ('pgvector', 'memory'):
+            for mode in ('looped', 'batched'):
+                latencies = []
+                for group in groups:
+                    start = time.perf_counter()
+                    if mode == 'looped':
+                        for query in group:
+                            nearest_books(query, top_k=k, backend=backend)
+                    else:
+                        nearest_books_batch(group, top_k=k, backend=backend)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                summary = latency_summary(latencies)
+                self.stdout.write(
+                    f"{backend:>10} {mode:>8} {summary['p50']:>9.2f} {summary['p99']:>9.2f} "
+                    f"{summary['mean'] / batch_size:>9.2f}"
+                )
@@ -0,0 +1,149 @@
+import io
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from recommendations.benchmarking import (
+    cluster_centres, latency_summary, recall_at_k, synthetic_embeddings
+)
+from recommendations.vector_search import ANN_INDEX_TYPES, ann_search, vector_literal
+
+BENCH_TABLE = 'bench_book_vectors'
+CHUNK_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the pgvector ANN index against exact search on synthetic books. '
+        'Reports build time, p50/p99 latency and recall@k for each catalog size.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            nargs='+',
+            type=int,
+            default=[10_000, 100_000, 1_000_000],
+            help='Synthetic catalog sizes to benchmark (default: 10000 100000 1000000)'
+        )
+        parser.add_argument('--type', choices=ANN_INDEX_TYPES, default='hnsw', help='Index type (default: hnsw)')
+        parser.add_argument('--queries', type=int, default=50, help='Number of queries per size (default: 50)')
+        parser.add_argument('--k', type=int, default=10, help='Neighbours per query (default: 10)')
+        parser.add_argument('--dimensions', type=int, default=384, help='Vector dimensions (default: 384)')
+        parser.add_argument('--m', type=int, default=16, help='HNSW m (default: 16)')
+        parser.add_argument('--ef-construction', type=int, default=64, help='HNSW ef_construction (default: 64)')
+        parser.add_argument(
+            '--ef-search',
+            nargs='+',
+            type=int,
+            default=[40, 100],
+            help='HNSW ef_search values to sweep (default: 40 100)'
+        )
+        parser.add_argument('--lists', type=int, default=None, help='IVFFlat lists (default: rows/1000)')
+        parser.add_argument(
+            '--probes',
+            nargs='+',
+            type=int,
+            default=[10, 30],
+            help='IVFFlat probes values to sweep (default: 10 30)'
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Random seed')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The vector index benchmark requires PostgreSQL with pgvector.')
+
+        k = options['k']
+        centres = cluster_centres(options['dimensions'], seed=options['seed'])
+        queries = synthetic_embeddings(options['queries'], centres, seed=options['seed'] + 1)
+        query_literals = [vector_literal(q) for q in queries]
+
+        self.stdout.write(self.style.SUCCESS('=' * 78))
+        self.stdout.write(self.style.SUCCESS(
+            f"{'rows':>9} {'index':>8} {'param':>16} {'build s':>8} "
+            f"{'p50 ms':>8} {'p99 ms':>8} {'recall@' + str(k):>10}"
+        ))
+        self.stdout.write(self.style.SUCCESS('=' * 78))
+
+        try:
+            for size in options['sizes']:
+                self.load_table(size, centres, options)
+
+                exact_ids, exact_ms = self.run_queries(query_literals, k, params={})
+                exact = latency_summary(exact_ms)
+                self.write_row(size, 'exact', '-', 0.0, exact, 1.0)
+
+                build_seconds = self.build_index(size, options)
+                for name, value in self.sweep(options):
+                    ann_ids, ann_ms = self.run_queries(query_literals, k, params={name: value})
+                    recall = sum(
+                        recall_at_k(a, e, k) for a, e in zip(ann_ids, exact_ids)
+                    ) / len(exact_ids)
+                    self.write_row(
+                        size, options['type'], f'{name.split(".")[1]}={value}',
+                        build_seconds, latency_summary(ann_ms), recall
+                    )
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE IF EXISTS {BENCH_TABLE}')
+
+    def load_table(self, size, centres, options):
+        self.stdout.write(f'Loading {size} synthetic books...')
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {BENCH_TABLE}')
+            cursor.execute(
+                f"CREATE UNLOGGED TABLE {BENCH_TABLE} "
+                f"(id bigint PRIMARY KEY, embedding vector({options['dimensions']}))"
+            )
+            for offset in range(0, size, CHUNK_SIZE):
+                count = min(CHUNK_SIZE, size - offset)
+                vectors = synthetic_embeddings(count, centres, seed=options['seed'] + 100 + offset)
+                buffer = io.StringIO()
+                for i, vector in enumerate(vectors):
+                    buffer.write(f'{offset + i}\t{vector_literal(vector)}\n')
+                buffer.seek(0)
+                cursor.copy_expert(f'COPY {BENCH_TABLE} (id, embedding) FROM STDIN', buffer)
+            cursor.execute(f'ANALYZE {BENCH_TABLE}')
+
+    def build_index(self, size, options):
+        if options['type'] == 'hnsw':
+            with_params = f"m = {options['m']}, ef_construction = {options['ef_construction']}"
+        else:
+            lists = options['lists'] or max(1, size // 1000)
+            with_params = f'lists = {lists}'
+
+        start = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE INDEX ON {BENCH_TABLE} USING {options['type']} "
+                f"(embedding vector_cosine_ops) WITH ({with_params})"
+            )
+        return time.perf_counter() - start
+
+    def sweep(self, options):
+        if options['type'] == 'hnsw':
+            return [('hnsw.ef_search', v) for v in options['ef_search']]
+        return [('ivfflat.probes', v) for v in options['probes']]
+
+    def run_queries(self, query_literals, k, params):
+        """
+        Run every query and return (ids per query, latency per query in ms).
+        With no params and no index yet this is the exact (sequential scan) baseline.
+        """
+        results = []
+        latencies = []
+        sql = f'SELECT id FROM {BENCH_TABLE} ORDER BY embedding <=> %s::vector LIMIT %s'
+        for literal in query_literals:
+            with ann_search(params=params):
+                with connection.cursor() as cursor:
+                    start = time.perf_counter()
+                    cursor.execute(sql, [literal, k])
+                    rows = cursor.fetchall()
+                    latencies.append((time.perf_counter() - start) * 1000)
+            results.append([row[0] for row in rows])
+        return results, latencies
+
+    def write_row(self, size, index, param, build_seconds, summary, recall):
+        self.stdout.write(
+            f"{size:>9} {index:>8} {param:>16} {build_seconds:>8.1f} "
+            f"{summary['p50']:>8.2f} {summary['p99']:>8.2f} {recall:>10.3f}"
+        )
@@ -0,0 +1,79 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from recommendations.embedding_pipeline import build_shadow_embeddings
+from recommendations.embedding_versions import active_version, get_version, shadow_coverage, start_build
+from recommendations.embedding_workers import run_embedding_pool
+from recommendations.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Encode the catalog with a new embedding version next to the live one (see embedding_versions.py).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('version', help='Embedding version name (a key of embedding_versions.VERSIONS)')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=512,
+            help='Number of books read, encoded and written per batch (default: 512)'
+        )
+        parser.add_argument(
+            '--encode-batch-size',
+            type=int,
+            default=64,
+            help='Texts per model forward pass (default: 64)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=0,
+            help='Encode in N dedicated worker processes (see reindex_embeddings --workers)'
+        )
+        parser.add_argument(
+            '--ignore-fingerprints',
+            action='store_true',
+            help='Re-encode books already built for this version'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            version = get_version(options['version'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if version.name == active_version().name:
+            raise CommandError(f"{version.name} is already active; use embed_books to refresh it.")
+
+        start_build(version.name)
+        self.stdout.write(f'Building embedding version {version.name} ({version.model_name})...')
+        start = time.perf_counter()
+
+        if options['workers'] > 0:
+            totals = run_embedding_pool(
+                Book.objects.all(),
+                workers=options['workers'],
+                page_size=options['batch_size'],
+                encode_batch_size=options['encode_batch_size'],
+                ignore_fingerprints=options['ignore_fingerprints'],
+                version=version.name,
+                shadow=True,
+                report=self.stdout.write,
+            )
+        else:
+            totals = build_shadow_embeddings(
+                version,
+                page_size=options['batch_size'],
+                encode_batch_size=options['encode_batch_size'],
+                ignore_fingerprints=options['ignore_fingerprints'],
+                report=self.stdout.write,
+            )
+
+        elapsed = time.perf_counter() - start
+        built, total = shadow_coverage(version.name)
+        self.stdout.write(self.style.SUCCESS(
+            f"Encoded {totals['processed']} books in {elapsed:.1f}s "
+            f"({totals['processed'] / elapsed if elapsed else 0:.1f} books/sec, "
+            f"{totals['skipped']} unchanged, {totals['errors']} errors)."
+        ))
+        self.stdout.write(f'{version.name} covers {built}/{total} books.')
+        if built >= total and not totals['errors']:
+            self.stdout.write(f'Switch over with: manage.py activate_embedding_version {version.name}')
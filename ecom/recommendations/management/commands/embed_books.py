@@ -1,6 +1,13 @@
+import time
 from django.core.management.base import BaseCommand
-from recommendations.models import Book
-from sentence_transformers import SentenceTransformer
+from recommendations.embedding_pipeline import (
+    changed_books, encode_texts, iter_book_batches, record_encode_stats, write_embeddings,
+)
+from recommendations.embedding_versions import active_version
+from recommendations.memory_index import mark_memory_index_stale
+from recommendations.models import Book, Purchase
+from recommendations.rag import get_sentence_transformer_model
+from recommendations.taste_profile import rebuild_taste_profile
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,13 +20,25 @@ class Command(BaseCommand):
         parser.add_argument(
             '--batch-size',
             type=int,
-            default=100,
-            help='Number of books to process in each batch (default: 100)'
+            default=512,
+            help='Number of books read, encoded and written per batch (default: 512)'
+        )
+        parser.add_argument(
+            '--encode-batch-size',
+            type=int,
+            default=64,
+            help='Texts per model forward pass (default: 64)'
         )
         parser.add_argument(
             '--force',
             action='store_true',
-            help='Regenerate embeddings even if they already exist'
+            help='Check every book, not just those without an embedding; books whose text and model are '
+                 'unchanged are still skipped (add --ignore-fingerprints to re-encode them too)'
+        )
+        parser.add_argument(
+            '--ignore-fingerprints',
+            action='store_true',
+            help='Re-encode books even when their text and model are unchanged'
         )
         parser.add_argument(
             '--book-ids',
@@ -30,11 +49,16 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         batch_size = options['batch_size']
+        encode_batch_size = options['encode_batch_size']
         force = options['force']
+        ignore_fingerprints = options['ignore_fingerprints']
         book_ids = options.get('book_ids')
 
-        self.stdout.write(self.style.SUCCESS('Loading SentenceTransformer model...'))
-        model = SentenceTransformer('all-MiniLM-L6-v2')
+        version = active_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Loading SentenceTransformer model {version.model_name} (embedding version {version.name})...'
+        ))
+        model = get_sentence_transformer_model(version.model_name)
         self.stdout.write(self.style.SUCCESS('Model loaded successfully!'))
 
         # Get books to process
@@ -43,63 +67,73 @@ class Command(BaseCommand):
             self.stdout.write(f'Processing {len(book_ids)} specific books...')
         elif force:
             books = Book.objects.all()
-            self.stdout.write(f'Regenerating embeddings for all {books.count()} books...')
+            self.stdout.write(f'Checking all {books.count()} books for changed text or model...')
         else:
             books = Book.objects.filter(embedding__isnull=True)
             self.stdout.write(f'Processing {books.count()} books without embeddings...')
 
-        if not books.exists():
+        total_books = books.count()
+        if not total_books:
             self.stdout.write(self.style.WARNING('No books to process.'))
             return
 
-        total_books = books.count()
         processed = 0
         errors = 0
         skipped = 0
+        affected_users = set()
+        start = time.perf_counter()
 
-        # Process in batches
-        for i in range(0, total_books, batch_size):
-            batch = list(books[i:i + batch_size])
-            
-            for book in batch:
-                try:
-                    # Skip if embedding exists and not forcing
-                    if book.embedding is not None and not force:
-                        skipped += 1
-                        continue
-
-                    # Combine title, author, description, and subjects for richer embeddings
-                    text = f"Title: {book.title}. Author: {book.author}. infantil: {book.infantil}. Category: {book.category}. Description: {book.description}. Subjects: {book.subjects}."
-                    
-                    # Generate embedding
-                    embedding = model.encode(text)
-                    
-                    # Save to database
-                    book.embedding = embedding
-                    book.save(update_fields=['embedding'])
-                    
-                    processed += 1
-                    
-                    # Progress update every 10 books
-                    if processed % 10 == 0:
-                        progress = (i + len(batch)) / total_books * 100
-                        self.stdout.write(
-                            f'Progress: {progress:.1f}% ({processed} processed, {errors} errors, {skipped} skipped)'
-                        )
-                
-                except Exception as e:
-                    errors += 1
-                    logger.error(f'Error processing book {book.id} ({book.title}): {e}')
-                    self.stdout.write(
-                        self.style.ERROR(f'Error processing book {book.id}: {str(e)}')
+        # Keyset pagination: writing embeddings cannot shift later pages
+        for batch in iter_book_batches(books, batch_size=batch_size):
+            ids = [book.id for book in batch]
+            # Unchanged text + model: the stored vector is still right
+            pending, unchanged = changed_books(batch, force=ignore_fingerprints, version=version)
+            skipped += unchanged
+            try:
+                if pending:
+                    pending_ids = [book.id for book, _, _ in pending]
+                    embeddings = encode_texts(model, [text for _, text, _ in pending], batch_size=encode_batch_size)
+                    processed += write_embeddings(
+                        pending_ids, embeddings, [fp for _, _, fp in pending], version=version
+                    )
+                    affected_users.update(
+                        Purchase.objects.filter(book_id__in=pending_ids).values_list('user_id', flat=True)
                     )
+                record_encode_stats('command', encoded=len(pending), skipped=unchanged)
+            except Exception as e:
+                errors += len(pending)
+                logger.error(f'Error processing books {ids[0]}-{ids[-1]}: {e}')
+                self.stdout.write(self.style.ERROR(f'Error processing books {ids[0]}-{ids[-1]}: {e}'))
+
+            elapsed = time.perf_counter() - start
+            rate = processed / elapsed if elapsed else 0.0
+            done = processed + errors + skipped
+            remaining = total_books - done
+            eta = f'{remaining / (done / elapsed):.0f}s' if done and elapsed else '?'
+            self.stdout.write(
+                f'Progress: {done}/{total_books} '
+                f'({rate:.1f} books/sec, {skipped} unchanged, {errors} errors, ETA {eta})'
+            )
+
+        elapsed = time.perf_counter() - start
+
+        # Bulk writes send no post_save: refresh what the signals would have
+        if processed:
+            mark_memory_index_stale()
+            for user_id in affected_users:
+                rebuild_taste_profile(user_id)
 
         # Final summary
         self.stdout.write(self.style.SUCCESS('\n' + '='*50))
         self.stdout.write(self.style.SUCCESS('Embedding generation complete!'))
         self.stdout.write(self.style.SUCCESS(f'Total books processed: {processed}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Elapsed: {elapsed:.1f}s ({processed / elapsed if elapsed else 0:.1f} books/sec)'
+        ))
         if skipped > 0:
-            self.stdout.write(self.style.WARNING(f'Books skipped (already had embeddings): {skipped}'))
+            self.stdout.write(self.style.WARNING(f'Books skipped (text and model unchanged): {skipped}'))
+        if affected_users:
+            self.stdout.write(self.style.SUCCESS(f'Taste profiles rebuilt: {len(affected_users)}'))
         if errors > 0:
             self.stdout.write(self.style.ERROR(f'Errors encountered: {errors}'))
-        self.stdout.write(self.style.SUCCESS('='*50))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS('='*50))
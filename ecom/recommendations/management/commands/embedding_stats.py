@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from recommendations.embedding_pipeline import changed_books, get_encode_stats, iter_book_batches
+from django.db.models import Count
+from recommendations.embedding_versions import active_version
+from recommendations.models import Book, BookEmbeddingShadow, EmbeddingVersionState
+
+
+class Command(BaseCommand):
+    help = 'Report embedding coverage and how many encodes content fingerprints have avoided.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Recompute every fingerprint to count books whose embedding is out of date'
+        )
+
+    def handle(self, *args, **options):
+        total = Book.objects.count()
+        embedded = Book.objects.filter(embedding__isnull=False).count()
+        fingerprinted = Book.objects.filter(embedding_fingerprint__isnull=False).count()
+
+        self.stdout.write('Catalog:')
+        self.stdout.write(f'  Books:                  {total}')
+        self.stdout.write(f'  With embedding:         {embedded}')
+        self.stdout.write(f'  With fingerprint:       {fingerprinted}')
+
+        self.stdout.write(f'\nEmbedding versions (active: {active_version().name}):')
+        per_version = dict(
+            Book.objects.filter(embedding__isnull=False).values_list('embedding_version')
+            .annotate(n=Count('id')).values_list('embedding_version', 'n')
+        )
+        shadow = dict(
+            BookEmbeddingShadow.objects.values_list('version').annotate(n=Count('id')).values_list('version', 'n')
+        )
+        states = {state.name: state.status for state in EmbeddingVersionState.objects.all()}
+        for name in sorted(set(per_version) | set(shadow) | set(states), key=str):
+            self.stdout.write(
+                f"  {name or '(unversioned)':<14} {states.get(name, '-'):<9} "
+                f"live {per_version.get(name, 0):>9}   building {shadow.get(name, 0):>9}"
+            )
+
+        if options['verify']:
+            stale = 0
+            for batch in iter_book_batches(Book.objects.filter(embedding__isnull=False), batch_size=2000):
+                pending, _ = changed_books(batch)
+                stale += len(pending)
+            self.stdout.write(f'  Out of date / unknown:  {stale}')
+
+        self.stdout.write('\nEncodes (since the cache was last cleared):')
+        encoded_total = 0
+        skipped_total = 0
+        for source, counts in get_encode_stats().items():
+            encoded_total += counts['encoded']
+            skipped_total += counts['skipped']
+            self.stdout.write(f"  {source:<8} encoded {counts['encoded']:>9}   avoided {counts['skipped']:>9}")
+
+        requested = encoded_total + skipped_total
+        share = skipped_total / requested * 100 if requested else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f'\nAvoided {skipped_total} of {requested} encodes ({share:.1f}%).'
+        ))
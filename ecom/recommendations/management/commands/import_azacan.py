@@ -1,114 +1,279 @@
-import json
 import os
-import requests
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from decimal import Decimal
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 from django.core.files.base import ContentFile
+from django.db import DataError, IntegrityError, connection, transaction
+from django.db.models import Q
+from recommendations.embedding_pipeline import changed_books, iter_book_batches
+from recommendations.embedding_workers import run_embedding_pool
+from recommendations.import_stream import ImportCheckpoint, iter_records
+from recommendations.memory_index import mark_memory_index_stale
 from recommendations.models import Book
+from recommendations.tasks import generate_embeddings_task
 from store.google_books import fetch_image_by_reference_from_azacan
+from store.http_client import get_client
+
+# Book fields an import sets (and overwrites with --update)
+IMPORT_FIELDS = ['title', 'author', 'stock', 'price', 'infantil', 'category', 'description', 'iva']
+
+# Books per embedding task queued after the import
+EMBED_TASK_SIZE = 1000
+
 
 class Command(BaseCommand):
-    help = 'Import cleaned Azacan book data from JSON'
+    help = 'Import cleaned Azacan book data from JSON or JSON Lines (streaming, resumable)'
 
     def add_arguments(self, parser):
-        parser.add_argument('json_file', type=str, help='Path to the cleaned JSON file')
+        parser.add_argument('json_file', type=str, help='Path to the cleaned JSON array or JSON Lines file')
         parser.add_argument('--limit', type=int, default=None, help='Limit the number of books to import')
         parser.add_argument('--skip-images', action='store_true', help='Skip downloading images')
         parser.add_argument('--update', action='store_true', help='Update existing books if reference exists')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Records upserted per statement (default: 1000)')
+        parser.add_argument(
+            '--checkpoint',
+            type=str,
+            default=None,
+            help='Checkpoint file used to resume an interrupted import (default: <json_file>.checkpoint)'
+        )
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint and start over')
+        parser.add_argument(
+            '--image-workers',
+            type=int,
+            default=None,
+            help='Parallel image downloads (default: STORE_ENRICHMENT_WORKERS)'
+        )
+        parser.add_argument(
+            '--embed-workers',
+            type=int,
+            default=0,
+            help='Embed imported books here with N worker processes instead of queueing Celery tasks'
+        )
+        parser.add_argument('--skip-embeddings', action='store_true', help='Do not (re)embed imported books')
 
-    def download_image(self, url, book_reference):
-        # First try the scraper which we verified works
-        try:
-            content = fetch_image_by_reference_from_azacan(book_reference)
-            if content:
-                return ContentFile(content, name=f"{book_reference}.jpg")
-        except Exception as e:
-            self.stdout.write(self.style.WARNING(f"Scraper failed for {book_reference}: {e}"))
-
-        # Fallback to the provided URL if scraper fails
-        if url:
-            try:
-                response = requests.get(url, timeout=10)
-                if response.status_code == 200:
-                    extension = url.split('.')[-1].split('?')[0]
-                    if not extension or len(extension) > 4:
-                        extension = "jpg"
-                    filename = f"{book_reference}.{extension}"
-                    return ContentFile(response.content, name=filename)
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f"Direct download failed for {book_reference}: {e}"))
-        
-        return None
+    @staticmethod
+    def book_from_record(item):
+        """
+        Unsaved Book for a record; raises on values that do not convert
+        (e.g. a non-numeric price), so the record can be skipped on its own.
+        """
+        return Book(
+            reference=item['reference'],
+            title=item.get('title'),
+            author=item.get('author'),
+            stock=item.get('stock', 0),
+            price=Decimal(str(item.get('price', 0))),
+            infantil=item.get('infantil'),
+            category=item.get('category'),
+            description=item.get('description'),
+            iva=Decimal(str(item.get('iva', 0))),
+        )
+
+    def upsert(self, books, update):
+        """
+        Write a batch of books in one INSERT ... ON CONFLICT (reference).
+
+        Args:
+            books (dict): {reference: unsaved Book}
+
+        Returns:
+            tuple: (created, updated)
+        """
+        existing = set(Book.objects.filter(reference__in=books).values_list('reference', flat=True))
+        if update:
+            Book.objects.bulk_create(
+                books.values(),
+                update_conflicts=True,
+                unique_fields=['reference'],
+                update_fields=IMPORT_FIELDS + ['updated_at'],
+            )
+        else:
+            Book.objects.bulk_create([b for ref, b in books.items() if ref not in existing], ignore_conflicts=True)
+        return len(books) - len(existing), len(existing) if update else 0
 
     def handle(self, *args, **options):
         json_file = options['json_file']
         limit = options['limit']
         skip_images = options['skip_images']
         update = options['update']
+        batch_size = options['batch_size']
 
         if not os.path.exists(json_file):
             self.stdout.write(self.style.ERROR(f"File not found: {json_file}"))
             return
 
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        if limit:
-            data = data[:limit]
+        checkpoint = ImportCheckpoint(options['checkpoint'] or f"{json_file}.checkpoint", json_file)
+        if not options['restart'] and checkpoint.load():
+            self.stdout.write(self.style.WARNING(
+                f"Resuming import: {checkpoint.records} records already imported, phase '{checkpoint.phase}'"
+            ))
+        else:
+            checkpoint.save(records=0, phase='rows')
 
+        # Phase 1: stream records into batched upserts. bulk_create sends no
+        # post_save, so no per-row embedding task is queued (see phase 2)
         count = 0
+        created = 0
         updated = 0
         errors = 0
+        image_urls = {}
+        # {reference: Book}; the last record wins if a reference repeats within a batch
+        batch = {}
+        start = time.perf_counter()
 
-        for item in data:
+        def flush():
+            nonlocal created, updated, errors, batch
             try:
+                with transaction.atomic():
+                    batch_created, batch_updated = self.upsert(batch, update)
+                created += batch_created
+                updated += batch_updated
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(
+                    f"Batch ending at record {count} failed ({e}); retrying it row by row"
+                ))
+                for reference, book in batch.items():
+                    try:
+                        with transaction.atomic():
+                            book_created, book_updated = self.upsert({reference: book}, update)
+                    except (DataError, IntegrityError) as e:
+                        # The row itself is bad: retrying it on resume would fail again
+                        errors += 1
+                        self.stdout.write(self.style.ERROR(f"Error importing book {reference}: {e}"))
+                        continue
+                    except Exception as e:
+                        # Not this row's fault (e.g. the database went away): stop
+                        # before the checkpoint moves past rows that were not written
+                        raise CommandError(
+                            f"Import stopped at book {reference}: {e}. Run the command again to resume."
+                        )
+                    created += book_created
+                    updated += book_updated
+            # Every record up to here is written or rejected as invalid
+            checkpoint.save(records=count)
+            batch = {}
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"Processed {count} books... ({count / elapsed if elapsed else 0:.0f} records/sec)")
+
+        try:
+            for item in iter_records(json_file):
+                if limit is not None and count >= limit:
+                    break
                 reference = item.get('reference')
                 if not reference:
                     continue
+                count += 1
+                if not skip_images:
+                    image_urls[reference] = item.get('image_url')
+                if checkpoint.phase != 'rows' or count <= checkpoint.records:
+                    # Committed before the interruption
+                    continue
+                try:
+                    batch[reference] = self.book_from_record(item)
+                except Exception as e:
+                    # One bad record (e.g. a non-numeric price) is skipped on its own
+                    errors += 1
+                    self.stdout.write(self.style.ERROR(f"Error importing book {reference}: {e}"))
+                    continue
+                if len(batch) >= batch_size:
+                    flush()
+        except ValueError as e:
+            raise CommandError(f"Could not parse {json_file} after record {count}: {e}")
+        if batch:
+            flush()
+        if checkpoint.phase == 'rows':
+            checkpoint.save(phase='embeddings')
 
-                book, created = Book.objects.get_or_create(reference=reference, defaults={
-                    'title': item.get('title'),
-                    'author': item.get('author'),
-                    'stock': item.get('stock', 0),
-                    'price': Decimal(str(item.get('price', 0))),
-                    'infantil': item.get('infantil'),
-                    'category': item.get('category'),
-                    'description': item.get('description'),
-                    'iva': Decimal(str(item.get('iva', 0))),
-                })
-
-                if not created and update:
-                    book.title = item.get('title')
-                    book.author = item.get('author')
-                    book.stock = item.get('stock', 0)
-                    book.price = Decimal(str(item.get('price', 0)))
-                    book.infantil = item.get('infantil')
-                    book.category = item.get('category')
-                    book.description = item.get('description')
-                    book.iva = Decimal(str(item.get('iva', 0)))
-                    book.save()
-                    updated += 1
-                elif not created:
-                    # If we are not updating, skip but still maybe try to download image if missing
-                    pass
-                
-                if count >= (limit or 999999):
-                    break
+        self.stdout.write(self.style.SUCCESS(
+            f"Import complete: {count} processed, {created} created, {updated} updated, {errors} errors."
+        ))
 
-                if not skip_images:
-                    # If book has no image, try to download it
-                    if not book.image:
-                        image_file = self.download_image(item.get('image_url'), reference)
-                        if image_file:
-                            book.image.save(image_file.name, image_file, save=True)
-                            self.stdout.write(f"Downloaded image for {reference}")
+        # Phase 2: one batched embedding pass over the books this import touched
+        if checkpoint.phase == 'embeddings':
+            mark_memory_index_stale()
+            if not options['skip_embeddings']:
+                self.embed(Book.objects.filter(updated_at__gte=checkpoint.started_at), options['embed_workers'])
+            checkpoint.save(phase='images')
 
-                count += 1
-                if count % 10 == 0:
-                    self.stdout.write(f"Processed {count} books...")
+        # Phase 3: images, downloaded in parallel
+        if not skip_images:
+            self.download_images(image_urls, options['image_workers'])
 
+        checkpoint.clear()
+
+    def embed(self, books, workers):
+        if workers > 0:
+            totals = run_embedding_pool(books, workers=workers, report=self.stdout.write)
+            self.stdout.write(self.style.SUCCESS(
+                f"Embedded {totals['processed']} books ({totals['skipped']} unchanged, {totals['errors']} errors)."
+            ))
+            return
+
+        pending_ids = []
+        for page in iter_book_batches(books, batch_size=2000):
+            # Books whose text is unchanged keep their embedding
+            pending, _ = changed_books(page)
+            pending_ids.extend(book.id for book, _, _ in pending)
+        for i in range(0, len(pending_ids), EMBED_TASK_SIZE):
+            generate_embeddings_task.delay(pending_ids[i:i + EMBED_TASK_SIZE])
+        self.stdout.write(self.style.SUCCESS(f"Queued embeddings for {len(pending_ids)} books."))
+
+    def download_image(self, url, book_reference):
+        try:
+            # First try the scraper which we verified works
+            try:
+                content = fetch_image_by_reference_from_azacan(book_reference)
+                if content:
+                    return ContentFile(content, name=f"{book_reference}.jpg")
             except Exception as e:
-                self.stdout.write(self.style.ERROR(f"Error importing book {item.get('reference')}: {e}"))
-                errors += 1
+                self.stdout.write(self.style.WARNING(f"Scraper failed for {book_reference}: {e}"))
+
+            # Fallback to the provided URL if scraper fails
+            if url:
+                try:
+                    response = get_client().get(url, timeout=10)
+                    if response.status_code == 200:
+                        extension = url.split('.')[-1].split('?')[0]
+                        if not extension or len(extension) > 4:
+                            extension = "jpg"
+                        filename = f"{book_reference}.{extension}"
+                        return ContentFile(response.content, name=filename)
+                except Exception as e:
+                    self.stdout.write(self.style.WARNING(f"Direct download failed for {book_reference}: {e}"))
+
+            return None
+        finally:
+            # Runs on a worker thread; the response cache opened a connection for it
+            connection.close()
 
-        self.stdout.write(self.style.SUCCESS(f"Import complete: {count} processed, {updated} updated, {errors} errors."))
+    def download_images(self, image_urls, workers):
+        """
+        Fetch images for imported books that have none, on a thread pool;
+        rows are saved on this thread.
+        """
+        workers = workers or getattr(settings, 'STORE_ENRICHMENT_WORKERS', 8)
+        references = list(image_urls)
+        downloaded = 0
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='import-images') as pool:
+            for i in range(0, len(references), 500):
+                books = (
+                    Book.objects.filter(reference__in=references[i:i + 500])
+                    .filter(Q(image='') | Q(image__isnull=True))
+                    .only('id', 'reference', 'image')
+                )
+                futures = {
+                    pool.submit(self.download_image, image_urls[book.reference], book.reference): book
+                    for book in books
+                }
+                for future in as_completed(futures):
+                    book = futures[future]
+                    image_file = future.result()
+                    if image_file:
+                        book.image.save(image_file.name, image_file, save=False)
+                        # Image-only save: the embedding signal ignores it
+                        book.save(update_fields=['image'])
+                        downloaded += 1
+                        self.stdout.write(f"Downloaded image for {book.reference}")
+        self.stdout.write(self.style.SUCCESS(f"Downloaded {downloaded} images."))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from recommendations.models import Purchase, UserTasteProfile
+from recommendations.taste_profile import rebuild_taste_profile
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized taste vectors used for purchase-history recommendations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user-ids',
+            nargs='+',
+            type=int,
+            help='Specific user IDs to rebuild (space-separated; default: every user with purchases)'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options.get('user_ids')
+        if not user_ids:
+            user_ids = list(Purchase.objects.values_list('user_id', flat=True).distinct().order_by('user_id'))
+            # Profiles left behind by users whose purchases were all removed
+            UserTasteProfile.objects.exclude(user_id__in=user_ids).delete()
+
+        self.stdout.write(f'Rebuilding taste profiles for {len(user_ids)} users...')
+        built = 0
+        for i, user_id in enumerate(user_ids, start=1):
+            if rebuild_taste_profile(user_id) is not None:
+                built += 1
+            if i % 500 == 0:
+                self.stdout.write(f'Progress: {i}/{len(user_ids)} users')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Built {built} taste profiles ({len(user_ids) - built} users have no embedded purchases).'
+        ))
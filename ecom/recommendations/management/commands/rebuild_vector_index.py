@@ -0,0 +1,87 @@
+import math
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from recommendations.models import Book
+from recommendations.vector_search import ANN_INDEX_NAME, ANN_INDEX_TYPES, MODEL_INDEX_TYPE
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the ANN (HNSW/IVFFlat) index on Book.embedding without blocking writes. '
+        'Book.Meta.indexes declares it as HNSW; an --type ivfflat build is a database-only '
+        'change that migrations do not know about (see recommendations/vector_search.py).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type',
+            choices=ANN_INDEX_TYPES,
+            default='hnsw',
+            help='Index type to build (default: hnsw, the type the model declares)'
+        )
+        parser.add_argument('--m', type=int, default=16, help='HNSW: max connections per layer (default: 16)')
+        parser.add_argument('--ef-construction', type=int, default=64, help='HNSW: build-time candidate list size (default: 64)')
+        parser.add_argument(
+            '--lists',
+            type=int,
+            default=None,
+            help='IVFFlat: number of lists (default: rows/1000, or sqrt(rows) above 1M rows)'
+        )
+        parser.add_argument(
+            '--maintenance-work-mem',
+            type=str,
+            default=None,
+            help="Session maintenance_work_mem for the build, e.g. '1GB'"
+        )
+
+    def handle(self, *args, **options):
+        index_type = options['type']
+        table = Book._meta.db_table
+        new_name = f'{ANN_INDEX_NAME}_new'
+
+        if connection.vendor != 'postgresql':
+            raise CommandError('Vector indexes require PostgreSQL with the pgvector extension.')
+
+        if index_type == 'hnsw':
+            with_params = f"m = {options['m']}, ef_construction = {options['ef_construction']}"
+        else:
+            lists = options['lists'] or self.default_lists()
+            with_params = f'lists = {lists}'
+
+        with connection.cursor() as cursor:
+            if options['maintenance_work_mem']:
+                cursor.execute('SET maintenance_work_mem = %s', [options['maintenance_work_mem']])
+
+            # Leftover from an interrupted run (CONCURRENTLY leaves INVALID indexes behind)
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {new_name}')
+
+            self.stdout.write(f'Building {index_type} index {new_name} ({with_params})...')
+            start = time.perf_counter()
+            cursor.execute(
+                f'CREATE INDEX CONCURRENTLY {new_name} ON {table} '
+                f'USING {index_type} (embedding vector_cosine_ops) WITH ({with_params})'
+            )
+            elapsed = time.perf_counter() - start
+
+            # Swap the new index in under the canonical name
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {ANN_INDEX_NAME}')
+            cursor.execute(f'ALTER INDEX {new_name} RENAME TO {ANN_INDEX_NAME}')
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {ANN_INDEX_NAME} as {index_type} in {elapsed:.1f}s.'))
+        if index_type != MODEL_INDEX_TYPE:
+            self.stdout.write(self.style.WARNING(
+                f'{ANN_INDEX_NAME} is now {index_type}, but Book.Meta.indexes still declares it as '
+                f'{MODEL_INDEX_TYPE}: a migration that alters or recreates it will act on the declared '
+                f'type. Run `rebuild_vector_index --type {MODEL_INDEX_TYPE}` before such a migration.'
+            ))
+        self.stdout.write(
+            f'Remember to set PGVECTOR_INDEX_TYPE={index_type} so queries use the matching search parameter.'
+        )
+
+    def default_lists(self):
+        # pgvector guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond that
+        rows = Book.objects.filter(embedding__isnull=False).count()
+        if rows <= 1_000_000:
+            return max(1, rows // 1000)
+        return int(math.sqrt(rows))
@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from recommendations.embedding_workers import default_threads_per_worker, run_embedding_pool
 from recommendations.models import Book
 from recommendations.tasks import generate_embeddings_task
 
@@ -17,6 +18,35 @@ class Command(BaseCommand):
             action='store_true',
             help='Only generate embeddings for books that do not have one'
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=0,
+            help='Encode in N dedicated local worker processes instead of queuing Celery tasks'
+        )
+        parser.add_argument(
+            '--threads-per-worker',
+            type=int,
+            default=None,
+            help='Torch threads per worker process (default: CPU cores / workers)'
+        )
+        parser.add_argument(
+            '--range-size',
+            type=int,
+            default=5000,
+            help='Books per unit of work handed to a worker process (default: 5000)'
+        )
+        parser.add_argument(
+            '--encode-batch-size',
+            type=int,
+            default=64,
+            help='Texts per model forward pass in worker processes (default: 64)'
+        )
+        parser.add_argument(
+            '--ignore-fingerprints',
+            action='store_true',
+            help='Worker mode: re-encode books even when their text and model are unchanged'
+        )
 
     def handle(self, *args, **options):
         batch_size = options['batch_size']
@@ -25,6 +55,10 @@ class Command(BaseCommand):
         books = Book.objects.all()
         if missing_only:
             books = books.filter(embedding__isnull=True)
+
+        if options['workers'] > 0:
+            self.run_worker_pool(books, options)
+            return
             
         book_ids = list(books.values_list('id', flat=True))
         total_books = len(book_ids)
@@ -42,3 +76,25 @@ class Command(BaseCommand):
             task_count += 1
             
         self.stdout.write(self.style.SUCCESS(f"Successfully scheduled {task_count} tasks."))
+
+    def run_worker_pool(self, books, options):
+        workers = options['workers']
+        threads = options['threads_per_worker'] or default_threads_per_worker(workers)
+        self.stdout.write(
+            f"Encoding with {workers} worker processes x {threads} threads "
+            f"in ranges of {options['range_size']} books..."
+        )
+        totals = run_embedding_pool(
+            books,
+            workers=workers,
+            threads=threads,
+            range_size=options['range_size'],
+            encode_batch_size=options['encode_batch_size'],
+            missing_only=options['missing_only'],
+            ignore_fingerprints=options['ignore_fingerprints'],
+            report=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Embedded {totals['processed']} books in {totals['seconds']:.1f}s "
+            f"({totals['books_per_sec']:.1f} books/sec, {totals['skipped']} unchanged, {totals['errors']} errors)."
+        ))
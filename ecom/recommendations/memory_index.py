@@ -0,0 +1,260 @@
+"""
+In-process vector index over Book embeddings.
+
+The whole catalog fits in RAM as a (n_books x 384) float32 matrix, so a
+top-k cosine query is one matrix-vector product plus argpartition, without a
+round trip to Postgres. Enable it with RECOMMENDATIONS_VECTOR_BACKEND='memory'.
+
+The index is kept current in two ways:
+- Book post_save/post_delete in this process update it directly
+  (see recommendations/signals.py).
+- Writers in other processes (Celery embedding tasks use bulk_update, which
+  sends no signals) call mark_memory_index_stale(); every process checks that
+  shared stamp at most every RECOMMENDATIONS_MEMORY_INDEX_REFRESH_SECONDS and
+  reloads when it is newer than its copy.
+"""
+import logging
+import threading
+import time
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from recommendations.models import Book
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIMENSIONS = 384
+STALE_STAMP_CACHE_KEY = 'recommendations_memory_index_stamp'
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class InMemoryVectorIndex:
+    """
+    Contiguous, L2-normalised embedding matrix with the matching Book ids.
+
+    Searches read a snapshot of (ids, matrix); writes build new arrays and
+    swap them in under a lock, so readers never see a half-written
+    index.
+    """
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._ids = np.empty(0, dtype=np.int64)
+        self._matrix = np.empty((0, dimensions), dtype=np.float32)
+        self._positions = {}
+        self.loaded_at = None
+        self.last_checked = 0.0
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def load(self, chunk_size: int = 2000):
+        """
+        (Re)load every Book id and embedding from the database.
+        """
+        start = time.perf_counter()
+        loaded_at = time.time()
+        ids = []
+        vectors = []
+        rows = (
+            Book.objects.filter(embedding__isnull=False)
+            .order_by('id')
+            .values_list('id', 'embedding')
+            .iterator(chunk_size=chunk_size)
+        )
+        for book_id, embedding in rows:
+            ids.append(book_id)
+            vectors.append(embedding)
+
+        if vectors:
+            matrix = np.ascontiguousarray(np.vstack(vectors), dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix /= norms
+        else:
+            matrix = np.empty((0, self.dimensions), dtype=np.float32)
+
+        id_array = np.asarray(ids, dtype=np.int64)
+        with self._lock:
+            self._ids = id_array
+            self._matrix = matrix
+            self._positions = {book_id: pos for pos, book_id in enumerate(ids)}
+            self.loaded_at = loaded_at
+            self.last_checked = loaded_at
+
+        logger.info(
+            f"Loaded in-memory vector index: {len(ids)} books in {time.perf_counter() - start:.2f}s "
+            f"({matrix.nbytes / 1e6:.1f} MB)"
+        )
+        return self
+
+    def snapshot(self):
+        """
+        The current (Book ids, normalised embedding matrix), for bulk readers.
+        """
+        with self._lock:
+            return self._ids, self._matrix
+
+    def upsert(self, book_id: int, embedding):
+        """
+        Insert or replace a single book's embedding.
+        """
+        vector = _normalize(embedding)
+        with self._lock:
+            pos = self._positions.get(book_id)
+            if pos is not None:
+                matrix = self._matrix.copy()
+                matrix[pos] = vector
+                self._matrix = matrix
+                return
+            self._matrix = np.ascontiguousarray(np.vstack([self._matrix, vector[None, :]]))
+            self._ids = np.append(self._ids, np.int64(book_id))
+            self._positions[book_id] = len(self._ids) - 1
+
+    def remove(self, book_id: int):
+        """
+        Drop a book from the index (no-op if it is not indexed).
+        """
+        with self._lock:
+            pos = self._positions.pop(book_id, None)
+            if pos is None:
+                return
+            keep = np.ones(len(self._ids), dtype=bool)
+            keep[pos] = False
+            self._matrix = np.ascontiguousarray(self._matrix[keep])
+            self._ids = self._ids[keep]
+            self._positions = {int(b): p for p, b in enumerate(self._ids)}
+
+    def search(self, query_embedding, top_k: int = 5, exclude_ids=None):
+        """
+        Exact top-k cosine search.
+
+        Returns:
+            tuple: (list of Book ids, list of cosine distances), closest first
+        """
+        with self._lock:
+            ids, matrix, positions = self._ids, self._matrix, self._positions
+
+        if top_k <= 0 or not len(ids):
+            return [], []
+
+        scores = matrix @ _normalize(query_embedding)
+        if exclude_ids:
+            excluded = [positions[i] for i in exclude_ids if i in positions]
+            scores[excluded] = -np.inf
+
+        k = min(top_k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = top[np.isfinite(scores[top])]
+        return ids[top].tolist(), (1.0 - scores[top]).tolist()
+
+    def search_batch(self, query_embeddings, top_k: int = 5):
+        """
+        Exact top-k cosine search for several queries with one matrix-matrix product.
+
+        Returns:
+            list: One (ids, distances) tuple per query, in input order
+        """
+        with self._lock:
+            ids, matrix = self._ids, self._matrix
+
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        if top_k <= 0 or not len(ids):
+            return [([], []) for _ in range(len(queries))]
+
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        scores = matrix @ (queries / norms).T  # (n_books, n_queries)
+
+        k = min(top_k, len(ids))
+        top = np.argpartition(-scores, k - 1, axis=0)[:k]
+        results = []
+        for j in range(scores.shape[1]):
+            column = top[:, j]
+            column = column[np.argsort(-scores[column, j])]
+            results.append((ids[column].tolist(), (1.0 - scores[column, j]).tolist()))
+        return results
+
+    def refresh_if_stale(self):
+        """
+        Reload when another process has marked the index stale since our last load.
+        Checks the shared stamp at most every RECOMMENDATIONS_MEMORY_INDEX_REFRESH_SECONDS.
+        """
+        interval = getattr(settings, 'RECOMMENDATIONS_MEMORY_INDEX_REFRESH_SECONDS', 10)
+        now = time.time()
+        if now - self.last_checked < interval:
+            return
+        with self._refresh_lock:
+            if now - self.last_checked < interval:
+                return
+            self.last_checked = now
+            stamp = cache.get(STALE_STAMP_CACHE_KEY)
+            if stamp and stamp > self.loaded_at:
+                logger.info("In-memory vector index is stale, reloading")
+                self.load()
+
+
+_memory_index = None
+_memory_index_lock = threading.Lock()
+
+
+def get_memory_index() -> InMemoryVectorIndex:
+    """
+    Get (loading on first use) the process-wide in-memory index.
+    """
+    global _memory_index
+    if _memory_index is None:
+        with _memory_index_lock:
+            if _memory_index is None:
+                _memory_index = InMemoryVectorIndex().load()
+    else:
+        _memory_index.refresh_if_stale()
+    return _memory_index
+
+
+def loaded_memory_index() -> InMemoryVectorIndex | None:
+    """
+    This process's index if it has already been loaded, without loading it.
+    """
+    if _memory_index is not None:
+        _memory_index.refresh_if_stale()
+    return _memory_index
+
+
+def update_memory_index(book):
+    """
+    Reflect a saved Book in this process's index, if one has been loaded.
+    """
+    if _memory_index is None:
+        return
+    if book.embedding is None:
+        _memory_index.remove(book.id)
+    else:
+        _memory_index.upsert(book.id, book.embedding)
+
+
+def remove_from_memory_index(book_id: int):
+    """
+    Drop a deleted Book from this process's index, if one has been loaded.
+    """
+    if _memory_index is not None:
+        _memory_index.remove(book_id)
+
+
+def mark_memory_index_stale():
+    """
+    Tell every process's index to reload (used after bulk embedding writes).
+    """
+    cache.set(STALE_STAMP_CACHE_KEY, time.time(), None)
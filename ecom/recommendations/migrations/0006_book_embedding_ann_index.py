@@ -0,0 +1,26 @@
+import pgvector.django.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+    atomic = False
+
+    dependencies = [
+        ("recommendations", "0005_searchquerycache_alter_book_id_alter_purchase_id"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="book",
+            index=pgvector.django.indexes.HnswIndex(
+                ef_construction=64,
+                fields=["embedding"],
+                m=16,
+                name="book_embedding_ann_idx",
+                opclasses=["vector_cosine_ops"],
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.10 on 2026-10-17 03:12
+
+import django.db.models.deletion
+import pgvector.django.vector
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('recommendations', '0006_book_embedding_ann_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTasteProfile',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='taste_profile', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('embedding', pgvector.django.vector.VectorField(dimensions=384)),
+                ('weight', models.FloatField(default=0.0)),
+                ('purchase_count', models.IntegerField(default=0)),
+                ('last_purchase_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+    ]
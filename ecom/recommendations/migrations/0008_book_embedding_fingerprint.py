@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-17 03:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0007_usertasteprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='embedding_fingerprint',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
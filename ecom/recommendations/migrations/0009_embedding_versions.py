@@ -0,0 +1,43 @@
+# Generated by Django 5.2.10 on 2026-10-17 03:25
+
+import django.db.models.deletion
+import pgvector.django.vector
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0008_book_embedding_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmbeddingVersionState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32, unique=True)),
+                ('status', models.CharField(choices=[('building', 'Building'), ('active', 'Active'), ('retired', 'Retired')], db_index=True, default='building', max_length=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('activated_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='embedding_version',
+            field=models.CharField(blank=True, db_index=True, max_length=32, null=True),
+        ),
+        migrations.CreateModel(
+            name='BookEmbeddingShadow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.CharField(max_length=32)),
+                ('embedding', pgvector.django.vector.VectorField(dimensions=384)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shadow_embeddings', to='recommendations.book')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('version', 'book'), name='unique_shadow_embedding_per_version')],
+            },
+        ),
+    ]
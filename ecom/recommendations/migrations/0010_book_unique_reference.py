@@ -0,0 +1,34 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def normalize_references(apps, schema_editor):
+    """
+    Blank references mean "no reference": store them as NULL so they do not
+    collide, and refuse to continue if real duplicates need a decision.
+    """
+    Book = apps.get_model('recommendations', 'Book')
+    Book.objects.filter(reference='').update(reference=None)
+    duplicates = list(
+        Book.objects.exclude(reference=None).values('reference')
+        .annotate(n=Count('id')).filter(n__gt=1).values_list('reference', flat=True)[:20]
+    )
+    if duplicates:
+        raise RuntimeError(
+            f"Books share these references, merge or clear them before migrating: {', '.join(duplicates)}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0009_embedding_versions'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_references, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='book',
+            constraint=models.UniqueConstraint(fields=('reference',), name='unique_book_reference'),
+        ),
+    ]
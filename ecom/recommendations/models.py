@@ -1,5 +1,5 @@
 from django.db import models
-from pgvector.django import VectorField
+from pgvector.django import VectorField, HnswIndex
 from django.contrib.auth.models import User
 
 class Book(models.Model):
@@ -15,6 +15,8 @@ class Book(models.Model):
     image = models.ImageField(upload_to='books', blank=True, null=True)
     subjects = models.CharField(max_length=255, blank=True, null=True)  # Comma-separated
     embedding = VectorField(dimensions=384, null=True, blank=True)  # For SentenceTransformer 'all-MiniLM-L6-v2' (384 dims)
+    embedding_fingerprint = models.CharField(max_length=64, blank=True, null=True)  # sha256 of model name + encoded text
+    embedding_version = models.CharField(max_length=32, blank=True, null=True, db_index=True)  # See embedding_versions.py
 
     created_at = models.DateTimeField(auto_now_add=True)  # When added
     updated_at = models.DateTimeField(auto_now=True)      # Last modified
@@ -25,6 +27,19 @@ class Book(models.Model):
             models.Index(fields=['title']), 
             models.Index(fields=['author']),
             models.Index(fields=['category']),
+            # ANN index for cosine similarity search (rebuild with `manage.py rebuild_vector_index`;
+            # an IVFFlat rebuild is not reflected here, see vector_search.MODEL_INDEX_TYPE)
+            HnswIndex(
+                name='book_embedding_ann_idx',
+                fields=['embedding'],
+                m=16,
+                ef_construction=64,
+                opclasses=['vector_cosine_ops'],
+            ),
+        ]
+        constraints = [
+            # Azacán reference: the key import_azacan upserts on (NULLs stay allowed)
+            models.UniqueConstraint(fields=['reference'], name='unique_book_reference'),
         ]
 
     def __str__(self):
@@ -61,3 +76,59 @@ class RecommendationFeedback(models.Model):
     def __str__(self):
         verdict = "Positive" if self.is_positive else "Negative"
         return f"{verdict} feedback for {self.book.title} (User: {self.user})"
+
+class UserTasteProfile(models.Model):
+    """
+    Materialized taste vector per user: the (optionally recency-weighted) mean
+    embedding of the books they bought. Maintained by recommendations/taste_profile.py.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='taste_profile')
+    embedding = VectorField(dimensions=384)
+    weight = models.FloatField(default=0.0)  # Sum of purchase weights as of updated_at
+    purchase_count = models.IntegerField(default=0)
+    last_purchase_id = models.BigIntegerField(default=0)  # Newest Purchase folded in
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Taste profile for {self.user} ({self.purchase_count} purchases)"
+
+
+class EmbeddingVersionState(models.Model):
+    """
+    Lifecycle of an embedding version (recommendations/embedding_versions.py).
+    At most one version is active: the one Book.embedding and queries use.
+    """
+    STATUS_BUILDING = 'building'
+    STATUS_ACTIVE = 'active'
+    STATUS_RETIRED = 'retired'
+    STATUS_CHOICES = [
+        (STATUS_BUILDING, 'Building'),
+        (STATUS_ACTIVE, 'Active'),
+        (STATUS_RETIRED, 'Retired'),
+    ]
+
+    name = models.CharField(max_length=32, unique=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_BUILDING, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    activated_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Embedding version {self.name} ({self.status})"
+
+class BookEmbeddingShadow(models.Model):
+    """
+    Embeddings for a version that is being built next to the live Book.embedding
+    column; copied over in one transaction when the version is activated.
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='shadow_embeddings')
+    version = models.CharField(max_length=32)
+    embedding = VectorField(dimensions=384)
+    fingerprint = models.CharField(max_length=64)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['version', 'book'], name='unique_shadow_embedding_per_version'),
+        ]
+
+    def __str__(self):
+        return f"{self.version} embedding for book {self.book_id}"
@@ -0,0 +1,140 @@
+"""
+Query understanding stage: HyDE and query expansion for a search query.
+
+Both are LLM calls that used to run one after the other, and were repeated
+for every request with the same query. understand_query():
+
+- runs the HyDE document and the expansion variations concurrently on a
+  shared thread pool,
+- coalesces identical in-flight work, so N users searching the same text at
+  the same moment wait on one LLM call per stage, and
+- caches successful outputs for RECOMMENDATIONS_QUERY_UNDERSTANDING_TTL seconds.
+
+Failed stages fall back (no HyDE document / the bare query) and are not cached.
+"""
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from django.conf import settings
+from django.core.cache import cache
+from recommendations.embedding_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueryUnderstanding:
+    query: str
+    variations: list = field(default_factory=list)
+    hypothetical_doc: str | None = None
+
+    def retrieval_queries(self) -> list[str]:
+        """
+        Texts to run vector retrieval with: the variations (starting with the
+        original query), then the HyDE document.
+        """
+        queries = list(self.variations) or [self.query]
+        if self.hypothetical_doc:
+            queries.append(self.hypothetical_doc)
+        return list(dict.fromkeys(queries))
+
+
+def _generate_hyde(query):
+    from recommendations.hyde import generate_hypothetical_document
+    return generate_hypothetical_document(query)
+
+
+def _generate_variations(query):
+    from recommendations.expansion import generate_query_variations
+    return generate_query_variations(query)
+
+
+STAGES = {
+    'hyde': _generate_hyde,
+    'expansion': _generate_variations,
+}
+
+_executor = None
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _inflight_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'RECOMMENDATIONS_QUERY_UNDERSTANDING_WORKERS', 8),
+                    thread_name_prefix='query-understanding',
+                )
+    return _executor
+
+
+def _stage_cache_key(stage: str, query: str) -> str:
+    digest = hashlib.sha256(normalize_query(query).encode('utf-8')).hexdigest()
+    return f'query_understanding:{stage}:{digest}'
+
+
+def _run_stage(stage: str, key: str, query: str):
+    try:
+        result = STAGES[stage](query)
+        cache.set(key, result, getattr(settings, 'RECOMMENDATIONS_QUERY_UNDERSTANDING_TTL', 60 * 60 * 24))
+        return result
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def _submit_stage(stage: str, query: str):
+    """
+    Future for a stage's output, shared with any identical call already in flight.
+    """
+    key = _stage_cache_key(stage, query)
+    executor = _get_executor()
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is None:
+            # _run_stage removes the entry under the same lock, so it cannot
+            # finish before the future is registered
+            future = executor.submit(_run_stage, stage, key, query)
+            _inflight[key] = future
+    return future
+
+
+def understand_query(query: str, hyde: bool = True, expansion: bool = True) -> QueryUnderstanding:
+    """
+    HyDE document and expansion variations for a query, from cache or from
+    concurrent (and de-duplicated) LLM calls.
+    """
+    understanding = QueryUnderstanding(query=query, variations=[query])
+    wanted = [stage for stage, enabled in (('hyde', hyde), ('expansion', expansion)) if enabled]
+
+    cached = cache.get_many([_stage_cache_key(stage, query) for stage in wanted])
+    futures = {}
+    results = {}
+    for stage in wanted:
+        key = _stage_cache_key(stage, query)
+        if key in cached:
+            results[stage] = cached[key]
+        else:
+            futures[stage] = _submit_stage(stage, query)
+
+    timeout = getattr(settings, 'RECOMMENDATIONS_QUERY_UNDERSTANDING_TIMEOUT', 60)
+    for stage, future in futures.items():
+        try:
+            results[stage] = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            logger.error(f"Query understanding stage '{stage}' timed out for '{query}'")
+        except Exception as e:
+            logger.error(f"Query understanding stage '{stage}' failed for '{query}': {e}")
+
+    if results.get('expansion'):
+        understanding.variations = results['expansion']
+    understanding.hypothetical_doc = results.get('hyde') or None
+    logger.info(
+        f"Query understanding for '{query}': {len(cached)} cached, {len(futures)} generated"
+    )
+    return understanding
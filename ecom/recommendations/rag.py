@@ -1,32 +1,43 @@
-import os
 import re
+import json
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_ollama import ChatOllama
-from langchain_core.output_parsers import StrOutputParser
-from pgvector.django import CosineDistance
-from recommendations.models import Book, Purchase, SearchQueryCache
+from recommendations import llm
+from recommendations.models import Book, SearchQueryCache
+from recommendations.reasons import async_reasons_enabled, dispatch_reasons_job
+from recommendations.singleflight import DontCache, cached_call, stable_digest
+from recommendations.taste_profile import taste_candidates
+from recommendations.vector_search import nearest_books, nearest_books_batch
 from sentence_transformers import SentenceTransformer, CrossEncoder
-from django.core.cache import cache
-from django.contrib.auth.models import User
-import numpy as np
+from django.conf import settings
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
-# Singleton pattern for model caching
-_model_cache = None
+SENTENCE_TRANSFORMER_MODEL_NAME = 'all-MiniLM-L6-v2'  # Model of the default embedding version
+RERANKER_MODEL_NAME = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+# The reranker is uncased: queries are lowercased so case variants share cached scores
+RERANKER_LOWERCASE_QUERIES = True
 
-def get_sentence_transformer_model():
+# Singleton pattern for model caching, one instance per model name
+_model_cache = {}
+
+def get_sentence_transformer_model(model_name=None):
     """
     Get or create a cached SentenceTransformer model.
     Uses module-level singleton pattern to avoid reloading on every request.
+
+    Args:
+        model_name (str): Model to load (default: the active embedding version's)
     """
-    global _model_cache
-    if _model_cache is None:
-        logger.info("Loading SentenceTransformer model 'all-MiniLM-L6-v2'...")
-        _model_cache = SentenceTransformer('all-MiniLM-L6-v2')
+    if model_name is None:
+        from recommendations.embedding_versions import active_version
+        model_name = active_version().model_name
+    if model_name not in _model_cache:
+        logger.info(f"Loading SentenceTransformer model '{model_name}'...")
+        _model_cache[model_name] = SentenceTransformer(model_name)
         logger.info("Model loaded successfully")
-    return _model_cache
+    return _model_cache[model_name]
 
 _reranker_cache = None
 
@@ -36,15 +47,117 @@ def get_reranker_model():
     """
     global _reranker_cache
     if _reranker_cache is None:
-        logger.info("Loading CrossEncoder model 'cross-encoder/ms-marco-MiniLM-L-6-v2'...")
-        _reranker_cache = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2') 
+        logger.info(f"Loading CrossEncoder model '{RERANKER_MODEL_NAME}'...")
+        _reranker_cache = CrossEncoder(RERANKER_MODEL_NAME)
         logger.info("Reranker loaded successfully")
     return _reranker_cache
 
 
+def get_recommendations_cache_key(user_id, top_k=3) -> str:
+    return f"recommendations_v6_{user_id}_{top_k}"
+
+
+def parse_reasons_json(text):
+    """
+    Parse the JSON list of reasons out of a raw LLM response.
+    Returns None when nothing usable can be recovered.
+    """
+    try:
+        # 1. Clean common LLM artifacts
+        clean = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
+        clean = clean.replace("```json", "").replace("```", "").strip()
+        # 2. Extract first array-like structure if it exists
+        match = re.search(r'\[.*\]', clean, re.DOTALL)
+        if match:
+            clean = match.group(0)
+        # 3. Basic repair for missing closing brackets/quotes
+        if clean.startswith('[') and not clean.endswith(']'):
+            if not clean.endswith('"'): clean += '"'
+            clean += ']'
+        return json.loads(clean)
+    except Exception:
+        return None
+
+
+def get_product_ids(books) -> dict:
+    """
+    Build a Book.reference -> Product ID lookup for the given books.
+    """
+    # Import Product model to map Book -> Product via reference
+    from store.models import Product
+
+    book_references = [b.reference for b in books if b.reference]
+    if not book_references:
+        return {}
+    products = Product.objects.filter(reference__in=book_references).values_list('reference', 'id')
+    return {ref: pid for ref, pid in products}
+
+
+def generate_user_reasons(similar_books) -> list:
+    """
+    Ask the LLM for a one-sentence reason per recommended book.
+    Raises if the LLM call itself fails.
+    """
+    # Format retrieved books for context
+    context = "\n".join([
+        f"Title: {b.title}, Author: {b.author}, Description: {b.description}" 
+        for b in similar_books
+    ])
+
+    prompt = ChatPromptTemplate.from_template(
+    """You are a helpful book expert.
+    
+        Here are {count} books recommended for a user:
+        {context}
+
+        Write a short, engaging 1-sentence reason for recommending EACH book.
+        
+        Return the reasons as a list valid JSON strings.
+        Example format: ["Reason for book 1", "Reason for book 2", "Reason for book 3"]
+        
+        Strictly return ONLY the JSON list. No other text.
+    """
+    )
+    response_text = llm.generate(
+        settings.OLLAMA_REASONS_MODEL, prompt, {"context": context, "count": len(similar_books)}, temperature=0.7
+    )
+
+    reasons = parse_reasons_json(response_text)
+    if reasons is None:
+        logger.warning(f"Failed to parse LLM JSON response: {response_text}")
+        reasons = [f"Recommended because it's similar to your taste." for _ in similar_books]
+
+    if not isinstance(reasons, list) or len(reasons) < len(similar_books):
+         if not isinstance(reasons, list):
+             reasons = []
+         reasons.extend([f"A great choice based on your history." for _ in range(len(similar_books) - len(reasons))])
+    return reasons
+
+
+def build_user_recommendations(similar_books, product_map, reasons) -> list:
+    """
+    Construct structured results with Product ID for cart integration.
+    Books without a matching Product are left out.
+    """
+    structured_recommendations = []
+    for i, book in enumerate(similar_books):
+        product_id = product_map.get(book.reference)
+        if product_id:  # Only include if we can map to a Product
+            structured_recommendations.append({
+                'book': book,
+                'product_id': product_id,
+                'reason': reasons[i]
+            })
+    return structured_recommendations
+
+
 def get_recommendations(user_id, top_k=3):
     """
     Generate book recommendations for a user based on their purchase history using RAG.
+
+    With RECOMMENDATIONS_ASYNC_REASONS enabled the books are returned straight
+    away with placeholder reasons and the LLM reasons are filled in by a
+    Celery job (see recommendations/reasons.py).
     
     Args:
         user_id (int): The ID of the user to generate recommendations for
@@ -53,46 +166,23 @@ def get_recommendations(user_id, top_k=3):
     Returns:
         list: List of dictionaries containing recommendation details
     """
-    # Check cache first
-    cache_key = f"recommendations_v6_{user_id}_{top_k}"
-    cached_result = cache.get(cache_key)
-    if cached_result:
-        logger.info(f"Returning cached recommendations for user {user_id}")
-        return cached_result
-    
+    # Cached, with a single worker recomputing on expiry (see recommendations/singleflight.py)
+    cache_key = get_recommendations_cache_key(user_id, top_k)
+    return cached_call(cache_key, lambda: _build_recommendations(user_id, top_k, cache_key), ttl=3600)
+
+
+def _build_recommendations(user_id, top_k, cache_key):
+    """
+    Compute get_recommendations() results. Results that must not be cached
+    (empty, fallbacks, placeholders) are wrapped in DontCache.
+    """
     try:
-        # Import Product model to map Book -> Product via reference
-        from store.models import Product
-        
-        # Validate user exists
-        if not User.objects.filter(id=user_id).exists():
-            return []
-        
-        # Get past purchases
-        past_books = Purchase.objects.filter(user_id=user_id).values_list('book_id', flat=True)
-        
-        if not past_books:
-            return []
-        
-        # Get embeddings for past purchases
-        past_embeddings = Book.objects.filter(id__in=past_books).values_list('embedding', flat=True)
-        
-        # Filter out None embeddings
-        valid_embeddings = [emb for emb in past_embeddings if emb is not None]
-        
-        if not valid_embeddings:
-            return []
-        
-        # Calculate average embedding
-        average_embedding = np.mean(valid_embeddings, axis=0)
-        
-        # Retrieve larger pool of similar books for diversity (e.g. top 20)
-        candidate_books = list(Book.objects.exclude(id__in=past_books).annotate(
-            distance=CosineDistance('embedding', average_embedding)
-        ).order_by('distance')[:20])
+        # Nearest unpurchased, purchasable books to the user's materialized
+        # taste vector; retrieve a larger pool (e.g. top 20) for diversity
+        candidate_books = taste_candidates(user_id, top_k=20)
         
         if not candidate_books:
-            return []
+            return DontCache([])
             
         import random
         # Randomly sample top_k from the candidates to provide variety
@@ -102,99 +192,88 @@ def get_recommendations(user_id, top_k=3):
         # Sort them back by distance
         similar_books.sort(key=lambda x: x.distance)
         
-        # Build a reference -> Product ID lookup for the selected books
-        book_references = [b.reference for b in similar_books if b.reference]
-        product_map = {}
-        if book_references:
-            products = Product.objects.filter(reference__in=book_references).values_list('reference', 'id')
-            product_map = {ref: pid for ref, pid in products}
-        
-        # Format retrieved books for context
-        context = "\n".join([
-            f"Title: {b.title}, Author: {b.author}, Description: {b.description}" 
-            for b in similar_books
-        ])
-        
+        product_map = {b.reference: b.product_id for b in similar_books}
+        fallback_reasons = ["Recommended based on your history." for _ in similar_books]
+
+        # Deferred LLM generation: return the books now, reasons follow via the job
+        if async_reasons_enabled():
+            structured_recommendations = build_user_recommendations(similar_books, product_map, fallback_reasons)
+            dispatch_reasons_job('user', cache_key, structured_recommendations, [b.id for b in similar_books])
+            return DontCache(structured_recommendations)
+
         # LLM generation
         try:
-            llm = ChatOllama(model="deepseek-coder:1.3b", temperature=0.7, base_url=os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434'))
-            prompt = ChatPromptTemplate.from_template(
-            """You are a helpful book expert.
-            
-                Here are {count} books recommended for a user:
-                {context}
-
-                Write a short, engaging 1-sentence reason for recommending EACH book.
-                
-                Return the reasons as a list valid JSON strings.
-                Example format: ["Reason for book 1", "Reason for book 2", "Reason for book 3"]
-                
-                Strictly return ONLY the JSON list. No other text.
-            """
-            )
-            chain = prompt | llm | StrOutputParser()
-            response_text = chain.invoke({"context": context, "count": len(similar_books)})
-            
-            import json
-            def robust_json_parse(text):
-                try:
-                    # 1. Clean common LLM artifacts
-                    clean = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
-                    clean = clean.replace("```json", "").replace("```", "").strip()
-                    # 2. Extract first array-like structure if it exists
-                    match = re.search(r'\[.*\]', clean, re.DOTALL)
-                    if match:
-                        clean = match.group(0)
-                    # 3. Basic repair for missing closing brackets/quotes
-                    if clean.startswith('[') and not clean.endswith(']'):
-                         if not clean.endswith('"'): clean += '"'
-                         clean += ']'
-                    return json.loads(clean)
-                except Exception:
-                    return None
-
-            reasons = robust_json_parse(response_text)
-            if reasons is None:
-                logger.warning(f"Failed to parse LLM JSON response: {response_text}")
-                reasons = [f"Recommended because it's similar to your taste." for _ in similar_books]
-
-            if not isinstance(reasons, list) or len(reasons) < len(similar_books):
-                 if not isinstance(reasons, list):
-                     reasons = []
-                 reasons.extend([f"A great choice based on your history." for _ in range(len(similar_books) - len(reasons))])
-            
-            # Construct structured result with Product ID for cart integration
-            structured_recommendations = []
-            for i, book in enumerate(similar_books):
-                product_id = product_map.get(book.reference)
-                if product_id:  # Only include if we can map to a Product
-                    structured_recommendations.append({
-                        'book': book,
-                        'product_id': product_id,
-                        'reason': reasons[i]
-                    })
-
-            cache.set(cache_key, structured_recommendations, 3600)
-            return structured_recommendations
+            reasons = generate_user_reasons(similar_books)
+            return build_user_recommendations(similar_books, product_map, reasons)
             
         except Exception as llm_error:
             logger.error(f"LLM generation failed for user {user_id}: {llm_error}")
-            fallback = []
-            for b in similar_books:
-                product_id = product_map.get(b.reference)
-                if product_id:
-                    fallback.append({'book': b, 'product_id': product_id, 'reason': "Recommended based on your history."})
-            return fallback
+            return DontCache(build_user_recommendations(similar_books, product_map, fallback_reasons))
     
     except Exception as e:
         logger.error(f"Error generating recommendations for user {user_id}: {e}")
-        return [] # Return empty list on error
+        return DontCache([]) # Return empty list on error
+
+
+def get_title_recommendations_cache_key(book_title: str, top_k: int = 5) -> str:
+    return f"recommendations_title_{book_title.lower()}_{top_k}"
+
+
+def generate_title_recommendation(book_title: str, similar_books) -> str:
+    """
+    Ask the LLM for an HTML list recommending books similar to book_title.
+    Raises if the LLM call itself fails.
+    """
+    # Format context for LLM
+    context_lines = []
+    for b in similar_books:
+        author = b.author or "Unknown Author"
+        description = b.description or "No description available."
+        context_lines.append(f"Title: {b.title}\nAuthor: {author}\nDescription: {description}\n")
+
+    context = "\n".join(context_lines)
+
+    prompt = ChatPromptTemplate.from_template(
+        """You are a knowledgeable bookstore assistant. 
+            A customer enjoyed the book titled "{book_title}".
+
+            Here are some similar books from our catalog:
+
+            {context}
+
+            Recommend 3-5 books from the list above that this customer might enjoy next.
+            Explain briefly why each one is a good recommendation based on similarity to the original book.
+
+            Format your response as an HTML unordered list (<ul><li>...</li></ul>) with bold titles.
+            Do not recommend books outside this list."""
+    )
+
+    return llm.generate(settings.OLLAMA_REASONS_MODEL, prompt, {
+        "book_title": book_title,
+        "context": context
+    }, temperature=0.7)
+
+
+def title_fallback_html(similar_books) -> str:
+    """
+    Simple formatted list used when no LLM text is available.
+    """
+    fallback = "<ul>"
+    for b in similar_books:
+        author = b.author or "Unknown Author"
+        fallback += f"<li><strong>{b.title}</strong> by {author}</li>"
+    fallback += "</ul>"
+    return f"<p>You might also enjoy:</p>{fallback}"
 
 
 def get_recommendations_by_book_title(book_title: str, top_k: int = 5) -> str:
     """
     Generate book recommendations based on a given book title using vector similarity (RAG-style).
 
+    With RECOMMENDATIONS_ASYNC_REASONS enabled the plain list of similar books
+    is returned straight away and the LLM write-up replaces it in the cache
+    once the Celery job finishes.
+
     Args:
         book_title (str): The title of the book to find similar books for
         top_k (int): Number of similar books to retrieve (default: 5)
@@ -202,104 +281,96 @@ def get_recommendations_by_book_title(book_title: str, top_k: int = 5) -> str:
     Returns:
         str: LLM-generated recommendations in HTML format or fallback message
     """
-    cache_key = f"recommendations_title_{book_title.lower()}_{top_k}"
-    cached_result = cache.get(cache_key)
-    if cached_result:
-        logger.info(f"Cache hit for recommendations: {book_title}")
-        return cached_result
+    cache_key = get_title_recommendations_cache_key(book_title, top_k)
+    return cached_call(cache_key, lambda: _build_title_recommendations(book_title, top_k, cache_key), ttl=3600)
+
 
+def _build_title_recommendations(book_title, top_k, cache_key):
+    """
+    Compute get_recommendations_by_book_title() output; only LLM text is cached.
+    """
     try:
         # Step 1: Find the reference book by title
         try:
             reference_book = Book.objects.get(title__iexact=book_title)
         except Book.DoesNotExist:
-            return f"Sorry, we couldn't find a book titled '{book_title}' in our catalog."
+            return DontCache(f"Sorry, we couldn't find a book titled '{book_title}' in our catalog.")
         except Book.MultipleObjectsReturned:
             # Use the first match if multiple
             reference_book = Book.objects.filter(title__iexact=book_title).first()
 
         if reference_book.embedding is None:
-            return f"We don't have embedding data for '{book_title}' yet. Please try another book."
+            return DontCache(f"We don't have embedding data for '{book_title}' yet. Please try another book.")
 
         reference_embedding = reference_book.embedding
 
         # Step 2: Retrieve top_k similar books (excluding the reference book itself)
-        similar_books = (
-            Book.objects.exclude(id=reference_book.id)
-            .annotate(distance=CosineDistance('embedding', reference_embedding))
-            .filter(embedding__isnull=False)  # Ensure valid embeddings
-            .order_by('distance')[:top_k]
-        )
+        similar_books = nearest_books(reference_embedding, top_k=top_k, exclude_ids=[reference_book.id])
 
         if not similar_books:
-            return "No similar books found at this time. Try browsing our catalog!"
-
-        # Step 3: Format context for LLM
-        context_lines = []
-        for b in similar_books:
-            author = b.author or "Unknown Author"
-            description = b.description or "No description available."
-            context_lines.append(f"Title: {b.title}\nAuthor: {author}\nDescription: {description}\n")
+            return DontCache("No similar books found at this time. Try browsing our catalog!")
 
-        context = "\n".join(context_lines)
+        # Step 3: Deferred LLM generation returns the plain list for now
+        if async_reasons_enabled():
+            fallback = title_fallback_html(similar_books)
+            dispatch_reasons_job(
+                'title', cache_key, fallback, [b.id for b in similar_books], book_title=book_title
+            )
+            return DontCache(fallback)
 
         # Step 4: Generate recommendations using LLM
         try:
-            llm = ChatOllama(model="deepseek-coder:1.3b", temperature=0.7, base_url=os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434'))
-            prompt = ChatPromptTemplate.from_template(
-                """You are a knowledgeable bookstore assistant. 
-                    A customer enjoyed the book titled "{book_title}".
-
-                    Here are some similar books from our catalog:
-
-                    {context}
-
-                    Recommend 3-5 books from the list above that this customer might enjoy next.
-                    Explain briefly why each one is a good recommendation based on similarity to the original book.
-
-                    Format your response as an HTML unordered list (<ul><li>...</li></ul>) with bold titles.
-                    Do not recommend books outside this list."""
-            )
-
-            chain = prompt | llm | StrOutputParser()
-            recommendation = chain.invoke({
-                "book_title": book_title,
-                "context": context
-            })
-
-            # Cache successful result for 1 hour
-            cache.set(cache_key, recommendation, timeout=3600)
-            return recommendation
+            # Successful results are cached for 1 hour
+            return generate_title_recommendation(book_title, similar_books)
 
         except Exception as llm_error:
             logger.error(f"LLM generation failed for book '{book_title}': {llm_error}")
             # Fallback: simple formatted list
-            fallback = "<ul>"
-            for b in similar_books:
-                author = b.author or "Unknown Author"
-                fallback += f"<li><strong>{b.title}</strong> by {author}</li>"
-            fallback += "</ul>"
-            return f"<p>You might also enjoy:</p>{fallback}"
+            return DontCache(title_fallback_html(similar_books))
 
     except Exception as e:
         logger.error(f"Unexpected error in recommendations for '{book_title}': {str(e)}")
-        return "We're having trouble generating recommendations right now. Please try again later or browse our catalog."
+        return DontCache("We're having trouble generating recommendations right now. Please try again later or browse our catalog.")
 
 
 def get_similar_books(query: str, top_k: int = 5):
     """
     Retrieve top_k similar books from the database using vector similarity.
+    The query embedding comes from the embedding cache when it has been seen before.
+    Returns: List of Book objects annotated with `distance`
     """
-    model = get_sentence_transformer_model()
-    query_embedding = model.encode(query).tolist()
+    from recommendations.embedding_cache import encode_query
+    query_embedding = encode_query(query)
 
-    return (
-        Book.objects.annotate(distance=CosineDistance('embedding', query_embedding))
-        .filter(embedding__isnull=False)
-        .order_by('distance')[:top_k]
-    )
+    return nearest_books(query_embedding, top_k=top_k)
 
 
+def get_similar_books_batch(queries: list[str], top_k: int = 5):
+    """
+    Retrieve top_k similar books for several queries with at most one encoder
+    pass (cached queries are skipped) and one vector search.
+    Returns: List of Book lists, one per query (in input order)
+    """
+    if not queries:
+        return []
+
+    from recommendations.embedding_cache import encode_queries
+
+    start = time.perf_counter()
+    query_embeddings = encode_queries(list(queries))
+    encoded = time.perf_counter()
+
+    results = nearest_books_batch(query_embeddings, top_k=top_k)
+    searched = time.perf_counter()
+
+    encode_ms = (encoded - start) * 1000
+    search_ms = (searched - encoded) * 1000
+    logger.info(
+        f"Batched retrieval for {len(queries)} queries: encode {encode_ms:.1f}ms, "
+        f"search {search_ms:.1f}ms ({(encode_ms + search_ms) / len(queries):.1f}ms/query)"
+    )
+    return results
+
 
 def get_reranked_books(query: str, top_k: int = 5, candidates_k: int = 20, enable_expansion: bool = True):
     """
@@ -311,18 +382,18 @@ def get_reranked_books(query: str, top_k: int = 5, candidates_k: int = 20, enabl
     # 1. Get functional candidates (more than we need)
     if enable_expansion:
         try:
-            from recommendations.expansion import expand_query
-            variations = expand_query(query)
+            # Expansion variations plus the HyDE document, generated concurrently and cached
+            from recommendations.query_understanding import understand_query
+            queries = understand_query(query).retrieval_queries()
             
             seen_ids = set()
-            for q in variations:
-                # Retrieve slightly fewer per variation to keep total size reasonable
-                results = get_similar_books(q, top_k=candidates_k // 2)
+            # Retrieve slightly fewer per variation to keep total size reasonable
+            for results in get_similar_books_batch(queries, top_k=candidates_k // 2):
                 for book in results:
                     if book.id not in seen_ids:
                         candidates.append(book)
                         seen_ids.add(book.id)
-            logger.info(f"Expansion found {len(candidates)} unique candidates from {len(variations)} queries")
+            logger.info(f"Expansion found {len(candidates)} unique candidates from {len(queries)} queries")
         except Exception as e:
             logger.error(f"Expansion failed: {e}")
             candidates = list(get_similar_books(query, top_k=candidates_k))
@@ -333,28 +404,13 @@ def get_reranked_books(query: str, top_k: int = 5, candidates_k: int = 20, enabl
         return []
 
     try:
-        reranker = get_reranker_model()
-        
-        # 2. Prepare pairs for cross-encoding (Query, Document)
-        # We use Title + Description for better context
-        pairs = []
-        for book in candidates:
-            doc_text = f"{book.title}. {book.description or ''}"
-            pairs.append([query, doc_text])
-            
-        # 3. Predict scores
-        scores = reranker.predict(pairs)
-        
-        # 4. Attach scores and sort
-        for i, book in enumerate(candidates):
-            book.rerank_score = scores[i]
-            
-        # Sort descending by score
-        candidates.sort(key=lambda x: x.rerank_score, reverse=True)
-        
+        # 2. Score (Query, Title + Description) pairs with the cross-encoder (cached, micro-batched)
+        from recommendations.reranking import rerank
+        reranked = rerank(query, candidates, top_k=top_k)
+
         logger.info(f"Reranked {len(candidates)} books for query '{query}'")
-        return candidates[:top_k]
-        
+        return reranked
+
     except Exception as e:
         logger.error(f"Reranking failed: {e}. Falling back to vector search.")
         return candidates[:top_k]
@@ -401,12 +457,11 @@ def get_recommendations_by_query_stream(query: str, top_k: int = 5):
 
         context = "\n".join([f"Title: {b.title}, Author: {b.author}, Description: {b.description}" for b in similar_books])
         
-        llm = ChatOllama(model="deepseek-r1:1.5b", temperature=0.1, base_url=os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434'))
         prompt = get_recommendation_prompt()
-        chain = prompt | llm | StrOutputParser()
         
         full_response = ""
-        for chunk in chain.stream({"query": query, "context": context}):
+        chunks = llm.stream_generate(settings.OLLAMA_CHAT_MODEL, prompt, {"query": query, "context": context}, temperature=0.1)
+        for chunk in chunks:
             full_response += chunk
             yield chunk
 
@@ -422,93 +477,127 @@ def get_recommendations_by_query_stream(query: str, top_k: int = 5):
         logger.error(f"Streaming failed: {e}")
         yield f"Error: {str(e)}"
 
+
+def get_query_recommendations_cache_key(query: str, top_k: int = 5) -> str:
+    return f"recommendations_query_v4_{stable_digest(query)}_{top_k}"
+
+
+def generate_query_reasons(query: str, similar_books) -> list:
+    """
+    Ask the LLM why each book matches the query.
+    Raises if the LLM call itself fails.
+    """
+    context = "\n".join([f"Title: {b.title}, Author: {b.author}, Description: {b.description}" for b in similar_books])
+    
+    prompt = get_recommendation_prompt()
+    response_text = llm.generate(settings.OLLAMA_CHAT_MODEL, prompt, {"query": query, "context": context}, temperature=0.1)
+
+    reasons = parse_reasons_json(response_text)
+    if reasons is None:
+        logger.warning(f"Failed to parse LLM JSON: {response_text}")
+        reasons = ["Highly relevant matching based on your query." for _ in similar_books]
+
+    if len(reasons) < len(similar_books):
+        reasons.extend(["A great match for your interests." for _ in range(len(similar_books) - len(reasons))])
+    return reasons
+
+
+def build_query_recommendations(similar_books, product_map, reasons) -> list:
+    structured_recommendations = []
+    for i, book in enumerate(similar_books):
+        structured_recommendations.append({
+            'title': book.title,
+            'author': book.author,
+            'description': book.description,
+            'reference': book.reference,
+            'product_id': product_map.get(book.reference),
+            'reason': reasons[i] if i < len(reasons) else "A great choice."
+        })
+    return structured_recommendations
+
+
 def get_recommendations_by_query(query: str, top_k: int = 5):
     """
     Generate book recommendations based on a natural language query using vector similarity (RAG-style).
+
+    With RECOMMENDATIONS_ASYNC_REASONS enabled the reranked books are returned
+    straight away with placeholder reasons; clients fetch the LLM reasons later
+    by job id or use the streaming endpoint.
     """
-    cache_key = f"recommendations_query_v3_{hash(query)}_{top_k}"
-    cached_result = cache.get(cache_key)
-    if cached_result:
-        return cached_result
+    cache_key = get_query_recommendations_cache_key(query, top_k)
+    return cached_call(cache_key, lambda: _build_query_recommendations(query, top_k, cache_key), ttl=3600)
 
+
+def _build_query_recommendations(query, top_k, cache_key):
+    """
+    Compute get_recommendations_by_query() results; uncacheable ones are wrapped in DontCache.
+    """
     try:
         similar_books = get_reranked_books(query, top_k)
         count = len(similar_books)
         logger.info(f"Found {count} similar books for query: {query}")
         if not similar_books:
-            return []
-
-        context = "\n".join([f"Title: {b.title}, Author: {b.author}, Description: {b.description}" for b in similar_books])
-        
-        llm = ChatOllama(model="deepseek-r1:1.5b", temperature=0.1, base_url=os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434'))
-        prompt = get_recommendation_prompt()
-        chain = prompt | llm | StrOutputParser()
-        
-        response_text = chain.invoke({"query": query, "context": context})
-
-        import json
-        def robust_json_parse(text):
-            try:
-                clean = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
-                clean = clean.replace("```json", "").replace("```", "").strip()
-                match = re.search(r'\[.*\]', clean, re.DOTALL)
-                if match: clean = match.group(0)
-                if clean.startswith('[') and not clean.endswith(']'):
-                    if not clean.endswith('"'): clean += '"'
-                    clean += ']'
-                return json.loads(clean)
-            except Exception:
-                return None
-
-        reasons = robust_json_parse(response_text)
-        if reasons is None:
-            logger.warning(f"Failed to parse LLM JSON: {response_text}")
-            reasons = ["Highly relevant matching based on your query." for _ in similar_books]
-
-        if len(reasons) < len(similar_books):
-            reasons.extend(["A great match for your interests." for _ in range(len(similar_books) - len(reasons))])
+            return DontCache([])
 
         # Build a reference -> Product ID lookup for the selected books
-        from store.models import Product
-        book_references = [b.reference for b in similar_books if b.reference]
-        product_map = {}
-        if book_references:
-            products = Product.objects.filter(reference__in=book_references).values_list('reference', 'id')
-            product_map = {ref: pid for ref, pid in products}
-
-        structured_recommendations = []
-        for i, book in enumerate(similar_books):
-            structured_recommendations.append({
-                'title': book.title,
-                'author': book.author,
-                'description': book.description,
-                'reference': book.reference,
-                'product_id': product_map.get(book.reference),
-                'reason': reasons[i] if i < len(reasons) else "A great choice."
-            })
+        product_map = get_product_ids(similar_books)
+
+        if async_reasons_enabled():
+            placeholders = ["A great match for your interests." for _ in similar_books]
+            structured_recommendations = build_query_recommendations(similar_books, product_map, placeholders)
+            dispatch_reasons_job(
+                'query', cache_key, structured_recommendations, [b.id for b in similar_books], query=query
+            )
+            return DontCache(structured_recommendations)
 
-        cache.set(cache_key, structured_recommendations, timeout=3600)
-        return structured_recommendations
+        reasons = generate_query_reasons(query, similar_books)
+        return build_query_recommendations(similar_books, product_map, reasons)
 
     except Exception as e:
         logger.error(f"Unexpected error in query recommendations: {str(e)}")
-        return []
-        
+        return DontCache([])
+
+
+def build_deferred_result(kind: str, book_ids: list, params: dict):
+    """
+    Run the LLM step of a deferred reasons job (see recommendations/reasons.py).
+
+    Returns:
+        tuple: (value for the recommendation cache key, JSON-serialisable job result)
+    """
+    books_by_id = Book.objects.in_bulk(book_ids)
+    books = [books_by_id[i] for i in book_ids if i in books_by_id]
+
+    if kind == 'user':
+        reasons = generate_user_reasons(books)
+        return build_user_recommendations(books, get_product_ids(books), reasons), reasons
+    if kind == 'query':
+        reasons = generate_query_reasons(params['query'], books)
+        return build_query_recommendations(books, get_product_ids(books), reasons), reasons
+    if kind == 'title':
+        recommendation = generate_title_recommendation(params['book_title'], books)
+        return recommendation, recommendation
+    raise ValueError(f"Unknown reasons job kind: {kind}")
+
+
 def search_books(query: str, top_k: int = 5):
     """
     Search for books using vector similarity.
-    Returns: QuerySet of Book objects
+    The query's expansion variations and HyDE document (see
+    recommendations/query_understanding.py) are searched in one batch and each
+    book is ranked by its closest match.
+    Returns: List of Book objects annotated with `distance`
     """
     try:
-        from recommendations.hyde import generate_hyde_embedding
-        query_embedding = generate_hyde_embedding(query)
-        
-        similar_books = (
-            Book.objects.annotate(distance=CosineDistance('embedding', query_embedding))
-            .filter(embedding__isnull=False)
-            .order_by('distance')[:top_k]
-        )
-        return similar_books
+        from recommendations.query_understanding import understand_query
+        queries = understand_query(query).retrieval_queries()
+
+        best = {}
+        for results in get_similar_books_batch(queries, top_k=top_k):
+            for book in results:
+                if book.id not in best or book.distance < best[book.id].distance:
+                    best[book.id] = book
+        return sorted(best.values(), key=lambda b: b.distance)[:top_k]
     except Exception as e:
         logger.error(f"Vector search failed: {e}")
-        return Book.objects.none()
\ No newline at end of file
+        return []
@@ -0,0 +1,118 @@
+"""
+Deferred LLM "reason" generation for recommendations.
+
+With RECOMMENDATIONS_ASYNC_REASONS enabled, get_recommendations,
+get_recommendations_by_query and get_recommendations_by_book_title return
+their vector/rerank results immediately (with placeholder reasons) instead of
+blocking the request on ChatOllama. dispatch_reasons_job() then:
+
+- caches those placeholder results under the endpoint's usual cache key (in
+  the singleflight envelope format) for a short time, so repeat requests
+  neither redo the search nor queue another job,
+- records a job (`recommendation_reasons_job:<id>`) that clients can poll through
+  the `recommend/reasons/<job_id>/` API endpoint, and
+- enqueues generate_reasons_task once the current transaction commits. The
+  task writes the finished results back to the original cache key.
+
+Clients that want the reasons live can keep using the streaming endpoint.
+"""
+import logging
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from recommendations.singleflight import store
+
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = 'pending'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+
+def async_reasons_enabled() -> bool:
+    return getattr(settings, 'RECOMMENDATIONS_ASYNC_REASONS', False)
+
+
+def job_cache_key(job_id: str) -> str:
+    return f'recommendation_reasons_job:{job_id}'
+
+
+def _pending_job_key(cache_key: str) -> str:
+    return f'{cache_key}:reasons_job'
+
+
+def get_reasons_job(job_id: str):
+    """
+    Job record: {'status', 'kind', 'book_ids', 'result'}, or None if unknown/expired.
+    """
+    return cache.get(job_cache_key(job_id))
+
+
+def get_reasons_job_id(cache_key: str):
+    """
+    Id of the job still filling in the results cached under cache_key, if any.
+    """
+    return cache.get(_pending_job_key(cache_key))
+
+
+def dispatch_reasons_job(kind: str, cache_key: str, placeholder, book_ids: list, **params) -> str:
+    """
+    Cache placeholder results and queue the LLM reasons job for them.
+
+    Args:
+        kind (str): 'user', 'query' or 'title' (see rag.build_deferred_result)
+        cache_key (str): Cache key the finished results are written to
+        placeholder: Results to serve until the job finishes
+        book_ids (list): Recommended Book ids, in display order
+        **params: Extra JSON-serialisable inputs for the prompt (query, book_title)
+
+    Returns:
+        str: The job id
+    """
+    existing = get_reasons_job_id(cache_key)
+    if existing:
+        return existing
+
+    job_id = uuid.uuid4().hex
+    placeholder_ttl = getattr(settings, 'RECOMMENDATIONS_REASONS_PLACEHOLDER_TTL', 120)
+    store(cache_key, placeholder, placeholder_ttl, stale_ttl=0)
+    cache.set(_pending_job_key(cache_key), job_id, placeholder_ttl)
+    _save_job(job_id, {'status': JOB_PENDING, 'kind': kind, 'book_ids': list(book_ids), 'result': None})
+
+    def enqueue():
+        from recommendations.tasks import generate_reasons_task
+        try:
+            generate_reasons_task.delay(job_id, kind, cache_key, list(book_ids), params)
+        except Exception as e:
+            logger.error(f"Could not queue reasons job {job_id}: {e}")
+            fail_reasons_job(job_id, cache_key)
+
+    transaction.on_commit(enqueue)
+    logger.info(f"Queued {kind} reasons job {job_id} for {cache_key}")
+    return job_id
+
+
+def complete_reasons_job(job_id: str, cache_key: str, value, result):
+    """
+    Store the finished results under the original cache key and mark the job done.
+    """
+    store(cache_key, value, getattr(settings, 'RECOMMENDATIONS_REASONS_CACHE_TTL', 3600))
+    cache.delete(_pending_job_key(cache_key))
+    job = get_reasons_job(job_id) or {}
+    job.update({'status': JOB_DONE, 'result': result})
+    _save_job(job_id, job)
+
+
+def fail_reasons_job(job_id: str, cache_key: str):
+    """
+    Mark a job failed; the placeholder results stay cached until they expire.
+    """
+    cache.delete(_pending_job_key(cache_key))
+    job = get_reasons_job(job_id) or {}
+    job.update({'status': JOB_FAILED, 'result': None})
+    _save_job(job_id, job)
+
+
+def _save_job(job_id: str, job: dict):
+    cache.set(job_cache_key(job_id), job, getattr(settings, 'RECOMMENDATIONS_REASONS_CACHE_TTL', 3600))
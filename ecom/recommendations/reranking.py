@@ -0,0 +1,173 @@
+"""
+Cross-encoder reranking service.
+
+get_reranked_books() used to call CrossEncoder.predict() on 20+ (query, book)
+pairs for every uncached search, the most expensive CPU step in the search
+API. rerank() cuts that down in three ways:
+
+1. Only the RECOMMENDATIONS_RERANK_CANDIDATES closest candidates are scored.
+2. Scores are cached per (query as scored, book id, book updated_at), so a
+   repeated pair skips inference and editing a book invalidates its scores.
+3. Pairs that still need scoring are handed to a process-wide micro-batcher,
+   which merges requests arriving from concurrent threads within
+   RECOMMENDATIONS_RERANK_BATCH_WAIT_MS into a single predict() call.
+"""
+import hashlib
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from django.conf import settings
+from django.core.cache import cache
+from recommendations.embedding_cache import collapse_whitespace
+
+logger = logging.getLogger(__name__)
+
+
+def book_document_text(book) -> str:
+    """
+    Text the cross-encoder scores a book on (title + description).
+    """
+    return f"{book.title}. {book.description or ''}"
+
+
+def _score_cache_key(query_digest: str, book) -> str:
+    from recommendations.rag import RERANKER_MODEL_NAME
+    version = book.updated_at.timestamp() if book.updated_at else 'none'
+    return f'rerank_score:{RERANKER_MODEL_NAME}:{query_digest}:{book.id}:{version}'
+
+
+class RerankBatcher:
+    """
+    Collects (query, document) pairs from many threads and scores them with
+    one predict() call per batch.
+
+    submit() returns a Future; a daemon worker thread waits for the first
+    request, keeps collecting for up to max_wait_ms (or until max_batch_pairs
+    pairs are queued) and then runs the model once for everything it has.
+    """
+
+    def __init__(self, max_wait_ms: float = 5, max_batch_pairs: int = 256):
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_pairs = max_batch_pairs
+        self._requests = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, pairs: list) -> Future:
+        future = Future()
+        if not pairs:
+            future.set_result([])
+            return future
+        self._ensure_worker()
+        self._requests.put((pairs, future))
+        return future
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='rerank-batcher', daemon=True)
+                self._worker.start()
+
+    def _collect(self) -> list:
+        batch = [self._requests.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_pairs:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            pairs = [pair for request_pairs, _ in batch for pair in request_pairs]
+            try:
+                from recommendations.rag import get_reranker_model
+                scores = get_reranker_model().predict(pairs)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            logger.debug(f"Reranker scored {len(pairs)} pairs for {len(batch)} requests in one batch")
+            offset = 0
+            for request_pairs, future in batch:
+                future.set_result([float(s) for s in scores[offset:offset + len(request_pairs)]])
+                offset += len(request_pairs)
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_rerank_batcher() -> RerankBatcher:
+    """
+    Get (creating on first use) the process-wide micro-batcher.
+    """
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = RerankBatcher(
+                    max_wait_ms=getattr(settings, 'RECOMMENDATIONS_RERANK_BATCH_WAIT_MS', 5),
+                    max_batch_pairs=getattr(settings, 'RECOMMENDATIONS_RERANK_MAX_BATCH_PAIRS', 256),
+                )
+    return _batcher
+
+
+def score_books(query: str, books: list) -> list[float]:
+    """
+    Cross-encoder relevance of each book to the query, using cached scores
+    where available and the micro-batcher for the rest.
+    """
+    from recommendations.rag import RERANKER_LOWERCASE_QUERIES
+
+    # The exact text scored is the cache key
+    normalized = collapse_whitespace(query)
+    if RERANKER_LOWERCASE_QUERIES:
+        normalized = normalized.lower()
+    digest = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+    keys = [_score_cache_key(digest, book) for book in books]
+
+    cached = cache.get_many(keys)
+    missing = [i for i, key in enumerate(keys) if key not in cached]
+    if missing:
+        pairs = [[normalized, book_document_text(books[i])] for i in missing]
+        timeout = getattr(settings, 'RECOMMENDATIONS_RERANK_TIMEOUT_SECONDS', 30)
+        scores = get_rerank_batcher().submit(pairs).result(timeout=timeout)
+        fresh = {keys[i]: score for i, score in zip(missing, scores)}
+        cache.set_many(fresh, getattr(settings, 'RECOMMENDATIONS_RERANK_SCORE_CACHE_TTL', 60 * 60 * 24))
+        cached.update(fresh)
+
+    logger.info(f"Rerank scores for '{query}': {len(books) - len(missing)} cached, {len(missing)} computed")
+    return [cached[key] for key in keys]
+
+
+def rerank(query: str, candidates: list, top_k: int = 5) -> list:
+    """
+    Re-order vector search candidates by cross-encoder score.
+
+    Only the RECOMMENDATIONS_RERANK_CANDIDATES candidates closest to the query
+    are scored; each returned book carries a `rerank_score` attribute.
+    """
+    cutoff = getattr(settings, 'RECOMMENDATIONS_RERANK_CANDIDATES', 20)
+    candidates = sorted(candidates, key=lambda b: getattr(b, 'distance', 0.0))[:cutoff]
+    if not candidates:
+        return []
+
+    for book, score in zip(candidates, score_books(query, candidates)):
+        book.rerank_score = score
+
+    candidates.sort(key=lambda b: b.rerank_score, reverse=True)
+    return candidates[:top_k]
@@ -1,27 +1,62 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Book
+from .models import Book, Purchase
 from .tasks import generate_embeddings_task
+from .embedding_pipeline import TEXT_FIELDS, book_embedding_text, embedding_fingerprint, record_encode_stats
+from .memory_index import update_memory_index, remove_from_memory_index
+from .taste_profile import rebuild_taste_profile, record_purchase
 
 from django.db import transaction
 
 @receiver(post_save, sender=Book)
 def trigger_embedding_generation(sender, instance, created, update_fields=None, **kwargs):
     """
-    Trigger async embedding generation when a Book is created or its content changes.
+    Trigger async embedding generation when a Book is created or the text it
+    is embedded from changes. Saves that leave that text alone (stock or image
+    updates, re-imports of unchanged rows, ...) match the stored fingerprint
+    and are skipped.
     """
     def _trigger():
         generate_embeddings_task.delay([instance.id])
 
+    # Keep this process's in-memory vector index (if loaded) in step with the row
+    transaction.on_commit(lambda: update_memory_index(instance))
+
+    if update_fields is not None and not set(update_fields) & set(TEXT_FIELDS):
+        return
+
+    fingerprint = embedding_fingerprint(book_embedding_text(instance))
+    if not created and instance.embedding is not None and instance.embedding_fingerprint == fingerprint:
+        record_encode_stats('signal', skipped=1)
+        return
+
+    # The task records the encode itself
+    transaction.on_commit(_trigger)
+
+
+@receiver(post_delete, sender=Book)
+def drop_from_memory_index(sender, instance, **kwargs):
+    """
+    Remove a deleted Book from the in-memory vector index.
+    """
+    book_id = instance.id
+    transaction.on_commit(lambda: remove_from_memory_index(book_id))
+
+
+@receiver(post_save, sender=Purchase)
+def update_taste_profile(sender, instance, created, **kwargs):
+    """
+    Fold a new purchase into the buyer's taste profile once it is committed.
+    """
     if created:
-        transaction.on_commit(_trigger)
-    else:
-        # Check if relevant fields changed if update_fields is provided
-        if update_fields:
-             if 'title' in update_fields or 'description' in update_fields:
-                 transaction.on_commit(_trigger)
-        else:
-             # Standard save() call without update_fields
-             # We assume something important might have changed.
-             # Check if we are running inside the task itself (bulk_update) - but bulk_update doesn't trigger signals.
-             transaction.on_commit(_trigger)
+        purchase_id = instance.id
+        transaction.on_commit(lambda: record_purchase(purchase_id))
+
+
+@receiver(post_delete, sender=Purchase)
+def rebuild_taste_profile_on_delete(sender, instance, **kwargs):
+    """
+    A removed purchase cannot be subtracted from a weighted mean; recompute it.
+    """
+    user_id = instance.user_id
+    transaction.on_commit(lambda: rebuild_taste_profile(user_id))
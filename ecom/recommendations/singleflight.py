@@ -0,0 +1,174 @@
+"""
+Cache stampede protection for expensive recommendation results.
+
+A plain `cache.get` / recompute / `cache.set` lets every concurrent request
+recompute when a popular key expires, which for rag.py means the whole
+vector search + rerank + LLM pipeline N times at once. cached_call() instead:
+
+- stores values in an envelope with a logical expiry (`ttl`) and keeps them in
+  the cache for a further `stale_ttl` seconds,
+- lets exactly one caller recompute a missing or expired key, guarded by a
+  lock taken with cache.add() (an atomic SET NX on Redis) that expires after
+  a short lease, so a crashed worker cannot block the key for long,
+- serves the stale value to everyone else while that refresh runs (callers
+  with nothing to serve wait briefly for the leader instead), and
+- refreshes probabilistically before expiry (XFetch): the closer a key is to
+  expiring, and the longer it took to compute, the more likely a request is to
+  refresh it early, so popular keys rarely expire at all.
+
+Locks only coordinate across processes when the default cache is shared
+(set REDIS_CACHE_URL); with the local-memory cache they are per process.
+"""
+import hashlib
+import logging
+import math
+import random
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+ENVELOPE_MARKER = '__singleflight__'
+
+
+class DontCache:
+    """
+    Wrap a computed value that should be returned but not cached
+    (fallbacks, placeholders written elsewhere, ...).
+    """
+
+    def __init__(self, value):
+        self.value = value
+
+
+def stable_digest(text: str) -> str:
+    """
+    Process-independent digest for building cache keys (unlike hash()).
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+
+def _lock_key(key: str) -> str:
+    return f'{key}:refresh_lock'
+
+
+def _unwrap(raw):
+    """
+    Envelope stored under a key, or None (missing or written in another format).
+    """
+    if isinstance(raw, dict) and raw.get(ENVELOPE_MARKER):
+        return raw
+    return None
+
+
+def store(key: str, value, ttl: int, stale_ttl: int | None = None, compute_time: float = 0.0):
+    """
+    Write a value in the envelope format cached_call() reads.
+    """
+    if stale_ttl is None:
+        stale_ttl = getattr(settings, 'RECOMMENDATIONS_CACHE_STALE_SECONDS', 600)
+    envelope = {
+        ENVELOPE_MARKER: True,
+        'value': value,
+        'expires_at': time.time() + ttl,
+        'delta': compute_time,
+    }
+    cache.set(key, envelope, ttl + stale_ttl)
+
+
+def _should_refresh(envelope, now: float, beta: float) -> bool:
+    """
+    XFetch: refresh when now - delta * beta * ln(rand) >= expires_at.
+    """
+    if envelope is None:
+        return True
+    jitter = envelope['delta'] * beta * -math.log(1.0 - random.random())
+    return now + jitter >= envelope['expires_at']
+
+
+def _acquire(key: str, lease: float):
+    token = uuid.uuid4().hex
+    if cache.add(_lock_key(key), token, timeout=max(1, math.ceil(lease))):
+        return token
+    return None
+
+
+def _release(key: str, token: str):
+    # Only drop our own lock; if the lease ran out another worker may hold it now
+    if cache.get(_lock_key(key)) == token:
+        cache.delete(_lock_key(key))
+
+
+def _refresh(key: str, compute, ttl: int, stale_ttl):
+    start = time.perf_counter()
+    value = compute()
+    elapsed = time.perf_counter() - start
+    if isinstance(value, DontCache):
+        return value.value
+    store(key, value, ttl, stale_ttl, compute_time=elapsed)
+    return value
+
+
+def cached_call(key: str, compute, ttl: int, stale_ttl: int | None = None, lease: float | None = None,
+                beta: float = 1.0, wait: float | None = None):
+    """
+    Return the cached value for key, computing it with compute() at most once
+    at a time across workers.
+
+    Args:
+        key (str): Cache key
+        compute (callable): Builds the value; may return DontCache(value)
+        ttl (int): Seconds the value is fresh
+        stale_ttl (int): Seconds an expired value may still be served during a refresh
+            (default RECOMMENDATIONS_CACHE_STALE_SECONDS)
+        lease (float): Refresh lock lifetime (default RECOMMENDATIONS_SINGLEFLIGHT_LEASE_SECONDS)
+        beta (float): XFetch aggressiveness; 0 disables early refresh
+        wait (float): How long a caller with no value to serve waits for the leader
+            before computing itself (default RECOMMENDATIONS_SINGLEFLIGHT_WAIT_SECONDS)
+    """
+    if lease is None:
+        lease = getattr(settings, 'RECOMMENDATIONS_SINGLEFLIGHT_LEASE_SECONDS', 30)
+    if wait is None:
+        wait = getattr(settings, 'RECOMMENDATIONS_SINGLEFLIGHT_WAIT_SECONDS', 30)
+
+    envelope = _unwrap(cache.get(key))
+    if not _should_refresh(envelope, time.time(), beta):
+        return envelope['value']
+
+    token = _acquire(key, lease)
+    if token:
+        try:
+            # The previous leader may have stored a new value since our read
+            latest = _unwrap(cache.get(key))
+            if latest is not None and (envelope is None or latest['expires_at'] != envelope['expires_at']):
+                return latest['value']
+            return _refresh(key, compute, ttl, stale_ttl)
+        finally:
+            _release(key, token)
+
+    # Another worker is refreshing: serve what we have
+    if envelope is not None:
+        return envelope['value']
+
+    # Nothing cached yet; wait for the leader's result
+    deadline = time.monotonic() + wait
+    poll = 0.05
+    while time.monotonic() < deadline:
+        time.sleep(poll)
+        envelope = _unwrap(cache.get(key))
+        if envelope is not None:
+            return envelope['value']
+        # The leader finished without caching (or died); take over
+        token = _acquire(key, lease)
+        if token:
+            try:
+                return _refresh(key, compute, ttl, stale_ttl)
+            finally:
+                _release(key, token)
+        poll = min(poll * 2, 0.5)
+
+    logger.warning(f"Timed out waiting for refresh of {key}, computing without the lock")
+    value = compute()
+    return value.value if isinstance(value, DontCache) else value
@@ -1,6 +1,10 @@
 from celery import shared_task
+from recommendations.embedding_pipeline import changed_books, encode_texts, record_encode_stats
+from recommendations.embedding_versions import active_version
 from recommendations.models import Book
 from recommendations.rag import get_sentence_transformer_model
+from recommendations.memory_index import mark_memory_index_stale
+from recommendations.taste_profile import refresh_taste_profiles_for_books
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,7 +18,8 @@ def generate_embeddings_task(book_ids):
     """
     logger.info(f"Starting embedding generation for {len(book_ids)} books.")
     try:
-        model = get_sentence_transformer_model()
+        version = active_version()
+        model = get_sentence_transformer_model(version.model_name)
         books_to_update = []
         
         books = Book.objects.filter(id__in=book_ids)
@@ -22,18 +27,29 @@ def generate_embeddings_task(book_ids):
             logger.warning("No books found for provided IDs.")
             return "No books processed."
 
-        for book in books:
-            try:
-                # Combine title and description for richer context
-                text = f"{book.title} {book.description or ''}"
-                embedding = model.encode(text).tolist()
-                book.embedding = embedding
-                books_to_update.append(book)
-            except Exception as e:
-                logger.error(f"Error generating embedding for book {book.id}: {e}")
+        # Unchanged text + model: the stored vector is still right
+        pending, skipped = changed_books(books, version=version)
+        if skipped:
+            logger.info(f"Skipping {skipped} books whose embedding text is unchanged.")
+        try:
+            embeddings = encode_texts(model, [text for _, text, _ in pending]) if pending else []
+        except Exception as e:
+            logger.error(f"Error generating embeddings for books {book_ids}: {e}")
+            embeddings = []
+        record_encode_stats('task', encoded=len(embeddings), skipped=skipped)
+
+        for (book, _, fingerprint), embedding in zip(pending, embeddings):
+            book.embedding = embedding.tolist()
+            book.embedding_fingerprint = fingerprint
+            book.embedding_version = version.name
+            books_to_update.append(book)
 
         if books_to_update:
-            Book.objects.bulk_update(books_to_update, ['embedding'])
+            Book.objects.bulk_update(books_to_update, ['embedding', 'embedding_fingerprint', 'embedding_version'])
+            # bulk_update sends no post_save, so have in-memory indexes reload
+            mark_memory_index_stale()
+            # Taste profiles averaged the old vectors (or skipped unembedded books)
+            refresh_taste_profiles_for_books([b.id for b in books_to_update])
             logger.info(f"Successfully updated embeddings for {len(books_to_update)} books.")
             return f"Updated {len(books_to_update)} books."
         return "No updates made."
@@ -41,3 +57,24 @@ def generate_embeddings_task(book_ids):
     except Exception as e:
         logger.error(f"Task failed: {e}")
         return f"Failed: {e}"
+
+
+@shared_task
+def generate_reasons_task(job_id, kind, cache_key, book_ids, params):
+    """
+    Generate the LLM reasons for recommendations that were returned without them
+    and write the results back to their cache key (see recommendations/reasons.py).
+    """
+    from recommendations.rag import build_deferred_result
+    from recommendations.reasons import complete_reasons_job, fail_reasons_job
+
+    logger.info(f"Generating {kind} reasons for job {job_id} ({len(book_ids)} books).")
+    try:
+        value, result = build_deferred_result(kind, book_ids, params)
+    except Exception as e:
+        logger.error(f"Reasons job {job_id} failed: {e}")
+        fail_reasons_job(job_id, cache_key)
+        return f"Failed: {e}"
+
+    complete_reasons_job(job_id, cache_key, value, result)
+    return f"Generated reasons for {len(book_ids)} books."
@@ -0,0 +1,198 @@
+"""
+Materialized user taste vectors for purchase-history recommendations.
+
+get_recommendations() used to load the user's purchases and their embeddings,
+average them with numpy, search with an `exclude(id__in=...)` subquery and then
+map the hits to store Products, five round trips per request. Instead each
+user's mean embedding lives in UserTasteProfile:
+
+- record_purchase() folds a new Purchase into the profile incrementally
+  (wired to Purchase post_save in signals.py),
+- rebuild_taste_profile() recomputes it from scratch (first use, deleted
+  purchases, re-embedded books, `manage.py rebuild_taste_profiles`), and
+- taste_candidates() returns the nearest unpurchased books, already joined to
+  their store Product, in a single statement.
+
+With RECOMMENDATIONS_TASTE_HALF_LIFE_DAYS set, a purchase's weight halves every
+half-life, so recent purchases dominate the profile; 0 keeps a plain mean.
+"""
+import logging
+import math
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from recommendations.models import Book, Purchase, UserTasteProfile
+from recommendations.vector_search import ann_search, get_vector_backend, nearest_books
+
+logger = logging.getLogger(__name__)
+
+
+def _decay(seconds: float) -> float:
+    """
+    Weight left after `seconds` for the configured half-life (1.0 when disabled).
+    """
+    half_life_days = getattr(settings, 'RECOMMENDATIONS_TASTE_HALF_LIFE_DAYS', 0)
+    if not half_life_days or seconds <= 0:
+        return 1.0
+    return math.pow(0.5, seconds / (half_life_days * 86400))
+
+
+def rebuild_taste_profile(user_id):
+    """
+    Recompute a user's profile from all their purchases.
+
+    Returns:
+        UserTasteProfile, or None (and no row) if none of their books has an embedding
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        purchases = list(
+            Purchase.objects.filter(user_id=user_id)
+            .values_list('id', 'purchase_date', 'book__embedding')
+        )
+        rows = [(date, embedding) for _, date, embedding in purchases if embedding is not None]
+        if not rows:
+            UserTasteProfile.objects.filter(user_id=user_id).delete()
+            return None
+
+        weights = np.array([_decay((now - date).total_seconds()) for date, _ in rows])
+        embeddings = np.array([embedding for _, embedding in rows], dtype=np.float32)
+        mean = (embeddings * weights[:, None]).sum(axis=0) / weights.sum()
+
+        profile, _ = UserTasteProfile.objects.update_or_create(
+            user_id=user_id,
+            defaults={
+                'embedding': mean.tolist(),
+                'weight': float(weights.sum()),
+                'purchase_count': len(rows),
+                'last_purchase_id': max(purchase_id for purchase_id, _, _ in purchases),
+                'updated_at': now,
+            },
+        )
+    return profile
+
+
+def record_purchase(purchase_id):
+    """
+    Fold one new purchase into its user's profile without rereading their history.
+    """
+    purchase = Purchase.objects.select_related('book').filter(id=purchase_id).first()
+    if purchase is None:
+        return None
+    if purchase.book.embedding is None:
+        # Picked up by refresh_taste_profiles_for_books() once the book is embedded
+        return None
+
+    now = timezone.now()
+    with transaction.atomic():
+        profile = UserTasteProfile.objects.select_for_update().filter(user_id=purchase.user_id).first()
+        if profile is None or purchase.id <= profile.last_purchase_id:
+            # No profile yet, or a newer purchase got there first (possibly
+            # already including this one): recompute exactly
+            return rebuild_taste_profile(purchase.user_id)
+
+        old_weight = profile.weight * _decay((now - profile.updated_at).total_seconds())
+        new_weight = _decay((now - purchase.purchase_date).total_seconds())
+        mean = (
+            np.asarray(profile.embedding, dtype=np.float32) * old_weight
+            + np.asarray(purchase.book.embedding, dtype=np.float32) * new_weight
+        ) / (old_weight + new_weight)
+
+        profile.embedding = mean.tolist()
+        profile.weight = old_weight + new_weight
+        profile.purchase_count += 1
+        profile.last_purchase_id = purchase.id
+        profile.updated_at = now
+        profile.save()
+    return profile
+
+
+def refresh_taste_profiles_for_books(book_ids):
+    """
+    Rebuild the profiles of everyone who bought one of these (re-embedded) books.
+    """
+    user_ids = list(
+        Purchase.objects.filter(book_id__in=book_ids).values_list('user_id', flat=True).distinct()
+    )
+    for user_id in user_ids:
+        rebuild_taste_profile(user_id)
+    if user_ids:
+        logger.info(f"Rebuilt {len(user_ids)} taste profiles after re-embedding {len(book_ids)} books.")
+    return len(user_ids)
+
+
+def taste_candidates(user_id, top_k: int = 20) -> list:
+    """
+    Books nearest to the user's taste vector that they have not bought and that
+    are sold as a store Product.
+
+    On pgvector this is one statement: the profile row drives an index-backed
+    LATERAL scan, purchased books are dropped with NOT EXISTS and each hit is
+    joined to its Product by reference. The profile is built on first use.
+
+    Returns:
+        list: Book objects annotated with `distance` and `product_id`, closest first
+    """
+    if top_k <= 0:
+        return []
+
+    books = _taste_candidates(user_id, top_k)
+    if not books and not UserTasteProfile.objects.filter(user_id=user_id).exists():
+        if rebuild_taste_profile(user_id) is not None:
+            books = _taste_candidates(user_id, top_k)
+    return books
+
+
+def _taste_candidates(user_id, top_k):
+    fetch = top_k * getattr(settings, 'RECOMMENDATIONS_TASTE_CANDIDATE_OVERFETCH', 3)
+    if get_vector_backend() == 'memory':
+        return _taste_candidates_memory(user_id, top_k, fetch)
+
+    from store.models import Product
+
+    sql = f"""
+        SELECT b.*, p.product_id
+        FROM {UserTasteProfile._meta.db_table} t
+        CROSS JOIN LATERAL (
+            SELECT bk.*, bk.embedding <=> t.embedding AS distance
+            FROM {Book._meta.db_table} bk
+            WHERE bk.embedding IS NOT NULL
+            ORDER BY bk.embedding <=> t.embedding
+            LIMIT %s
+        ) AS b
+        CROSS JOIN LATERAL (
+            SELECT pr.id AS product_id
+            FROM {Product._meta.db_table} pr
+            WHERE pr.reference = b.reference
+            ORDER BY pr.id
+            LIMIT 1
+        ) AS p
+        WHERE t.user_id = %s
+          AND NOT EXISTS (
+              SELECT 1 FROM {Purchase._meta.db_table} pu
+              WHERE pu.user_id = t.user_id AND pu.book_id = b.id
+          )
+        ORDER BY b.distance
+        LIMIT %s
+    """
+    with ann_search(top_k=fetch):
+        return list(Book.objects.raw(sql, [fetch, user_id, top_k]))
+
+
+def _taste_candidates_memory(user_id, top_k, fetch):
+    from recommendations.rag import get_product_ids
+
+    profile = UserTasteProfile.objects.filter(user_id=user_id).first()
+    if profile is None:
+        return []
+    purchased = Purchase.objects.filter(user_id=user_id).values_list('book_id', flat=True)
+    books = nearest_books(profile.embedding, top_k=fetch, exclude_ids=purchased, backend='memory')
+    product_map = get_product_ids(books)
+    candidates = []
+    for book in books:
+        book.product_id = product_map.get(book.reference)
+        if book.product_id:
+            candidates.append(book)
+    return candidates[:top_k]
@@ -1,10 +1,14 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.contrib.auth.models import User
 from recommendations.models import Book, Purchase, SearchQueryCache
 from store.models import Product, Category
 from recommendations.rag import get_recommendations, get_sentence_transformer_model, get_recommendations_by_query_stream
+from recommendations import embedding_cache, llm, memory_index
+from django.core.cache import cache
 from unittest.mock import patch, MagicMock
 import numpy as np
+import threading
+import time
 import pydantic
 
 # Create a mock that passes Pydantic validation
@@ -107,6 +111,8 @@ class RAGRecommendationTestCase(TestCase):
     
     def setUp(self):
         """Set up test data"""
+        # Patched ChatOllama classes only take effect for newly created clients
+        llm.reset_clients()
         self.user = User.objects.create_user(
             username='raguser',
             email='rag@example.com',
@@ -166,7 +172,7 @@ class RAGRecommendationTestCase(TestCase):
         # Create purchase
         Purchase.objects.create(user=self.user, book=self.book1)
         
-        with patch('recommendations.rag.ChatOllama') as mock_llm_cls:
+        with patch('recommendations.llm.ChatOllama') as mock_llm_cls:
             mock_llm_instance = MockableMagicMock()
             mock_llm_cls.return_value = mock_llm_instance
             
@@ -195,7 +201,7 @@ class RAGRecommendationTestCase(TestCase):
         """Test that recommendations are cached"""
         Purchase.objects.create(user=self.user, book=self.book1)
         
-        with patch('recommendations.rag.ChatOllama') as mock_llm_cls, \
+        with patch('recommendations.llm.ChatOllama') as mock_llm_cls, \
              patch('recommendations.rag.ChatPromptTemplate') as mock_prompt_cls:
             
             # Setup mock chain
@@ -245,7 +251,7 @@ class RAGRecommendationTestCase(TestCase):
         Purchase.objects.create(user=self.user, book=self.book1)
         
         # Mock LLM to raise an exception
-        with patch('recommendations.rag.ChatOllama') as mock_llm:
+        with patch('recommendations.llm.ChatOllama') as mock_llm:
             mock_llm.side_effect = Exception("LLM connection failed")
             
             result = get_recommendations(self.user.id, top_k=2)
@@ -270,6 +276,8 @@ class RAGEdgeCasesTestCase(TestCase):
     
     def setUp(self):
         """Set up test data"""
+        # Patched ChatOllama classes only take effect for newly created clients
+        llm.reset_clients()
         self.user = User.objects.create_user(
             username='edgeuser',
             email='edge@example.com',
@@ -322,7 +330,7 @@ class RAGEdgeCasesTestCase(TestCase):
         Purchase.objects.create(user=self.user, book=book)
         Purchase.objects.create(user=self.user, book=book)
         
-        with patch('recommendations.rag.ChatOllama') as mock_llm_cls, \
+        with patch('recommendations.llm.ChatOllama') as mock_llm_cls, \
              patch('recommendations.rag.ChatPromptTemplate') as mock_prompt_cls:
             
             # Setup mock chain
@@ -344,6 +352,10 @@ class RAGEdgeCasesTestCase(TestCase):
 
 
 class SearchCachingTestCase(TestCase):
+    def setUp(self):
+        # Patched ChatOllama classes only take effect for newly created clients
+        llm.reset_clients()
+
     def test_search_caching(self):
         """Test that search results are cached using SearchQueryCache"""
         # Create data to ensure get_similar_books returns something
@@ -361,9 +373,9 @@ class SearchCachingTestCase(TestCase):
         query = "test cached query unique"
         
         # Mock the entire chain pipeline
-        with patch('recommendations.rag.ChatOllama') as mock_llm_cls, \
+        with patch('recommendations.llm.ChatOllama') as mock_llm_cls, \
              patch('recommendations.rag.ChatPromptTemplate') as mock_prompt_cls, \
-             patch('recommendations.rag.StrOutputParser') as mock_parser_cls:
+             patch('recommendations.llm.StrOutputParser') as mock_parser_cls:
             
             # Setup mock chain
             mock_llm = MagicMock()
@@ -405,3 +417,1274 @@ class SearchCachingTestCase(TestCase):
             
             # Verify data is in DB
             self.assertTrue(SearchQueryCache.objects.filter(query=query).exists())
+
+
+class VectorSearchTestCase(TestCase):
+    """Test cases for ANN-backed vector search helpers"""
+
+    def setUp(self):
+        """Create books with known embeddings"""
+        base = np.zeros(384)
+        base[0] = 1.0
+        near = base.copy()
+        near[1] = 0.1
+        far = np.zeros(384)
+        far[2] = 1.0
+
+        self.exact = Book.objects.create(title='Exact', embedding=base.tolist())
+        self.near = Book.objects.create(title='Near', embedding=near.tolist())
+        self.far = Book.objects.create(title='Far', embedding=far.tolist())
+        Book.objects.create(title='No Embedding')
+        self.query = base.tolist()
+
+    def test_nearest_books_ordering(self):
+        """Results are ordered by cosine distance and skip books without embeddings"""
+        from recommendations.vector_search import nearest_books
+
+        results = nearest_books(self.query, top_k=5)
+
+        self.assertEqual([b.id for b in results], [self.exact.id, self.near.id, self.far.id])
+        self.assertLess(results[0].distance, results[1].distance)
+
+    def test_nearest_books_exclude(self):
+        """Excluded ids never come back"""
+        from recommendations.vector_search import nearest_books
+
+        results = nearest_books(self.query, top_k=2, exclude_ids=[self.exact.id])
+
+        self.assertEqual([b.id for b in results], [self.near.id, self.far.id])
+
+    def test_ann_search_sets_ef_search(self):
+        """ef_search is applied inside the block and raised to top_k"""
+        from django.db import connection
+        from django.test import override_settings
+        from recommendations.vector_search import ann_search
+
+        with override_settings(PGVECTOR_INDEX_TYPE='hnsw', PGVECTOR_HNSW_EF_SEARCH=40):
+            with ann_search(top_k=100):
+                with connection.cursor() as cursor:
+                    cursor.execute("SHOW hnsw.ef_search")
+                    self.assertEqual(cursor.fetchone()[0], '100')
+
+    def test_model_index_type_matches_declared_index(self):
+        """MODEL_INDEX_TYPE names the index type Book.Meta.indexes declares"""
+        from recommendations.vector_search import ANN_INDEX_NAME, MODEL_INDEX_TYPE
+
+        index = next(i for i in Book._meta.indexes if i.name == ANN_INDEX_NAME)
+        self.assertEqual(index.suffix, MODEL_INDEX_TYPE)
+
+    def test_ef_search_is_capped_at_pgvector_limit(self):
+        """A top_k above pgvector's ef_search limit is truncated instead of failing SET LOCAL"""
+        from django.db import connection
+        from django.test import override_settings
+        from recommendations.vector_search import ann_search
+
+        with override_settings(PGVECTOR_INDEX_TYPE='hnsw', PGVECTOR_HNSW_EF_SEARCH=40):
+            with ann_search(top_k=5000):
+                with connection.cursor() as cursor:
+                    cursor.execute("SHOW hnsw.ef_search")
+                    self.assertEqual(cursor.fetchone()[0], '1000')
+
+
+class InMemoryVectorIndexTestCase(TestCase):
+    """Test cases for the in-process NumPy vector index"""
+
+    def setUp(self):
+        """Create books with random embeddings"""
+        rng = np.random.default_rng(0)
+        self.books = [
+            Book.objects.create(title=f'Book {i}', embedding=rng.random(384).tolist())
+            for i in range(20)
+        ]
+        Book.objects.create(title='No Embedding')
+
+    def test_load_skips_missing_embeddings(self):
+        """Only books with embeddings are indexed"""
+        from recommendations.memory_index import InMemoryVectorIndex
+
+        index = InMemoryVectorIndex().load()
+        self.assertEqual(len(index), 20)
+
+    def test_search_matches_pgvector(self):
+        """Exact in-memory top-k agrees with pgvector's ordering"""
+        from recommendations.memory_index import InMemoryVectorIndex
+        from recommendations.vector_search import nearest_books
+
+        index = InMemoryVectorIndex().load()
+        query = self.books[3].embedding
+
+        ids, distances = index.search(query, top_k=5)
+        expected = [b.id for b in nearest_books(query, top_k=5, backend='pgvector')]
+
+        self.assertEqual(ids, expected)
+        self.assertEqual(ids[0], self.books[3].id)
+        self.assertAlmostEqual(distances[0], 0.0, places=5)
+
+    def test_search_excludes_ids(self):
+        """Excluded ids are never returned"""
+        from recommendations.memory_index import InMemoryVectorIndex
+
+        index = InMemoryVectorIndex().load()
+        ids, _ = index.search(self.books[3].embedding, top_k=5, exclude_ids={self.books[3].id})
+
+        self.assertNotIn(self.books[3].id, ids)
+        self.assertEqual(len(ids), 5)
+
+    def test_upsert_and_remove(self):
+        """Single-book updates are visible to the next search"""
+        from recommendations.memory_index import InMemoryVectorIndex
+
+        index = InMemoryVectorIndex().load()
+        target = np.zeros(384)
+        target[7] = 1.0
+
+        index.upsert(999999, target)
+        ids, _ = index.search(target, top_k=1)
+        self.assertEqual(ids, [999999])
+
+        index.remove(999999)
+        ids, _ = index.search(target, top_k=1)
+        self.assertNotEqual(ids, [999999])
+        self.assertEqual(len(index), 20)
+
+
+class BatchedRetrievalTestCase(TestCase):
+    """Test cases for multi-query vector retrieval"""
+
+    def setUp(self):
+        """Create books with random embeddings"""
+        rng = np.random.default_rng(1)
+        self.books = [
+            Book.objects.create(title=f'Batch Book {i}', embedding=rng.random(384).tolist())
+            for i in range(12)
+        ]
+        # Drop any index loaded by an earlier test against different rows
+        memory_index._memory_index = None
+        # Start with cold query embedding caches so the encoder is really called
+        cache.clear()
+        embedding_cache.clear_local_cache()
+
+    def test_batch_matches_single_queries(self):
+        """Each batch result equals the per-query search, on both backends"""
+        from recommendations.vector_search import nearest_books, nearest_books_batch
+
+        queries = [self.books[0].embedding, self.books[5].embedding, self.books[9].embedding]
+        for backend in ('pgvector', 'memory'):
+            with self.subTest(backend=backend):
+                batched = nearest_books_batch(queries, top_k=4, backend=backend)
+                self.assertEqual(len(batched), 3)
+                for query, results in zip(queries, batched):
+                    expected = [b.id for b in nearest_books(query, top_k=4, backend=backend)]
+                    self.assertEqual([b.id for b in results], expected)
+
+    def test_batch_single_sql_statement(self):
+        """The pgvector path answers every query in one statement"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from recommendations.vector_search import nearest_books_batch
+
+        queries = [b.embedding for b in self.books[:5]]
+        with CaptureQueriesContext(connection) as ctx:
+            results = nearest_books_batch(queries, top_k=3, backend='pgvector')
+
+        selects = [q['sql'] for q in ctx.captured_queries if q['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertEqual(len(selects), 1)
+        self.assertEqual([len(r) for r in results], [3] * 5)
+
+    def test_reranked_books_encodes_once(self):
+        """Expansion variations are encoded in a single model call"""
+        from recommendations.rag import get_reranked_books
+
+        from recommendations.query_understanding import QueryUnderstanding
+
+        understanding = QueryUnderstanding(query='query', variations=['a', 'b', 'c'])
+        with patch('recommendations.query_understanding.understand_query', return_value=understanding), \
+             patch('recommendations.rag.get_sentence_transformer_model') as mock_model_fn, \
+             patch('recommendations.rag.get_reranker_model', side_effect=Exception('no reranker')):
+            mock_model = MagicMock()
+            mock_model.encode.return_value = np.array([b.embedding for b in self.books[:3]])
+            mock_model_fn.return_value = mock_model
+
+            results = get_reranked_books('query', top_k=5, candidates_k=16)
+
+            mock_model.encode.assert_called_once_with(['a', 'b', 'c'])
+            self.assertEqual(len(results), 5)
+            self.assertEqual(len({b.id for b in results}), 5)
+
+
+class QueryEmbeddingCacheTestCase(TestCase):
+    """Test cases for the two-tier query embedding cache"""
+
+    def setUp(self):
+        cache.clear()
+        embedding_cache.clear_local_cache()
+        self.model = MagicMock()
+        self.model.encode.side_effect = lambda texts: np.array([[len(t), 1.0, 2.0] for t in texts])
+        patcher = patch('recommendations.rag.get_sentence_transformer_model', return_value=self.model)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_normalized_queries_share_an_entry(self):
+        """Case and whitespace differences do not trigger a new encode"""
+        first = embedding_cache.encode_query('Space  Opera')
+        second = embedding_cache.encode_query('  space opera ')
+
+        self.model.encode.assert_called_once_with(['space opera'])
+        np.testing.assert_array_equal(first, second)
+        self.assertEqual(first.dtype, np.float32)
+
+    def test_cased_version_encodes_original_case(self):
+        """A version without lowercase_queries encodes (and caches) the query as typed"""
+        import dataclasses
+        from recommendations.embedding_versions import VERSIONS
+
+        cased = dataclasses.replace(VERSIONS['v1'], name='cased', lowercase_queries=False)
+        with patch('recommendations.embedding_versions.active_version', return_value=cased):
+            embedding_cache.encode_query('Space  Opera')
+            embedding_cache.encode_query('space opera')
+
+        self.assertEqual(
+            [call.args[0] for call in self.model.encode.call_args_list], [['Space Opera'], ['space opera']]
+        )
+
+    def test_shared_tier_stores_float32_bytes(self):
+        """A process with a cold LRU is served from the shared cache"""
+        embedding_cache.encode_query('dragons')
+        key = embedding_cache._cache_key('all-MiniLM-L6-v2', 'dragons')
+        raw = cache.get(key)
+        self.assertIsInstance(raw, bytes)
+        self.assertEqual(len(raw), 3 * 4)
+
+        embedding_cache.clear_local_cache()
+        vector = embedding_cache.encode_query('dragons')
+        self.assertEqual(self.model.encode.call_count, 1)
+        np.testing.assert_array_equal(vector, np.array([7.0, 1.0, 2.0], dtype=np.float32))
+
+    def test_batch_encodes_only_misses(self):
+        """Cached queries are skipped and duplicates are encoded once"""
+        embedding_cache.encode_query('a')
+        vectors = embedding_cache.encode_queries(['a', 'bb', 'BB', 'ccc'])
+
+        self.assertEqual(vectors.shape, (4, 3))
+        self.model.encode.assert_called_with(['bb', 'ccc'])
+        self.assertEqual(vectors[:, 0].tolist(), [1.0, 2.0, 2.0, 3.0])
+
+    def test_lru_is_bounded(self):
+        """The in-process tier evicts the least recently used entry"""
+        lru = embedding_cache.LRUCache(2)
+        lru.put('a', 1)
+        lru.put('b', 2)
+        lru.get('a')
+        lru.put('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 1)
+        self.assertEqual(len(lru), 2)
+
+    def test_hit_miss_counters(self):
+        """Lookups are counted per tier in the Prometheus registry"""
+        counter = embedding_cache.QUERY_EMBEDDING_CACHE_EVENTS
+        local_hits = counter.labels('local', 'hit')._value.get()
+        shared_misses = counter.labels('shared', 'miss')._value.get()
+
+        embedding_cache.encode_query('counted')
+        embedding_cache.encode_query('counted')
+
+        self.assertEqual(counter.labels('local', 'hit')._value.get(), local_hits + 1)
+        self.assertEqual(counter.labels('shared', 'miss')._value.get(), shared_misses + 1)
+
+
+class RerankingTestCase(TestCase):
+    """Test cases for the cross-encoder reranking service"""
+
+    def setUp(self):
+        cache.clear()
+        self.books = [
+            Book.objects.create(title=f'Rerank Book {i}', description=f'Description {i}')
+            for i in range(5)
+        ]
+        for i, book in enumerate(self.books):
+            book.distance = i / 10
+        self.reranker = MagicMock()
+        # Later pairs score higher, so reranking reverses the vector order
+        self.reranker.predict.side_effect = lambda pairs: np.arange(len(pairs), dtype=float)
+        patcher = patch('recommendations.rag.get_reranker_model', return_value=self.reranker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rerank_orders_by_score(self):
+        """Books come back sorted by cross-encoder score"""
+        from recommendations.reranking import rerank
+
+        results = rerank('Some Query', list(self.books), top_k=3)
+        self.assertEqual([b.id for b in results], [b.id for b in self.books[::-1][:3]])
+        self.assertEqual(results[0].rerank_score, 4.0)
+
+    def test_scores_are_cached_per_book_version(self):
+        """Repeat pairs skip inference until the book is modified"""
+        from recommendations.reranking import rerank
+
+        rerank('some query', list(self.books))
+        rerank('  SOME query', list(self.books))
+        self.assertEqual(self.reranker.predict.call_count, 1)
+
+        self.books[0].save()
+        rerank('some query', list(self.books))
+        self.assertEqual(self.reranker.predict.call_count, 2)
+        self.assertEqual(len(self.reranker.predict.call_args[0][0]), 1)
+
+    def test_cased_reranker_scores_query_as_typed(self):
+        """Without RERANKER_LOWERCASE_QUERIES the pairs keep the query's case"""
+        from recommendations.reranking import rerank
+
+        with patch('recommendations.rag.RERANKER_LOWERCASE_QUERIES', False):
+            rerank('  Some   Query', list(self.books))
+            rerank('some query', list(self.books))
+
+        self.assertEqual(self.reranker.predict.call_count, 2)
+        self.assertEqual(self.reranker.predict.call_args_list[0][0][0][0][0], 'Some Query')
+
+    @override_settings(RECOMMENDATIONS_RERANK_CANDIDATES=2)
+    def test_candidate_cutoff(self):
+        """Only the closest candidates are scored"""
+        from recommendations.reranking import rerank
+
+        results = rerank('cutoff', list(reversed(self.books)), top_k=5)
+        self.assertEqual({b.id for b in results}, {self.books[0].id, self.books[1].id})
+        self.assertEqual(len(self.reranker.predict.call_args[0][0]), 2)
+
+    def test_concurrent_requests_share_one_batch(self):
+        """Pairs submitted from several threads are scored in one predict call"""
+        from concurrent.futures import ThreadPoolExecutor
+        from recommendations.reranking import RerankBatcher
+
+        batcher = RerankBatcher(max_wait_ms=200)
+        requests = [[['q', f'doc {i}'], ['q', f'doc {i}b']] for i in range(4)]
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = list(pool.map(batcher.submit, requests))
+        scores = [f.result(timeout=5) for f in futures]
+
+        self.assertEqual(self.reranker.predict.call_count, 1)
+        self.assertEqual(len(self.reranker.predict.call_args[0][0]), 8)
+        self.assertEqual(sorted(s for pair in scores for s in pair), list(range(8)))
+
+    def test_model_failure_propagates(self):
+        """Waiting callers see the model error so get_reranked_books can fall back"""
+        from recommendations.reranking import RerankBatcher
+
+        self.reranker.predict.side_effect = RuntimeError('model down')
+        future = RerankBatcher(max_wait_ms=1).submit([['q', 'doc']])
+        with self.assertRaises(RuntimeError):
+            future.result(timeout=5)
+
+
+@override_settings(RECOMMENDATIONS_ASYNC_REASONS=True)
+class AsyncReasonsTestCase(TestCase):
+    """Test cases for deferred LLM reason generation"""
+
+    def setUp(self):
+        cache.clear()
+        llm.reset_clients()
+        self.category = Category.objects.create(name='Async Category', description='Test')
+        self.books = []
+        for i in range(2):
+            book = Book.objects.create(
+                title=f'Async Book {i}', reference=f'ASYNC{i}', embedding=np.random.rand(384).tolist()
+            )
+            Product.objects.create(name=book.title, reference=book.reference, category=self.category, price=10.0)
+            self.books.append(book)
+
+    def _mock_chain(self, mock_prompt_cls, response):
+        mock_prompt = MagicMock()
+        mock_prompt_cls.from_template.return_value = mock_prompt
+        mock_intermediate = MagicMock()
+        mock_prompt.__or__.return_value = mock_intermediate
+        mock_chain = MagicMock()
+        mock_intermediate.__or__.return_value = mock_chain
+        mock_chain.invoke.return_value = response
+        return mock_chain
+
+    def test_query_returns_books_before_reasons(self):
+        """Results come back without calling the LLM; the job fills the cache in"""
+        from recommendations.rag import get_recommendations_by_query, get_query_recommendations_cache_key
+        from recommendations.reasons import get_reasons_job, get_reasons_job_id
+        from recommendations.tasks import generate_reasons_task
+
+        with patch('recommendations.rag.get_reranked_books', return_value=self.books), \
+             patch('recommendations.llm.ChatOllama') as mock_llm_cls, \
+             patch('recommendations.tasks.generate_reasons_task.delay') as mock_delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                immediate = get_recommendations_by_query('async query', top_k=2)
+
+            mock_llm_cls.assert_not_called()
+            self.assertEqual([r['title'] for r in immediate], ['Async Book 0', 'Async Book 1'])
+            job_id = get_reasons_job_id(get_query_recommendations_cache_key('async query', 2))
+            self.assertEqual(get_reasons_job(job_id)['status'], 'pending')
+            mock_delay.assert_called_once()
+
+            # Repeat requests are served the placeholders without queueing another job
+            with self.captureOnCommitCallbacks(execute=True):
+                get_recommendations_by_query('async query', top_k=2)
+            mock_delay.assert_called_once()
+
+        with patch('recommendations.llm.ChatOllama'), \
+             patch('recommendations.rag.ChatPromptTemplate') as mock_prompt_cls:
+            self._mock_chain(mock_prompt_cls, '["Reason A", "Reason B"]')
+            generate_reasons_task(*mock_delay.call_args.args)
+
+        job = get_reasons_job(job_id)
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['result'], ['Reason A', 'Reason B'])
+        final = get_recommendations_by_query('async query', top_k=2)
+        self.assertEqual([r['reason'] for r in final], ['Reason A', 'Reason B'])
+        self.assertIsNone(get_reasons_job_id(get_query_recommendations_cache_key('async query', 2)))
+
+    def test_reasons_endpoint(self):
+        """Jobs can be polled over the API"""
+        from recommendations.reasons import dispatch_reasons_job
+
+        with patch('recommendations.tasks.generate_reasons_task.delay'):
+            job_id = dispatch_reasons_job('title', 'endpoint_key', '<ul></ul>', [b.id for b in self.books], book_title='x')
+
+        response = self.client.get(f'/api/recommend/reasons/{job_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'pending')
+        self.assertEqual(response.json()['book_ids'], [b.id for b in self.books])
+
+        response = self.client.get('/api/recommend/reasons/missing/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_failed_job_keeps_placeholders(self):
+        """An LLM error marks the job failed and leaves the placeholder results"""
+        from recommendations.rag import get_recommendations_by_book_title, get_title_recommendations_cache_key
+        from recommendations.reasons import get_reasons_job, get_reasons_job_id
+        from recommendations.tasks import generate_reasons_task
+
+        with patch('recommendations.tasks.generate_reasons_task.delay') as mock_delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                html = get_recommendations_by_book_title('Async Book 0', top_k=1)
+        self.assertIn('Async Book 1', html)
+        job_id = get_reasons_job_id(get_title_recommendations_cache_key('Async Book 0', 1))
+
+        with patch('recommendations.llm.ChatOllama', side_effect=Exception('LLM down')):
+            generate_reasons_task(*mock_delay.call_args.args)
+
+        self.assertEqual(get_reasons_job(job_id)['status'], 'failed')
+        self.assertEqual(get_recommendations_by_book_title('Async Book 0', top_k=1), html)
+
+
+class LLMClientTestCase(TestCase):
+    """Test cases for the shared Ollama client"""
+
+    def setUp(self):
+        llm.reset_clients()
+        self.addCleanup(llm.reset_clients)
+
+    def _prompt(self, chain):
+        prompt = MagicMock()
+        prompt.__or__.return_value.__or__.return_value = chain
+        return prompt
+
+    def test_clients_are_reused(self):
+        """One ChatOllama per model/options per process"""
+        with patch('recommendations.llm.ChatOllama', side_effect=lambda **kwargs: MagicMock()) as mock_llm_cls:
+            first = llm.get_chat_model('model-a', temperature=0.1)
+            second = llm.get_chat_model('model-a', temperature=0.1)
+            other = llm.get_chat_model('model-b', temperature=0.1)
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+        self.assertEqual(mock_llm_cls.call_count, 2)
+        self.assertIn('timeout', mock_llm_cls.call_args.kwargs['client_kwargs'])
+
+    @override_settings(OLLAMA_MAX_CONCURRENCY=1, OLLAMA_QUEUE_TIMEOUT_SECONDS=0.05)
+    def test_concurrency_cap(self):
+        """A model at its in-flight limit rejects callers after the queue timeout"""
+        chain = MagicMock()
+        chain.invoke.return_value = 'ok'
+        with patch('recommendations.llm.ChatOllama'):
+            with llm.llm_slot('capped'):
+                with self.assertRaises(llm.LLMBusyError):
+                    llm.generate('capped', self._prompt(chain), {})
+                # Other models are not affected
+                self.assertEqual(llm.generate('other', self._prompt(chain), {}), 'ok')
+            self.assertEqual(llm.generate('capped', self._prompt(chain), {}), 'ok')
+
+    def test_generation_metrics(self):
+        """Generation time is recorded per model and outcome"""
+        from prometheus_client import REGISTRY
+
+        def sample(outcome):
+            return REGISTRY.get_sample_value(
+                'llm_generation_seconds_count', {'model': 'metered', 'outcome': outcome}
+            ) or 0
+
+        chain = MagicMock()
+        chain.invoke.side_effect = ['fine', Exception('boom')]
+        with patch('recommendations.llm.ChatOllama'):
+            llm.generate('metered', self._prompt(chain), {})
+            with self.assertRaises(Exception):
+                llm.generate('metered', self._prompt(chain), {})
+
+        self.assertEqual(sample('ok'), 1)
+        self.assertEqual(sample('error'), 1)
+
+
+class QueryUnderstandingTestCase(TestCase):
+    """Test cases for the concurrent, de-duplicated HyDE/expansion stage"""
+
+    def setUp(self):
+        cache.clear()
+        self.calls = {'hyde': 0, 'expansion': 0}
+        self.lock = threading.Lock()
+
+    def _counting(self, stage, result, delay=0.0, barrier=None):
+        def fake(query, *args):
+            with self.lock:
+                self.calls[stage] += 1
+            if barrier is not None:
+                barrier.wait()
+            time.sleep(delay)
+            return result
+        return fake
+
+    def test_stages_run_concurrently(self):
+        """HyDE and expansion overlap instead of running one after the other"""
+        from recommendations.query_understanding import understand_query
+
+        # Each fake blocks until the other has started; serial execution would break the barrier
+        barrier = threading.Barrier(2, timeout=5)
+        with patch('recommendations.hyde.generate_hypothetical_document',
+                   self._counting('hyde', 'A hypothetical book', barrier=barrier)), \
+             patch('recommendations.expansion.generate_query_variations',
+                   self._counting('expansion', ['space opera', 'galactic empire'], barrier=barrier)):
+            understanding = understand_query('space opera')
+
+        self.assertEqual(understanding.hypothetical_doc, 'A hypothetical book')
+        self.assertEqual(
+            understanding.retrieval_queries(), ['space opera', 'galactic empire', 'A hypothetical book']
+        )
+
+    def test_identical_inflight_queries_coalesce(self):
+        """Simultaneous searches for the same query make one LLM call per stage"""
+        from concurrent.futures import ThreadPoolExecutor
+        from recommendations.query_understanding import understand_query
+
+        with patch('recommendations.hyde.generate_hypothetical_document',
+                   self._counting('hyde', 'doc', delay=0.3)), \
+             patch('recommendations.expansion.generate_query_variations',
+                   self._counting('expansion', ['novela histórica'], delay=0.3)):
+            with ThreadPoolExecutor(max_workers=6) as pool:
+                queries = ['novela histórica', 'Novela  histórica'] * 3
+                results = list(pool.map(understand_query, queries))
+
+            self.assertEqual(self.calls, {'hyde': 1, 'expansion': 1})
+            self.assertTrue(all(r.hypothetical_doc == 'doc' for r in results))
+
+            # Later requests are served from the cache
+            understand_query('novela histórica')
+            self.assertEqual(self.calls, {'hyde': 1, 'expansion': 1})
+
+    def test_failures_fall_back_and_are_not_cached(self):
+        """A failed stage yields the bare query and is retried next time"""
+        from recommendations.query_understanding import understand_query
+
+        with patch('recommendations.hyde.generate_hypothetical_document', side_effect=Exception('LLM down')), \
+             patch('recommendations.expansion.generate_query_variations', side_effect=Exception('LLM down')):
+            understanding = understand_query('fallback query')
+        self.assertEqual(understanding.retrieval_queries(), ['fallback query'])
+
+        with patch('recommendations.hyde.generate_hypothetical_document', self._counting('hyde', 'doc')), \
+             patch('recommendations.expansion.generate_query_variations', self._counting('expansion', ['x'])):
+            understand_query('fallback query')
+        self.assertEqual(self.calls, {'hyde': 1, 'expansion': 1})
+
+
+class SingleflightTestCase(SimpleTestCase):
+    """Test cases for cache stampede protection"""
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def _compute(self, value='fresh', delay=0.0):
+        def compute():
+            with self.lock:
+                self.calls += 1
+            time.sleep(delay)
+            return value
+        return compute
+
+    def test_miss_computes_once_then_hits(self):
+        from recommendations.singleflight import cached_call
+
+        self.assertEqual(cached_call('sf_key', self._compute(), ttl=60), 'fresh')
+        self.assertEqual(cached_call('sf_key', self._compute('other'), ttl=60), 'fresh')
+        self.assertEqual(self.calls, 1)
+
+    def test_dont_cache_results_are_returned_not_stored(self):
+        from recommendations.singleflight import DontCache, cached_call
+
+        self.assertEqual(cached_call('sf_nocache', lambda: DontCache([]), ttl=60), [])
+        self.assertIsNone(cache.get('sf_nocache'))
+
+    def test_stale_value_served_during_refresh(self):
+        """Callers that lose the lock get the expired value instead of recomputing"""
+        from recommendations.singleflight import cached_call, store
+
+        store('sf_stale', 'old', ttl=0)
+        cache.add('sf_stale:refresh_lock', 'someone-else', 30)
+        self.assertEqual(cached_call('sf_stale', self._compute(), ttl=60), 'old')
+        self.assertEqual(self.calls, 0)
+
+        cache.delete('sf_stale:refresh_lock')
+        self.assertEqual(cached_call('sf_stale', self._compute(), ttl=60), 'fresh')
+        self.assertEqual(self.calls, 1)
+
+    def test_probabilistic_early_refresh(self):
+        """Slow-to-compute keys close to expiry are refreshed early"""
+        from recommendations.singleflight import cached_call, store
+
+        store('sf_xfetch', 'old', ttl=5, compute_time=60)
+        with patch('recommendations.singleflight.random.random', return_value=0.5):
+            self.assertEqual(cached_call('sf_xfetch', self._compute(), ttl=60, beta=0), 'old')
+            self.assertEqual(cached_call('sf_xfetch', self._compute(), ttl=60), 'fresh')
+
+    def test_cold_start_storm(self):
+        """Concurrent misses on an empty key wait for one computation"""
+        from concurrent.futures import ThreadPoolExecutor
+        from recommendations.singleflight import cached_call
+
+        compute = self._compute(delay=0.2)
+        with ThreadPoolExecutor(max_workers=20) as pool:
+            results = list(pool.map(lambda _: cached_call('sf_cold', compute, ttl=60), range(20)))
+
+        self.assertEqual(results, ['fresh'] * 20)
+        self.assertEqual(self.calls, 1)
+
+    def test_expiry_storm_load(self):
+        """
+        Load test: 20 threads hammer a key that expires every 0.1s for ~1s.
+        Recomputes track the number of expiries, not the number of requests.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from recommendations.singleflight import cached_call
+
+        compute = self._compute(delay=0.02)
+        requests = []
+        stop_at = time.monotonic() + 1.0
+
+        def hammer(_):
+            served = 0
+            while time.monotonic() < stop_at:
+                cached_call('sf_storm', compute, ttl=0.1, beta=0)
+                served += 1
+            return served
+
+        with ThreadPoolExecutor(max_workers=20) as pool:
+            requests = list(pool.map(hammer, range(20)))
+
+        self.assertGreater(sum(requests), 200)
+        # ~10 expiries in one second; allow slack for scheduling
+        self.assertLessEqual(self.calls, 15)
+
+    def test_query_recommendations_llm_calls_stay_flat(self):
+        """An expiry storm on a popular query triggers one LLM generation"""
+        from concurrent.futures import ThreadPoolExecutor
+        from recommendations.rag import get_recommendations_by_query, get_query_recommendations_cache_key
+        from recommendations.singleflight import store
+
+        books = [Book(id=i, title=f'Storm Book {i}', reference=f'S{i}') for i in range(3)]
+        cache_key = get_query_recommendations_cache_key('popular query', 3)
+        store(cache_key, [{'title': 'stale'}], ttl=0)
+
+        def fake_generate(*args, **kwargs):
+            with self.lock:
+                self.calls += 1
+            time.sleep(0.2)
+            return '["A", "B", "C"]'
+
+        with patch('recommendations.rag.get_reranked_books', return_value=books), \
+             patch('recommendations.rag.get_product_ids', return_value={}), \
+             patch('recommendations.llm.generate', side_effect=fake_generate):
+            with ThreadPoolExecutor(max_workers=25) as pool:
+                results = list(pool.map(lambda _: get_recommendations_by_query('popular query', 3), range(50)))
+
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(r in ([{'title': 'stale'}],) or len(r) == 3 for r in results))
+        self.assertEqual(get_recommendations_by_query('popular query', 3)[0]['reason'], 'A')
+
+
+class TasteProfileTestCase(TestCase):
+    """Test cases for materialized user taste vectors"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tasteuser', password='testpass')
+        self.category = Category.objects.create(name='Taste Category', description='Test')
+
+        def unit(i):
+            v = np.zeros(384)
+            v[i] = 1.0
+            return v
+
+        self.vectors = [unit(0), unit(1), unit(2)]
+        self.bought_a = Book.objects.create(title='Bought A', reference='TA', embedding=self.vectors[0].tolist())
+        self.bought_b = Book.objects.create(title='Bought B', reference='TB', embedding=self.vectors[1].tolist())
+        near = (self.vectors[0] + self.vectors[1] + 0.1 * self.vectors[2]).tolist()
+        self.near = Book.objects.create(title='Near', reference='TN', embedding=near)
+        self.far = Book.objects.create(title='Far', reference='TF', embedding=self.vectors[2].tolist())
+        self.unlisted = Book.objects.create(title='Unlisted', reference='TU', embedding=near)
+        for book in (self.bought_a, self.bought_b, self.near, self.far):
+            Product.objects.create(name=book.title, reference=book.reference, category=self.category, price=10.0)
+
+    def test_candidates_exclude_purchases_and_join_products(self):
+        """One statement returns unpurchased, purchasable books with their product ids"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from recommendations.taste_profile import taste_candidates
+
+        Purchase.objects.create(user=self.user, book=self.bought_a)
+        Purchase.objects.create(user=self.user, book=self.bought_b)
+
+        # First call builds the profile
+        books = taste_candidates(self.user.id, top_k=5)
+        self.assertEqual([b.id for b in books], [self.near.id, self.far.id])
+        self.assertEqual(books[0].product_id, Product.objects.get(reference='TN').id)
+
+        with CaptureQueriesContext(connection) as queries:
+            taste_candidates(self.user.id, top_k=5)
+        selects = [q['sql'] for q in queries.captured_queries if q['sql'].lstrip().startswith('SELECT')]
+        self.assertEqual(len(selects), 1)
+
+    def test_incremental_update_matches_rebuild(self):
+        """record_purchase() gives the same vector as recomputing from scratch"""
+        from recommendations.models import UserTasteProfile
+        from recommendations.taste_profile import rebuild_taste_profile, record_purchase
+
+        Purchase.objects.create(user=self.user, book=self.bought_a)
+        rebuild_taste_profile(self.user.id)
+        purchase = Purchase.objects.create(user=self.user, book=self.bought_b)
+        record_purchase(purchase.id)
+
+        profile = UserTasteProfile.objects.get(user=self.user)
+        self.assertEqual(profile.purchase_count, 2)
+        self.assertEqual(profile.last_purchase_id, purchase.id)
+        np.testing.assert_allclose(profile.embedding, (self.vectors[0] + self.vectors[1]) / 2, atol=1e-6)
+
+        # Replaying the same purchase does not count it twice
+        record_purchase(purchase.id)
+        profile.refresh_from_db()
+        self.assertEqual(profile.purchase_count, 2)
+
+    def test_recency_weighting(self):
+        """With a half-life, recent purchases outweigh old ones"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from recommendations.taste_profile import rebuild_taste_profile
+
+        old = Purchase.objects.create(user=self.user, book=self.bought_a)
+        Purchase.objects.filter(id=old.id).update(purchase_date=timezone.now() - timedelta(days=30))
+        Purchase.objects.create(user=self.user, book=self.bought_b)
+
+        with override_settings(RECOMMENDATIONS_TASTE_HALF_LIFE_DAYS=30):
+            profile = rebuild_taste_profile(self.user.id)
+
+        # Weights 0.5 and 1.0
+        self.assertAlmostEqual(profile.embedding[0], 1 / 3, places=3)
+        self.assertAlmostEqual(profile.embedding[1], 2 / 3, places=3)
+
+    def test_signals_maintain_profile(self):
+        """Creating and deleting purchases keeps the profile current after commit"""
+        from recommendations.models import UserTasteProfile
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Purchase.objects.create(user=self.user, book=self.bought_a)
+        with self.captureOnCommitCallbacks(execute=True):
+            purchase = Purchase.objects.create(user=self.user, book=self.bought_b)
+        self.assertEqual(UserTasteProfile.objects.get(user=self.user).purchase_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            purchase.delete()
+        profile = UserTasteProfile.objects.get(user=self.user)
+        self.assertEqual(profile.purchase_count, 1)
+        np.testing.assert_allclose(profile.embedding, self.vectors[0], atol=1e-6)
+
+    def test_no_embedded_purchases(self):
+        """Users whose books have no embeddings get no profile and no candidates"""
+        from recommendations.models import UserTasteProfile
+        from recommendations.taste_profile import taste_candidates
+
+        book = Book.objects.create(title='Unembedded', reference='TX')
+        Purchase.objects.create(user=self.user, book=book)
+
+        self.assertEqual(taste_candidates(self.user.id), [])
+        self.assertFalse(UserTasteProfile.objects.filter(user=self.user).exists())
+
+
+class EmbedBooksCommandTestCase(TestCase):
+    """Test cases for the batched embed_books pipeline"""
+
+    def setUp(self):
+        self.books = [Book.objects.create(title=f'Book {i}', description='Desc') for i in range(5)]
+        Book.objects.create(title='Already embedded', embedding=np.ones(384).tolist())
+
+        self.encode_calls = []
+
+        def encode(texts, batch_size=32, **kwargs):
+            self.encode_calls.append(list(texts))
+            return np.tile(np.arange(384, dtype=np.float32) / 384, (len(texts), 1))
+
+        self.model = MagicMock()
+        self.model.encode.side_effect = encode
+
+    def test_write_embeddings_single_update(self):
+        """write_embeddings stores every vector through the COPY + UPDATE path"""
+        from recommendations.embedding_pipeline import write_embeddings
+
+        vectors = np.random.rand(2, 384).astype(np.float32)
+        updated = write_embeddings([self.books[0].id, self.books[1].id], vectors)
+
+        self.assertEqual(updated, 2)
+        self.books[1].refresh_from_db()
+        np.testing.assert_allclose(self.books[1].embedding, vectors[1], rtol=1e-6)
+
+    def test_missing_only_run_embeds_every_book(self):
+        """Keyset paging reaches every unembedded book even though the filter shrinks as it writes"""
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        with patch('recommendations.management.commands.embed_books.get_sentence_transformer_model',
+                   return_value=self.model):
+            call_command('embed_books', batch_size=2, stdout=out)
+
+        self.assertFalse(Book.objects.filter(embedding__isnull=True).exists())
+        # One batched encode per page of two
+        self.assertEqual([len(texts) for texts in self.encode_calls], [2, 2, 1])
+        self.assertIn('books/sec', out.getvalue())
+
+
+class EmbeddingWorkerPoolTestCase(TestCase):
+    """Test cases for the dedicated embedding worker mode"""
+
+    def setUp(self):
+        self.books = [Book.objects.create(title=f'Pool Book {i}') for i in range(7)]
+        self.model = MagicMock()
+        self.model.encode.side_effect = lambda texts, **kwargs: np.ones((len(texts), 384), dtype=np.float32)
+
+    def test_plan_ranges_covers_every_id(self):
+        """Ranges are contiguous, non-overlapping and at most range_size books"""
+        from recommendations.embedding_workers import plan_ranges
+
+        ranges = plan_ranges(Book.objects.all(), range_size=3)
+        ids = [b.id for b in self.books]
+
+        self.assertEqual(len(ranges), 3)
+        self.assertEqual(ranges[0], (0, ids[2]))
+        self.assertEqual(ranges[1], (ids[2], ids[5]))
+        self.assertEqual(ranges[-1][1], ids[-1])
+
+    def test_embed_range_encodes_in_batches(self):
+        """A worker embeds only its own range, one encode call per page"""
+        from recommendations.embedding_workers import RangeTask, embed_range
+
+        ids = [b.id for b in self.books]
+        with patch('recommendations.rag.get_sentence_transformer_model', return_value=self.model):
+            result = embed_range(RangeTask(
+                start_after=ids[1], last_id=ids[5], version='v1', missing_only=True, page_size=2, encode_batch_size=16,
+            ))
+
+        self.assertEqual(result.processed, 4)
+        self.assertEqual(self.model.encode.call_count, 2)
+        embedded = set(Book.objects.filter(embedding__isnull=False).values_list('id', flat=True))
+        self.assertEqual(embedded, set(ids[2:6]))
+
+    def test_reindex_command_targets_worker_pool(self):
+        """--workers runs the local pool instead of queuing Celery tasks"""
+        from io import StringIO
+        from django.core.management import call_command
+
+        totals = {'processed': 7, 'skipped': 0, 'errors': 0, 'seconds': 1.0, 'books_per_sec': 7.0, 'user_ids': set()}
+        with patch('recommendations.management.commands.reindex_embeddings.run_embedding_pool',
+                   return_value=totals) as mock_pool, \
+             patch('recommendations.management.commands.reindex_embeddings.generate_embeddings_task') as mock_task:
+            call_command('reindex_embeddings', workers=2, threads_per_worker=3, stdout=StringIO())
+
+        mock_task.delay.assert_not_called()
+        self.assertEqual(mock_pool.call_args.kwargs['workers'], 2)
+        self.assertEqual(mock_pool.call_args.kwargs['threads'], 3)
+
+
+class EmbeddingFingerprintTestCase(TestCase):
+    """Test cases for content-hash based incremental re-embedding"""
+
+    def setUp(self):
+        cache.clear()
+        self.model = MagicMock()
+        self.model.encode.side_effect = lambda texts, **kwargs: np.ones((len(texts), 384), dtype=np.float32)
+        with patch('recommendations.signals.generate_embeddings_task'):
+            self.book = Book.objects.create(title='Fingerprinted', description='Same text')
+
+    def embed(self):
+        from recommendations.tasks import generate_embeddings_task
+        with patch('recommendations.tasks.get_sentence_transformer_model', return_value=self.model):
+            return generate_embeddings_task([self.book.id])
+
+    def test_task_stores_fingerprint_and_skips_unchanged(self):
+        """A second task run for unchanged text does not encode again"""
+        from recommendations.embedding_pipeline import get_encode_stats
+
+        self.embed()
+        self.book.refresh_from_db()
+        self.assertIsNotNone(self.book.embedding_fingerprint)
+
+        self.assertEqual(self.embed(), 'No updates made.')
+        self.assertEqual(self.model.encode.call_count, 1)
+        self.assertEqual(get_encode_stats()['task'], {'encoded': 1, 'skipped': 1})
+
+    def test_signal_ignores_saves_without_text_changes(self):
+        """Only saves that change the embedded text queue a task"""
+        self.embed()
+        self.book.refresh_from_db()
+
+        with patch('recommendations.signals.generate_embeddings_task') as mock_task:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.book.stock = 5
+                self.book.save()
+            mock_task.delay.assert_not_called()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.book.description = 'New text'
+                self.book.save()
+            mock_task.delay.assert_called_once_with([self.book.id])
+
+    def test_model_change_invalidates_fingerprint(self):
+        """The fingerprint covers the model name as well as the text"""
+        from recommendations.embedding_pipeline import book_embedding_text, embedding_fingerprint
+
+        text = book_embedding_text(self.book)
+        self.assertNotEqual(embedding_fingerprint(text, 'model-a'), embedding_fingerprint(text, 'model-b'))
+
+    def test_embed_books_rerun_avoids_encodes(self):
+        """embed_books --force only re-encodes books whose text changed"""
+        from io import StringIO
+        from django.core.management import call_command
+
+        with patch('recommendations.management.commands.embed_books.get_sentence_transformer_model',
+                   return_value=self.model):
+            call_command('embed_books', stdout=StringIO())
+            out = StringIO()
+            call_command('embed_books', force=True, stdout=out)
+
+        self.assertEqual(self.model.encode.call_count, 1)
+        self.assertIn('Books skipped (text and model unchanged): 1', out.getvalue())
+
+        stats = StringIO()
+        call_command('embedding_stats', verify=True, stdout=stats)
+        self.assertIn('Avoided 1 of 2 encodes', stats.getvalue())
+
+
+class EmbeddingVersionTestCase(TestCase):
+    """Test cases for versioned embeddings built side by side and switched atomically"""
+
+    def setUp(self):
+        from recommendations.embedding_versions import EmbeddingVersion, reset_active_version_cache
+
+        cache.clear()
+        embedding_cache.clear_local_cache()
+        reset_active_version_cache()
+        self.addCleanup(reset_active_version_cache)
+        self.v2 = EmbeddingVersion(
+            name='v2', model_name='model-v2',
+            document_template='{title} by {author}', query_template='query: {query}',
+        )
+        versions = patch.dict('recommendations.embedding_versions.VERSIONS', {'v2': self.v2})
+        versions.start()
+        self.addCleanup(versions.stop)
+
+        self.model = MagicMock()
+        self.model.encode.side_effect = lambda texts, **kwargs: np.full((len(texts), 384), 2.0, dtype=np.float32)
+        with patch('recommendations.signals.generate_embeddings_task'):
+            self.book = Book.objects.create(
+                title='Versioned', author='Someone', embedding=[1.0] * 384, embedding_version='v1'
+            )
+
+    def test_v1_text_matches_previous_template(self):
+        """The default version renders books exactly like the pre-versioning code"""
+        from recommendations.embedding_pipeline import book_embedding_text
+
+        b = self.book
+        self.assertEqual(
+            book_embedding_text(b),
+            f"Title: {b.title}. Author: {b.author}. infantil: {b.infantil}. "
+            f"Category: {b.category}. Description: {b.description}. Subjects: {b.subjects}."
+        )
+
+    def build(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        with patch('recommendations.rag.get_sentence_transformer_model', return_value=self.model):
+            call_command('build_embedding_version', 'v2', stdout=StringIO())
+
+    def test_build_leaves_live_embeddings_alone(self):
+        """Building a version only writes shadow rows, and re-runs skip built books"""
+        from recommendations.models import BookEmbeddingShadow
+
+        self.build()
+        self.book.refresh_from_db()
+        self.assertEqual(list(self.book.embedding), [1.0] * 384)
+        self.assertEqual(self.book.embedding_version, 'v1')
+        shadow = BookEmbeddingShadow.objects.get(version='v2', book=self.book)
+        self.assertEqual(list(shadow.embedding), [2.0] * 384)
+
+        self.build()
+        self.assertEqual(self.model.encode.call_count, 1)
+
+    def test_activate_swaps_vectors(self):
+        """Activation copies the shadow vectors into Book and switches the active version"""
+        from io import StringIO
+        from django.core.management import call_command
+        from recommendations.embedding_versions import active_version
+        from recommendations.models import BookEmbeddingShadow, EmbeddingVersionState
+
+        self.build()
+        with patch('recommendations.rag.get_sentence_transformer_model', return_value=self.model), \
+                patch('recommendations.management.commands.activate_embedding_version.get_sentence_transformer_model',
+                      return_value=self.model):
+            call_command('activate_embedding_version', 'v2', stdout=StringIO())
+
+        self.book.refresh_from_db()
+        self.assertEqual(list(self.book.embedding), [2.0] * 384)
+        self.assertEqual(self.book.embedding_version, 'v2')
+        self.assertEqual(self.book.embedding_fingerprint, self.v2.fingerprint('Versioned by Someone'))
+        self.assertEqual(active_version(), self.v2)
+        self.assertEqual(EmbeddingVersionState.objects.get(name='v2').status, EmbeddingVersionState.STATUS_ACTIVE)
+        self.assertFalse(BookEmbeddingShadow.objects.filter(version='v2').exists())
+
+    def test_activate_refuses_incomplete_build(self):
+        """A version missing books is not activated without --allow-partial"""
+        from django.core.management import CommandError, call_command
+        from recommendations.embedding_versions import start_build
+
+        start_build('v2')
+        failing = MagicMock()
+        failing.encode.side_effect = RuntimeError('model unavailable')
+        with patch('recommendations.rag.get_sentence_transformer_model', return_value=failing):
+            with self.assertRaises(CommandError):
+                call_command('activate_embedding_version', 'v2')
+
+    def test_queries_follow_active_version(self):
+        """Query embeddings use the active version's model and template"""
+        from recommendations.embedding_versions import activate, start_build
+
+        with patch('recommendations.rag.get_sentence_transformer_model', return_value=self.model) as get_model:
+            embedding_cache.encode_queries(['dragons'])
+            get_model.assert_called_with('all-MiniLM-L6-v2')
+
+            start_build('v2')
+            activate('v2')
+            embedding_cache.encode_queries(['dragons'])
+            get_model.assert_called_with('model-v2')
+            self.assertEqual(self.model.encode.call_args[0][0], ['query: dragons'])
+
+
+class ImportAzacanTestCase(TestCase):
+    """Test cases for the streaming, resumable import_azacan command"""
+
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.records = [
+            {'reference': f'AZ{i}', 'title': f'Imported {i}', 'author': 'Author', 'price': 9.5, 'iva': 4}
+            for i in range(5)
+        ]
+
+    def write(self, name, text):
+        import os
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def run_import(self, path, **options):
+        from io import StringIO
+        from django.core.management import call_command
+
+        with patch('recommendations.management.commands.import_azacan.generate_embeddings_task') as mock_task:
+            call_command('import_azacan', path, skip_images=True, batch_size=2, stdout=StringIO(), **options)
+        return mock_task
+
+    def test_iter_records_streams_array_and_lines(self):
+        """Both formats decode record by record, across chunk boundaries"""
+        import json
+        from recommendations.import_stream import iter_records
+
+        array = self.write('books.json', json.dumps(self.records, indent=2))
+        lines = self.write('books.jsonl', '\n'.join(json.dumps(r) for r in self.records) + '\n')
+        self.assertEqual(list(iter_records(array, chunk_size=7)), self.records)
+        self.assertEqual(list(iter_records(lines, chunk_size=7)), self.records)
+
+    def test_import_upserts_and_queues_one_embedding_pass(self):
+        """Rows are bulk-upserted, then every new book is queued for embedding at once"""
+        import json
+
+        path = self.write('books.json', json.dumps(self.records))
+        mock_task = self.run_import(path)
+
+        self.assertEqual(Book.objects.filter(reference__startswith='AZ').count(), 5)
+        queued = [i for call in mock_task.delay.call_args_list for i in call.args[0]]
+        self.assertEqual(sorted(queued), sorted(Book.objects.values_list('id', flat=True)))
+
+        self.records[0]['title'] = 'Renamed'
+        path = self.write('books.json', json.dumps(self.records))
+        mock_task = self.run_import(path, update=True)
+        self.assertEqual(Book.objects.get(reference='AZ0').title, 'Renamed')
+        self.assertEqual(Book.objects.count(), 5)
+
+    def test_import_resumes_from_checkpoint(self):
+        """Records committed before an interruption are not imported again"""
+        import json
+        import os
+        from recommendations.import_stream import ImportCheckpoint
+
+        path = self.write('books.jsonl', '\n'.join(json.dumps(r) for r in self.records))
+        checkpoint = ImportCheckpoint(f'{path}.checkpoint', path)
+        checkpoint.save(records=2, phase='rows')
+
+        self.run_import(path)
+
+        self.assertEqual(
+            sorted(Book.objects.values_list('reference', flat=True)), ['AZ2', 'AZ3', 'AZ4']
+        )
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+    def test_bad_records_are_skipped_one_by_one(self):
+        """A record that fails to convert or to insert costs only itself, not its batch"""
+        import json
+
+        self.records[1]['price'] = 'n/a'
+        self.records[3]['title'] = 'x' * 300
+        path = self.write('books.json', json.dumps(self.records))
+        self.run_import(path)
+
+        self.assertEqual(
+            sorted(Book.objects.values_list('reference', flat=True)), ['AZ0', 'AZ2', 'AZ4']
+        )
+
+    def test_checkpoint_stays_before_rows_that_were_not_written(self):
+        """A database failure stops the import where a resume can pick the rows up again"""
+        import json
+        from django.core.management.base import CommandError
+        from django.db import OperationalError
+        from recommendations.import_stream import ImportCheckpoint
+        from recommendations.management.commands.import_azacan import Command
+
+        path = self.write('books.jsonl', '\n'.join(json.dumps(r) for r in self.records))
+        real_upsert = Command.upsert
+        calls = []
+
+        def flaky_upsert(command, books, update):
+            calls.append(list(books))
+            if len(calls) > 1:
+                raise OperationalError('server closed the connection')
+            return real_upsert(command, books, update)
+
+        with patch.object(Command, 'upsert', flaky_upsert), self.assertRaises(CommandError):
+            self.run_import(path)
+
+        checkpoint = ImportCheckpoint(f'{path}.checkpoint', path)
+        self.assertTrue(checkpoint.load())
+        self.assertEqual(checkpoint.records, 2)
+
+        self.run_import(path)
+        self.assertEqual(Book.objects.filter(reference__startswith='AZ').count(), 5)
+
+
+class CategoryClassifierTestCase(TestCase):
+    """Test cases for the embedding nearest-centroid category classifier API"""
+
+    def setUp(self):
+        from recommendations import category_classifier
+
+        self.classifier = category_classifier
+        cache.clear()
+        category_classifier.reset_centroid_cache()
+        self.addCleanup(category_classifier.reset_centroid_cache)
+
+        names = category_classifier.CATEGORIES
+        descriptions = category_classifier.CATEGORY_DESCRIPTIONS
+
+        def encode(texts, **kwargs):
+            # Category texts (and book titles naming a category) are one-hot
+            vectors = np.zeros((len(texts), 384), dtype=np.float32)
+            for row, text in enumerate(texts):
+                for index, name in enumerate(names):
+                    if text in (name, descriptions[name]) or text.startswith(f'Title: {name}.'):
+                        vectors[row, index] = 1.0
+            return vectors
+
+        self.model = MagicMock()
+        self.model.encode.side_effect = encode
+        model_patch = patch('recommendations.rag.get_sentence_transformer_model', return_value=self.model)
+        model_patch.start()
+        self.addCleanup(model_patch.stop)
+
+        def one_hot(name):
+            vector = [0.0] * 384
+            vector[names.index(name)] = 1.0
+            return vector
+
+        self.one_hot = one_hot
+        with patch('recommendations.signals.generate_embeddings_task'):
+            self.poetry = Book.objects.create(title='Verses', reference='CC1', embedding=one_hot('Poetry'))
+            self.travel = Book.objects.create(title='Journeys', reference='CC2', embedding=one_hot('Travel'))
+            self.unembedded = Book.objects.create(title='Romance', reference='CC3')
+
+    def test_centroids_encoded_once_and_shared(self):
+        """Centroids are encoded once, then served from memory and the shared cache"""
+        first = self.classifier.category_centroids()
+        self.classifier.category_centroids()
+        self.assertEqual(self.model.encode.call_count, 1)
+
+        # Another process: empty local cache, centroids come from the shared cache
+        self.classifier.reset_centroid_cache()
+        np.testing.assert_array_equal(self.classifier.category_centroids(), first)
+        self.assertEqual(self.model.encode.call_count, 1)
+
+    def test_classify_catalog_in_one_pass(self):
+        """Every embedded Book is classified from its stored vector without encoding"""
+        self.classifier.category_centroids()
+        self.model.encode.reset_mock()
+
+        predictions = self.classifier.classify_catalog()
+
+        self.assertEqual(set(predictions), {self.poetry.id, self.travel.id})
+        self.assertEqual(predictions[self.poetry.id].category, 'Poetry')
+        self.assertEqual(predictions[self.travel.id].category, 'Travel')
+        self.assertAlmostEqual(predictions[self.poetry.id].score, 1.0, places=5)
+        self.model.encode.assert_not_called()
+
+    def test_books_without_embedding_are_encoded(self):
+        """classify_books only encodes the books that have no stored embedding"""
+        self.classifier.category_centroids()
+        self.model.encode.reset_mock()
+
+        predictions = self.classifier.classify_books(Book.objects.order_by('id'))
+
+        self.assertEqual([p.category for p in predictions], ['Poetry', 'Travel', 'Romance'])
+        self.assertEqual(self.model.encode.call_count, 1)
+        self.assertEqual(len(self.model.encode.call_args.args[0]), 1)
+
+    def test_products_reuse_book_embedding(self):
+        """A product with a matching Book reference is classified without encoding"""
+        self.classifier.category_centroids()
+        self.model.encode.reset_mock()
+        category = Category.objects.create(name='Libros')
+        product = Product.objects.create(name='Unrelated title', reference='CC2', category=category)
+
+        [prediction] = self.classifier.classify_products([product])
+
+        self.assertEqual(prediction.category, 'Travel')
+        self.model.encode.assert_not_called()
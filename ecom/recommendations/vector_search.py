@@ -0,0 +1,194 @@
+"""
+Vector similarity search over Book.embedding.
+
+All nearest-neighbour lookups go through nearest_books(), which either asks
+Postgres (pgvector) or the in-process index in memory_index.py, depending on
+RECOMMENDATIONS_VECTOR_BACKEND. On the pgvector path the ANN index tuning
+knobs (hnsw.ef_search / ivfflat.probes) are applied consistently.
+pgvector reads those from the session, so they are scoped to the query with
+SET LOCAL inside a short transaction instead of leaking onto a pooled
+connection.
+
+Book.Meta.indexes declares the ANN index as HNSW (MODEL_INDEX_TYPE), and that
+is what migrations create. `manage.py rebuild_vector_index --type ivfflat`
+swaps in an IVFFlat index under the same name outside of migrations, so the
+database then disagrees with Django's migration state; rebuild it as HNSW
+before applying a migration that touches it.
+"""
+import copy
+import logging
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+from pgvector.django import CosineDistance
+
+from recommendations.memory_index import get_memory_index
+from recommendations.models import Book
+
+logger = logging.getLogger(__name__)
+
+# Name of the ANN index on recommendations_book.embedding (see migration 0006
+# and the rebuild_vector_index management command).
+ANN_INDEX_NAME = 'book_embedding_ann_idx'
+ANN_INDEX_TYPES = ('hnsw', 'ivfflat')
+# Type of the index as declared in Book.Meta.indexes (and created by migrations)
+MODEL_INDEX_TYPE = 'hnsw'
+# Largest hnsw.ef_search pgvector accepts; SET LOCAL errors above it
+HNSW_MAX_EF_SEARCH = 1000
+
+
+def vector_literal(values) -> str:
+    """
+    Format an embedding as a pgvector text literal ('[0.1,0.2,...]') for raw SQL.
+    """
+    if hasattr(values, 'tolist'):
+        values = values.tolist()
+    return '[' + ','.join(repr(float(v)) for v in values) + ']'
+
+
+def get_ann_search_params(top_k: int = 0) -> dict:
+    """
+    Return the per-query pgvector settings for the configured index type.
+
+    HNSW never returns more than ef_search rows, so it is raised to top_k
+    when a caller asks for a bigger result set, up to pgvector's limit of
+    HNSW_MAX_EF_SEARCH: a larger top_k gets at most that many rows.
+    """
+    index_type = getattr(settings, 'PGVECTOR_INDEX_TYPE', 'hnsw')
+    if index_type == 'ivfflat':
+        return {'ivfflat.probes': int(getattr(settings, 'PGVECTOR_IVFFLAT_PROBES', 10))}
+    ef_search = int(getattr(settings, 'PGVECTOR_HNSW_EF_SEARCH', 40))
+    return {'hnsw.ef_search': min(max(ef_search, top_k), HNSW_MAX_EF_SEARCH)}
+
+
+@contextmanager
+def ann_search(top_k: int = 0, params: dict | None = None):
+    """
+    Run the enclosed queries with the ANN tuning parameters applied.
+
+    Querysets must be evaluated inside the block, since SET LOCAL only lasts
+    until the surrounding transaction ends.
+    """
+    if params is None:
+        params = get_ann_search_params(top_k)
+
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                for name, value in params.items():
+                    cursor.execute(f"SET LOCAL {name} = {int(value)}")
+        yield
+
+
+def get_vector_backend() -> str:
+    """
+    Configured similarity backend: 'pgvector' (default) or 'memory'.
+    """
+    return getattr(settings, 'RECOMMENDATIONS_VECTOR_BACKEND', 'pgvector')
+
+
+def nearest_books(query_embedding, top_k: int = 5, exclude_ids=None, backend: str | None = None) -> list:
+    """
+    Return the top_k books closest to query_embedding by cosine distance.
+
+    Args:
+        query_embedding: 384-dim vector (list or numpy array)
+        top_k (int): Number of books to return
+        exclude_ids: Optional iterable/queryset of Book ids to leave out
+        backend (str): Override RECOMMENDATIONS_VECTOR_BACKEND ('pgvector' or 'memory')
+
+    Returns:
+        list: Book objects annotated with `distance`, closest first
+    """
+    if (backend or get_vector_backend()) == 'memory':
+        return _nearest_books_memory(query_embedding, top_k, exclude_ids)
+
+    queryset = Book.objects.filter(embedding__isnull=False)
+    if exclude_ids is not None:
+        queryset = queryset.exclude(id__in=exclude_ids)
+
+    queryset = (
+        queryset.annotate(distance=CosineDistance('embedding', query_embedding))
+        .order_by('distance')[:top_k]
+    )
+
+    with ann_search(top_k=top_k):
+        return list(queryset)
+
+
+def _nearest_books_memory(query_embedding, top_k, exclude_ids):
+    if exclude_ids is not None:
+        exclude_ids = set(exclude_ids)
+    ids, distances = get_memory_index().search(query_embedding, top_k=top_k, exclude_ids=exclude_ids)
+    return _books_in_order(ids, distances)
+
+
+def _books_in_order(ids, distances) -> list:
+    """
+    Fetch books by id in one query, keeping the ranking and attaching `distance`.
+    """
+    books_by_id = Book.objects.in_bulk(ids)
+    ordered = []
+    for book_id, distance in zip(ids, distances):
+        book = books_by_id.get(book_id)
+        if book is not None:
+            book.distance = distance
+            ordered.append(book)
+    return ordered
+
+
+def nearest_books_batch(query_embeddings, top_k: int = 5, backend: str | None = None) -> list:
+    """
+    Nearest-neighbour search for several query vectors at once.
+
+    On pgvector this is a single statement: the query vectors are a VALUES list
+    and each one drives an index-backed LATERAL top-k subquery. On the memory
+    backend it is one matrix-matrix product.
+
+    Returns:
+        list: One list of Book objects (annotated with `distance`) per query, in input order
+    """
+    if not len(query_embeddings):
+        return []
+
+    if (backend or get_vector_backend()) == 'memory':
+        batches = get_memory_index().search_batch(query_embeddings, top_k=top_k)
+        books_by_id = Book.objects.in_bulk({i for ids, _ in batches for i in ids})
+        results = []
+        for ids, distances in batches:
+            ranked = []
+            for book_id, distance in zip(ids, distances):
+                if book_id in books_by_id:
+                    # Copy so the same book can carry a different distance per query
+                    book = copy.copy(books_by_id[book_id])
+                    book.distance = distance
+                    ranked.append(book)
+            results.append(ranked)
+        return results
+
+    table = Book._meta.db_table
+    values = ', '.join(['(%s, %s::vector)'] * len(query_embeddings))
+    params = []
+    for i, embedding in enumerate(query_embeddings):
+        params.extend([i, vector_literal(embedding)])
+    params.append(top_k)
+
+    sql = f"""
+        SELECT b.*, q.idx AS query_index
+        FROM (VALUES {values}) AS q(idx, embedding)
+        CROSS JOIN LATERAL (
+            SELECT bk.*, bk.embedding <=> q.embedding AS distance
+            FROM {table} bk
+            WHERE bk.embedding IS NOT NULL
+            ORDER BY bk.embedding <=> q.embedding
+            LIMIT %s
+        ) AS b
+        ORDER BY q.idx, b.distance
+    """
+
+    results = [[] for _ in query_embeddings]
+    with ann_search(top_k=top_k):
+        for book in Book.objects.raw(sql, params):
+            results[book.query_index].append(book)
+    return results
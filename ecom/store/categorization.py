@@ -0,0 +1,188 @@
+"""
+Batched, parallel genre categorization of products.
+
+auto_categorize_products.py used to send one LLM prompt per product, one
+after the other, then get_or_create the category and save() the whole
+product, plus a query per product for `product.category.name`. A
+categorization run now goes page by page:
+
+1. every product in the page is classified at once by the embedding
+   nearest-centroid classifier (recommendations/category_classifier.py),
+   reusing the embedding of the Book with the same reference, so only
+   products without one are encoded; clear-cut results (margin >= CATEGORIZER_MIN_MARGIN) are taken as is,
+2. only the ambiguous products go to the LLM, CATEGORIZER_LLM_BATCH_SIZE
+   per prompt, with the prompts run on a pool of
+   OLLAMA_MAX_CONCURRENCY workers (llm.generate() bounds in-flight calls), and
+3. the page is written with one bulk_update; categories are resolved once
+   per run.
+
+Unparseable or unknown LLM answers fall back to the classifier's guess.
+"""
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.utils import timezone
+from langchain_core.prompts import ChatPromptTemplate
+
+from recommendations.category_classifier import CATEGORIES, classify_products, match_category
+from recommendations.llm import generate
+from store.models import Category, Product
+
+logger = logging.getLogger(__name__)
+
+# Catch-all categories products are moved out of (the old script's and the sync's)
+SOURCE_CATEGORIES = ("Books", "Libros")
+
+BATCH_PROMPT = ChatPromptTemplate.from_template(
+    """You are a helpful librarian.
+    Classify each of the following books into exactly ONE of these categories:
+    {category_list}
+
+    {books}
+
+    Answer with one line per book in the form "<number>: <category>", using only
+    category names from the list above. Do not add any other text."""
+)
+
+ANSWER_LINE = re.compile(r'^\s*(\d+)\s*[:.)\-]\s*(.+?)\s*$')
+
+
+def _format_books(products) -> str:
+    return "\n".join(
+        f"{i}. Title: {p.name}\n   Description: {(p.description or 'No description available')[:500]}"
+        for i, p in enumerate(products, start=1)
+    )
+
+
+def parse_batch_answer(answer: str, size: int) -> dict:
+    """
+    {1-based position: category} for the lines of an LLM answer naming a known category.
+    """
+    results = {}
+    for line in answer.splitlines():
+        match = ANSWER_LINE.match(line)
+        if not match:
+            continue
+        position = int(match.group(1))
+        category = match_category(match.group(2))
+        if 1 <= position <= size and category:
+            results[position] = category
+    return results
+
+
+def llm_categorize(products) -> dict:
+    """
+    Categorize a small batch of products with a single prompt.
+
+    Returns:
+        dict: {product id: category name} for the products the answer covered
+    """
+    model = settings.OLLAMA_CATEGORIZER_MODEL
+    answer = generate(model, BATCH_PROMPT, {
+        "category_list": ", ".join(CATEGORIES),
+        "books": _format_books(products),
+    }, temperature=0.0)
+    parsed = parse_batch_answer(answer, len(products))
+    return {products[position - 1].id: category for position, category in parsed.items()}
+
+
+class CategoryResolver:
+    """
+    Category name -> Category, created on first use, one query per name per run.
+    """
+
+    def __init__(self):
+        self._by_name = {}
+
+    def get(self, name: str) -> Category:
+        category = self._by_name.get(name)
+        if category is None:
+            category, _ = Category.objects.get_or_create(
+                name=name, defaults={'description': f'Books in the {name} genre'}
+            )
+            self._by_name[name] = category
+        return category
+
+
+def categorize_products(queryset, min_margin: float | None = None, llm_batch_size: int | None = None,
+                        workers: int | None = None, use_llm: bool = True, page_size: int = 500,
+                        progress=None) -> dict:
+    """
+    Assign a genre category to every product in queryset.
+
+    Args:
+        queryset: Products to categorize
+        min_margin (float): Classifier margin above which the LLM is skipped
+        llm_batch_size (int): Products per LLM prompt
+        workers (int): Concurrent LLM prompts
+        use_llm (bool): False to take the classifier's answer for everything
+        page_size (int): Products classified and written per page
+        progress (callable): Called with the running stats after every page
+
+    Returns:
+        dict: products, classifier, llm, llm_fallback, llm_calls, elapsed, per_second
+    """
+    if min_margin is None:
+        min_margin = getattr(settings, 'CATEGORIZER_MIN_MARGIN', 0.05)
+    llm_batch_size = llm_batch_size or getattr(settings, 'CATEGORIZER_LLM_BATCH_SIZE', 10)
+    workers = workers or getattr(settings, 'OLLAMA_MAX_CONCURRENCY', 4)
+
+    resolver = CategoryResolver()
+    stats = {'products': 0, 'classifier': 0, 'llm': 0, 'llm_fallback': 0, 'llm_calls': 0}
+    start = time.perf_counter()
+    last_id = 0
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='categorizer') as pool:
+        while True:
+            page = list(
+                queryset.filter(id__gt=last_id).order_by('id')
+                .only('id', 'name', 'description', 'reference', 'category_id')[:page_size]
+            )
+            if not page:
+                break
+            last_id = page[-1].id
+
+            predictions = classify_products(page)
+            assigned = {}
+            ambiguous = []
+            for product, prediction in zip(page, predictions):
+                assigned[product.id] = prediction.category
+                if use_llm and prediction.margin < min_margin:
+                    ambiguous.append(product)
+                else:
+                    stats['classifier'] += 1
+
+            futures = [
+                pool.submit(llm_categorize, ambiguous[i:i + llm_batch_size])
+                for i in range(0, len(ambiguous), llm_batch_size)
+            ]
+            stats['llm_calls'] += len(futures)
+            answered = {}
+            for future in as_completed(futures):
+                try:
+                    answered.update(future.result())
+                except Exception as e:
+                    logger.error(f"LLM categorization batch failed: {e}")
+            for product in ambiguous:
+                if product.id in answered:
+                    assigned[product.id] = answered[product.id]
+                    stats['llm'] += 1
+                else:
+                    stats['llm_fallback'] += 1
+
+            now = timezone.now()
+            for product in page:
+                product.category = resolver.get(assigned[product.id])
+                product.updated_at = now
+            Product.objects.bulk_update(page, ['category', 'updated_at'])
+
+            stats['products'] += len(page)
+            if progress:
+                progress(stats)
+
+    stats['elapsed'] = time.perf_counter() - start
+    stats['per_second'] = stats['products'] / stats['elapsed'] if stats['elapsed'] else 0.0
+    return stats
@@ -0,0 +1,208 @@
+"""
+Parallel product enrichment from Google Books and Azacán.
+
+The ProductAdmin actions used to fetch product by product inside the admin
+request: two or three blocking requests each, so a few hundred products
+timed the request out. An enrichment *operation* is now split into
+
+- fetch(key): the google_books.py fetchers (pooled, rate-limited client in
+  http_client.py, response cache in response_cache.py), run on a thread
+  pool of STORE_ENRICHMENT_WORKERS, and
+- apply(product, key, result): saves the result to the product, run on the
+  calling thread.
+
+run_enrichment() drives one operation over a list of product ids;
+start_job() records an EnrichmentJob and hands it to a Celery worker
+(store.tasks.enrich_products_task), which keeps its counters up to date so
+progress can be followed in the admin. `manage.py enrich_products` runs an
+operation in the foreground.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+
+from store import google_books
+from store.models import EnrichmentJob, Product
+
+logger = logging.getLogger(__name__)
+
+# Azacán detail fields copied onto the product as-is
+DETAIL_FIELDS = ('name', 'description', 'reference', 'isbn', 'publisher', 'year', 'edition_place', 'pages', 'measures')
+
+
+@dataclass(frozen=True)
+class Operation:
+    description: str
+    key_field: str
+    fetch: Callable[[str], Any]
+    apply: Callable[[Product, str, Any], None]
+
+
+def _with_image(fetch_details):
+    """
+    Wrap a details fetcher so the cover image is downloaded on the worker too.
+    """
+    def fetch(key):
+        details = fetch_details(key)
+        if details and details.get('image_url'):
+            details['image_bytes'] = google_books.download_image(details['image_url'])
+        return details
+    return fetch
+
+
+def _fetch(operation, key):
+    try:
+        return operation.fetch(key)
+    finally:
+        # The response cache opened a connection for this worker thread
+        connection.close()
+
+
+def _apply_dimensions(product, key, dims):
+    product.dimensions = dims
+    product.save(update_fields=['dimensions'])
+
+
+def _image_applier(suffix):
+    def apply(product, key, image_bytes):
+        product.image.save(f"{key}{suffix}.jpg", ContentFile(image_bytes), save=True)
+    return apply
+
+
+def _apply_details(product, key, details):
+    for field in DETAIL_FIELDS:
+        if field in details:
+            setattr(product, field, details[field])
+    if details.get('image_bytes'):
+        product.image.save(f"{key}_azacan.jpg", ContentFile(details['image_bytes']), save=False)
+    product.save()
+
+
+OPERATIONS = {
+    'google_dimensions': Operation(
+        'Fetch dimensions from Google Books API', 'isbn',
+        lambda key: google_books.fetch_dimensions_by_isbn(key), _apply_dimensions,
+    ),
+    'google_image': Operation(
+        'Fetch image from Google Books API', 'isbn',
+        lambda key: google_books.fetch_image_by_isbn(key), _image_applier(''),
+    ),
+    'azacan_image': Operation(
+        'Fetch image from Azacán Books', 'isbn',
+        lambda key: google_books.fetch_image_from_azacan(key), _image_applier('_azacan'),
+    ),
+    'azacan_details': Operation(
+        'Fetch all details from Azacán Books', 'isbn',
+        _with_image(lambda key: google_books.fetch_all_details_from_azacan(key)), _apply_details,
+    ),
+    'azacan_details_by_reference': Operation(
+        'Fetch details from Azacán by Reference', 'reference',
+        _with_image(lambda key: google_books.fetch_all_details_by_reference_from_azacan(key)), _apply_details,
+    ),
+    'azacan_image_by_reference': Operation(
+        'Fetch image from Azacán by Reference', 'reference',
+        lambda key: google_books.fetch_image_by_reference_from_azacan(key), _image_applier('_azacan'),
+    ),
+}
+
+COUNTERS = ('updated', 'missing_key', 'not_found', 'failed')
+
+
+def get_operation(name: str) -> Operation:
+    try:
+        return OPERATIONS[name]
+    except KeyError:
+        raise ValueError(f"Unknown enrichment operation '{name}' (known: {', '.join(OPERATIONS)})")
+
+
+def run_enrichment(operation_name: str, product_ids, workers: int | None = None, chunk_size: int = 200,
+                   job: EnrichmentJob | None = None, progress=None) -> dict:
+    """
+    Run an enrichment operation over products, fetching in parallel.
+
+    Args:
+        operation_name (str): Key of OPERATIONS
+        product_ids: Product ids to enrich
+        workers (int): Fetch threads (default: STORE_ENRICHMENT_WORKERS)
+        chunk_size (int): Products loaded and submitted at a time
+        job (EnrichmentJob): Job whose counters are saved after every chunk
+        progress (callable): Called with the counters after every chunk
+
+    Returns:
+        dict: updated, missing_key, not_found, failed
+    """
+    operation = get_operation(operation_name)
+    workers = workers or getattr(settings, 'STORE_ENRICHMENT_WORKERS', 8)
+    product_ids = list(product_ids)
+    counts = dict.fromkeys(COUNTERS, 0)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='enrichment') as pool:
+        for start in range(0, len(product_ids), chunk_size):
+            futures = {}
+            for product in Product.objects.filter(id__in=product_ids[start:start + chunk_size]).order_by('id'):
+                key = getattr(product, operation.key_field)
+                if not key:
+                    counts['missing_key'] += 1
+                    continue
+                futures[pool.submit(_fetch, operation, key)] = (product, key)
+
+            for future in as_completed(futures):
+                product, key = futures[future]
+                try:
+                    result = future.result()
+                    if result:
+                        operation.apply(product, key, result)
+                        counts['updated'] += 1
+                    else:
+                        counts['not_found'] += 1
+                except Exception as e:
+                    counts['failed'] += 1
+                    logger.error(f"Enrichment {operation_name} failed for product {product.id} ({key}): {e}")
+
+            if job is not None:
+                for name, value in counts.items():
+                    setattr(job, name, value)
+                job.save(update_fields=list(COUNTERS))
+            if progress:
+                progress(counts)
+
+    return counts
+
+
+def start_job(operation_name: str, product_ids) -> EnrichmentJob:
+    """
+    Record an EnrichmentJob and queue it on Celery once the transaction commits.
+    """
+    from store.tasks import enrich_products_task
+
+    get_operation(operation_name)
+    product_ids = list(product_ids)
+    job = EnrichmentJob.objects.create(operation=operation_name, total=len(product_ids))
+    transaction.on_commit(lambda: enrich_products_task.delay(job.id, product_ids))
+    return job
+
+
+def run_job(job_id: int, product_ids) -> EnrichmentJob:
+    """
+    Execute a queued EnrichmentJob (the Celery task body).
+    """
+    job = EnrichmentJob.objects.get(id=job_id)
+    job.status = EnrichmentJob.STATUS_RUNNING
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+    try:
+        run_enrichment(job.operation, product_ids, job=job)
+        job.status = EnrichmentJob.STATUS_DONE
+    except Exception as e:
+        logger.error(f"Enrichment job {job.id} failed: {e}")
+        job.status = EnrichmentJob.STATUS_FAILED
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+    return job
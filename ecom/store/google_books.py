@@ -1,9 +1,29 @@
 """
 Utility module for fetching book information from Google Books API.
+
+All requests go through the shared pooled, rate-limited client
+(store/http_client.py); search and detail responses are also kept in the
+persistent response cache (store/response_cache.py), so different fetchers
+and repeated runs for the same ISBN or reference share one request.
+store/enrichment.py runs these fetchers in parallel.
 """
 import requests
 
+from store.http_client import get_client
+from store.response_cache import cached_get
+
 GOOGLE_BOOKS_API_URL = "https://www.googleapis.com/books/v1/volumes"
+AZACAN_BASE_URL = "https://libros.azacan.org"
+
+
+def _google_no_items(response) -> bool:
+    return not response.json().get("items")
+
+
+def _azacan_no_results(response) -> bool:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(response.content, "html.parser")
+    return not (soup.select_one("a.product-list-title") or soup.select_one(".product-image-link img"))
 
 
 def fetch_dimensions_by_isbn(isbn: str) -> dict | None:
@@ -17,7 +37,7 @@ def fetch_dimensions_by_isbn(isbn: str) -> dict | None:
     # Step 1: Search by ISBN to get the volume ID
     params = {"q": f"isbn:{isbn}"}
     try:
-        response = requests.get(GOOGLE_BOOKS_API_URL, params=params, timeout=10)
+        response = cached_get(GOOGLE_BOOKS_API_URL, params=params, timeout=10, is_miss=_google_no_items)
         response.raise_for_status()
     except requests.RequestException:
         return None
@@ -33,7 +53,7 @@ def fetch_dimensions_by_isbn(isbn: str) -> dict | None:
 
     # Step 2: Fetch the volume directly by ID to get full details including dimensions
     try:
-        vol_response = requests.get(f"{GOOGLE_BOOKS_API_URL}/{volume_id}", timeout=10)
+        vol_response = cached_get(f"{GOOGLE_BOOKS_API_URL}/{volume_id}", timeout=10)
         vol_response.raise_for_status()
     except requests.RequestException:
         return None
@@ -59,7 +79,7 @@ def fetch_image_by_isbn(isbn: str) -> bytes | None:
     # Step 1: Search by ISBN to get the volume ID
     params = {"q": f"isbn:{isbn}"}
     try:
-        response = requests.get(GOOGLE_BOOKS_API_URL, params=params, timeout=10)
+        response = cached_get(GOOGLE_BOOKS_API_URL, params=params, timeout=10, is_miss=_google_no_items)
         response.raise_for_status()
     except requests.RequestException:
         return None
@@ -75,7 +95,7 @@ def fetch_image_by_isbn(isbn: str) -> bytes | None:
 
     # Step 2: Fetch the volume directly by ID to get imageLinks
     try:
-        vol_response = requests.get(f"{GOOGLE_BOOKS_API_URL}/{volume_id}", timeout=10)
+        vol_response = cached_get(f"{GOOGLE_BOOKS_API_URL}/{volume_id}", timeout=10)
         vol_response.raise_for_status()
     except requests.RequestException:
         return None
@@ -98,7 +118,20 @@ def fetch_image_by_isbn(isbn: str) -> bytes | None:
         return None
 
     try:
-        img_response = requests.get(image_url, timeout=15)
+        img_response = get_client().get(image_url, timeout=15)
+        img_response.raise_for_status()
+        return img_response.content
+    except requests.RequestException:
+        return None
+
+
+def download_image(image_url: str) -> bytes | None:
+    """
+    Download an image URL found by one of the scrapers.
+    Returns image bytes or None on failure.
+    """
+    try:
+        img_response = get_client().get(image_url, timeout=15)
         img_response.raise_for_status()
         return img_response.content
     except requests.RequestException:
@@ -110,13 +143,13 @@ def fetch_image_from_azacan(isbn: str) -> bytes | None:
     Scrape book cover image from libros.azacan.org by ISBN.
     Returns image bytes or None if not found.
     """
-    search_url = f"https://libros.azacan.org/es/libreria?modo=avanzado&titulo=&autor=&editorial=&isbn={isbn}"
+    search_url = f"{AZACAN_BASE_URL}/es/libreria?modo=avanzado&titulo=&autor=&editorial=&isbn={isbn}"
     headers = {
         "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
     }
     
     try:
-        response = requests.get(search_url, headers=headers, timeout=15)
+        response = cached_get(search_url, headers=headers, timeout=15, is_miss=_azacan_no_results)
         response.raise_for_status()
     except requests.RequestException:
         return None
@@ -136,10 +169,10 @@ def fetch_image_from_azacan(isbn: str) -> bytes | None:
         
         # If it's a relative URL, make it absolute
         if image_url.startswith("/"):
-            image_url = f"https://libros.azacan.org{image_url}"
+            image_url = f"{AZACAN_BASE_URL}{image_url}"
             
         # Download the image
-        img_response = requests.get(image_url, headers=headers, timeout=15)
+        img_response = get_client().get(image_url, headers=headers, timeout=15)
         img_response.raise_for_status()
         return img_response.content
         
@@ -152,13 +185,13 @@ def fetch_image_by_reference_from_azacan(reference: str) -> bytes | None:
     Scrape book cover image from libros.azacan.org by Reference.
     Returns image bytes or None if not found.
     """
-    search_url = f"https://libros.azacan.org/es/libreria?search={reference}"
+    search_url = f"{AZACAN_BASE_URL}/es/libreria?search={reference}"
     headers = {
         "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
     }
     
     try:
-        response = requests.get(search_url, headers=headers, timeout=15)
+        response = cached_get(search_url, headers=headers, timeout=15, is_miss=_azacan_no_results)
         response.raise_for_status()
     except requests.RequestException:
         return None
@@ -176,9 +209,9 @@ def fetch_image_by_reference_from_azacan(reference: str) -> bytes | None:
         image_url = img_tag["src"]
         
         if image_url.startswith("/"):
-            image_url = f"https://libros.azacan.org{image_url}"
+            image_url = f"{AZACAN_BASE_URL}{image_url}"
             
-        img_response = requests.get(image_url, headers=headers, timeout=15)
+        img_response = get_client().get(image_url, headers=headers, timeout=15)
         img_response.raise_for_status()
         return img_response.content
         
@@ -195,7 +228,7 @@ def _scrape_azacan_detail_page(detail_url: str) -> dict | None:
     }
     try:
         from bs4 import BeautifulSoup
-        response = requests.get(detail_url, headers=headers, timeout=15)
+        response = cached_get(detail_url, headers=headers, timeout=15)
         response.raise_for_status()
         soup = BeautifulSoup(response.content, "html.parser")
 
@@ -212,7 +245,7 @@ def _scrape_azacan_detail_page(detail_url: str) -> dict | None:
         if img_tag and img_tag.get("src"):
             image_url = img_tag["src"]
             if image_url.startswith("/"):
-                image_url = f"https://libros.azacan.org{image_url}"
+                image_url = f"{AZACAN_BASE_URL}{image_url}"
             details['image_url'] = image_url
 
         # 3. Scrape Description
@@ -259,13 +292,13 @@ def fetch_all_details_from_azacan(isbn: str) -> dict | None:
     """
     Search by ISBN on Azacán and scrape all details from the detail page.
     """
-    search_url = f"https://libros.azacan.org/es/libreria?modo=avanzado&titulo=&autor=&editorial=&isbn={isbn}"
+    search_url = f"{AZACAN_BASE_URL}/es/libreria?modo=avanzado&titulo=&autor=&editorial=&isbn={isbn}"
     headers = {
         "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
     }
 
     try:
-        response = requests.get(search_url, headers=headers, timeout=15)
+        response = cached_get(search_url, headers=headers, timeout=15, is_miss=_azacan_no_results)
         response.raise_for_status()
         from bs4 import BeautifulSoup
         soup = BeautifulSoup(response.content, "html.parser")
@@ -276,7 +309,7 @@ def fetch_all_details_from_azacan(isbn: str) -> dict | None:
 
         detail_url = detail_link["href"]
         if detail_url.startswith("/"):
-            detail_url = f"https://libros.azacan.org{detail_url}"
+            detail_url = f"{AZACAN_BASE_URL}{detail_url}"
 
         return _scrape_azacan_detail_page(detail_url)
     except Exception:
@@ -287,13 +320,13 @@ def fetch_all_details_by_reference_from_azacan(reference: str) -> dict | None:
     """
     Search by Reference on Azacán and scrape all details from the detail page.
     """
-    search_url = f"https://libros.azacan.org/es/libreria?search={reference}"
+    search_url = f"{AZACAN_BASE_URL}/es/libreria?search={reference}"
     headers = {
         "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
     }
 
     try:
-        response = requests.get(search_url, headers=headers, timeout=15)
+        response = cached_get(search_url, headers=headers, timeout=15, is_miss=_azacan_no_results)
         response.raise_for_status()
         from bs4 import BeautifulSoup
         soup = BeautifulSoup(response.content, "html.parser")
@@ -306,7 +339,7 @@ def fetch_all_details_by_reference_from_azacan(reference: str) -> dict | None:
 
         detail_url = detail_link["href"]
         if detail_url.startswith("/"):
-            detail_url = f"https://libros.azacan.org{detail_url}"
+            detail_url = f"{AZACAN_BASE_URL}{detail_url}"
 
         return _scrape_azacan_detail_page(detail_url)
     except Exception:
@@ -323,7 +356,7 @@ def get_book_description(query, max_results=1):
     Returns:
         str or None: The book description if found, otherwise None
     """
-    base_url = "https://www.googleapis.com/books/v1/volumes"
+    base_url = GOOGLE_BOOKS_API_URL
     
     # Build the query parameter
     if query.replace('-', '').isdigit() and len(query.replace('-', '')) in (10, 13):
@@ -334,7 +367,7 @@ def get_book_description(query, max_results=1):
     params["maxResults"] = max_results
     
     try:
-        response = requests.get(base_url, params=params, timeout=10)
+        response = cached_get(base_url, params=params, timeout=10, is_miss=_google_no_items)
         response.raise_for_status()  # Raise error for bad status codes
         data = response.json()
         
@@ -0,0 +1,148 @@
+"""
+Shared HTTP client for the Google Books / Azacán scrapers.
+
+Every fetch used to be a bare `requests.get`, i.e. a new TCP + TLS handshake
+per request, no retries and no limit on how hard a loop could hit a host.
+HttpClient instead:
+
+- keeps one requests.Session with a connection pool sized for the
+  enrichment workers (store/enrichment.py), so repeated requests to the same
+  host reuse connections,
+- spaces requests to each host at most STORE_ENRICHMENT_RATE_PER_HOST per
+  second across all threads of the process, and
+- retries connection errors, timeouts and 429/5xx responses with exponential
+  backoff (honouring a numeric Retry-After).
+
+get_client() returns the process-wide instance built from settings.
+"""
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+
+# Responses worth retrying: throttled or a transient server error
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class HostRateLimiter:
+    """
+    Hands out request slots per host, at most `rate` per second.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host: str):
+        """
+        Block until the caller may send a request to host.
+        """
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class HttpClient:
+    """
+    Pooled, rate-limited GET with retries.
+    """
+
+    def __init__(self, rate_per_host: float = 4.0, max_retries: int = 3, backoff: float = 0.5,
+                 timeout: float = 15.0, pool_size: int = 16):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.limiter = HostRateLimiter(rate_per_host)
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _retry_delay(self, attempt: int, response=None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        # Jitter keeps parallel workers from retrying in lockstep
+        return self.backoff * (2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        GET url, retrying transient failures.
+
+        Returns the last response once it is final or retries are exhausted
+        (callers still raise_for_status()); re-raises the last connection error
+        or timeout.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlsplit(url).netloc
+        for attempt in range(self.max_retries + 1):
+            self.limiter.wait(host)
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._retry_delay(attempt)
+                logger.warning(f"GET {url} failed ({e}); retrying in {delay:.1f}s")
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+                delay = self._retry_delay(attempt, response)
+                logger.warning(f"GET {url} returned {response.status_code}; retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> HttpClient:
+    """
+    The process-wide HttpClient (created on first use from settings).
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                workers = getattr(settings, "STORE_ENRICHMENT_WORKERS", 8)
+                _client = HttpClient(
+                    rate_per_host=getattr(settings, "STORE_ENRICHMENT_RATE_PER_HOST", 4.0),
+                    max_retries=getattr(settings, "STORE_ENRICHMENT_MAX_RETRIES", 3),
+                    backoff=getattr(settings, "STORE_ENRICHMENT_BACKOFF_SECONDS", 0.5),
+                    timeout=getattr(settings, "STORE_ENRICHMENT_TIMEOUT", 15.0),
+                    pool_size=max(workers, 1) * 2,
+                )
+    return _client
+
+
+def reset_client():
+    """
+    Drop the process-wide client (tests, settings changes).
+    """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
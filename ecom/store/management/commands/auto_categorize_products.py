@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from store.categorization import SOURCE_CATEGORIES, categorize_products
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Move products out of the catch-all category into genres (embedding classifier + batched LLM).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from-category',
+            nargs='+',
+            default=list(SOURCE_CATEGORIES),
+            help=f'Categories to categorize products from (default: {" ".join(SOURCE_CATEGORIES)})'
+        )
+        parser.add_argument('--min-margin', type=float, default=None, help='Classifier margin above which the LLM is skipped (default: CATEGORIZER_MIN_MARGIN)')
+        parser.add_argument('--llm-batch-size', type=int, default=None, help='Products per LLM prompt (default: CATEGORIZER_LLM_BATCH_SIZE)')
+        parser.add_argument('--workers', type=int, default=None, help='Concurrent LLM prompts (default: OLLAMA_MAX_CONCURRENCY)')
+        parser.add_argument('--no-llm', action='store_true', help='Use the embedding classifier for every product')
+
+    def handle(self, *args, **options):
+        total_products = Product.objects.count()
+        products = Product.objects.filter(category__name__in=options['from_category'])
+        remaining = products.count()
+
+        self.stdout.write("-" * 50)
+        self.stdout.write(f"Total Products: {total_products}")
+        self.stdout.write(f"Already Categorized: {total_products - remaining} (Skipping)")
+        self.stdout.write(f"Remaining to Process: {remaining} (In {', '.join(options['from_category'])})")
+        self.stdout.write("-" * 50)
+        if not remaining:
+            self.stdout.write(self.style.SUCCESS("All products have been categorized!"))
+            return
+
+        def report(stats):
+            self.stdout.write(
+                f"[{stats['products']}/{remaining}] classifier {stats['classifier']}, "
+                f"LLM {stats['llm']} ({stats['llm_calls']} calls)"
+            )
+
+        stats = categorize_products(
+            products,
+            min_margin=options['min_margin'],
+            llm_batch_size=options['llm_batch_size'],
+            workers=options['workers'],
+            use_llm=not options['no_llm'],
+            progress=report,
+        )
+
+        self.stdout.write("-" * 50)
+        self.stdout.write(self.style.SUCCESS("Job Complete!"))
+        self.stdout.write(f"Processed: {stats['products']}/{remaining}")
+        self.stdout.write(f"By classifier: {stats['classifier']}")
+        self.stdout.write(f"By LLM: {stats['llm']} in {stats['llm_calls']} calls "
+                          f"({stats['llm_fallback']} fell back to the classifier)")
+        self.stdout.write(f"Time Taken: {stats['elapsed']:.2f} seconds ({stats['per_second']:.1f} products/sec)")
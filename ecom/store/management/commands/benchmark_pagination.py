@@ -0,0 +1,145 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from recommendations.benchmarking import latency_summary
+
+BENCH_TABLE = 'bench_products'
+PER_PAGE = 8
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark storefront pagination on a synthetic product table: Paginator-style '
+        'COUNT(*) + OFFSET (random and stable order) against keyset pagination '
+        '(store/pagination.py). Reports p50/p99 latency per page depth.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            nargs='+',
+            type=int,
+            default=[100_000, 1_000_000],
+            help='Synthetic catalog sizes to benchmark (default: 100000 1000000)'
+        )
+        parser.add_argument(
+            '--pages',
+            nargs='+',
+            type=int,
+            default=[1, 100, 10_000],
+            help='Page numbers to fetch (default: 1 100 10000)'
+        )
+        parser.add_argument('--categories', type=int, default=20, help='Synthetic categories (default: 20)')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed fetches per measurement (default: 20)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The pagination benchmark requires PostgreSQL.')
+
+        self.stdout.write(self.style.SUCCESS('=' * 72))
+        self.stdout.write(self.style.SUCCESS(
+            f"{'rows':>9} {'listing':>9} {'strategy':>16} {'page':>7} {'p50 ms':>9} {'p99 ms':>9}"
+        ))
+        self.stdout.write(self.style.SUCCESS('=' * 72))
+
+        try:
+            for size in options['sizes']:
+                self.load_table(size, options['categories'])
+                for page in options['pages']:
+                    offset = (page - 1) * PER_PAGE
+                    if offset >= size // options['categories']:
+                        continue
+                    for listing, strategy, sql, params in self.cases(offset):
+                        summary = latency_summary(self.time_query(sql, params, options['repeat']))
+                        self.write_row(size, listing, strategy, page, summary)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE IF EXISTS {BENCH_TABLE}')
+
+    def load_table(self, size, categories):
+        self.stdout.write(f'Loading {size} synthetic products...')
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {BENCH_TABLE}')
+            cursor.execute(
+                f"CREATE UNLOGGED TABLE {BENCH_TABLE} AS "
+                f"SELECT g AS id, 'Product ' || g AS name, (g % {categories}) + 1 AS category_id, "
+                f"random() AS shuffle_rank, (random() * 50)::numeric(10, 2) AS price "
+                f"FROM generate_series(1, {size}) AS g"
+            )
+            cursor.execute(f'ALTER TABLE {BENCH_TABLE} ADD PRIMARY KEY (id)')
+            # Same indexes as store.Product
+            cursor.execute(f'CREATE INDEX ON {BENCH_TABLE} (shuffle_rank, id)')
+            cursor.execute(f'CREATE INDEX ON {BENCH_TABLE} (category_id, id DESC)')
+            cursor.execute(f'ANALYZE {BENCH_TABLE}')
+
+    def boundary(self, order_by, where, offset):
+        """
+        Values of the last row before `offset`, i.e. what a cursor would carry.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT shuffle_rank, id FROM {BENCH_TABLE} {where} ORDER BY {order_by} LIMIT 1 OFFSET %s',
+                [offset - 1],
+            )
+            return cursor.fetchone()
+
+    def cases(self, offset):
+        """
+        (listing, strategy, sql, params) for one page depth. Offset queries
+        include the COUNT(*) Paginator runs for every page.
+        """
+        count_all = f'SELECT count(*) FROM {BENCH_TABLE};'
+        count_category = f'SELECT count(*) FROM {BENCH_TABLE} WHERE category_id = 1;'
+        columns = 'id, name, price'
+        limit = PER_PAGE + 1
+        yield ('home', 'count+random', count_all + (
+            f'SELECT {columns} FROM {BENCH_TABLE} ORDER BY random() LIMIT {PER_PAGE} OFFSET {offset}'
+        ), None)
+
+        if offset:
+            rank, last_id = self.boundary('shuffle_rank, id', '', offset)
+            keyset = (
+                f'SELECT {columns} FROM {BENCH_TABLE} '
+                f'WHERE shuffle_rank >= %s AND (shuffle_rank > %s OR (shuffle_rank = %s AND id > %s)) '
+                f'ORDER BY shuffle_rank, id LIMIT {limit}'
+            )
+            params = [rank, rank, rank, last_id]
+        else:
+            keyset = f'SELECT {columns} FROM {BENCH_TABLE} ORDER BY shuffle_rank, id LIMIT {limit}'
+            params = None
+        yield ('home', 'keyset', keyset, params)
+
+        yield ('category', 'count+offset', count_category + (
+            f'SELECT {columns} FROM {BENCH_TABLE} WHERE category_id = 1 '
+            f'ORDER BY id DESC LIMIT {PER_PAGE} OFFSET {offset}'
+        ), None)
+        if offset:
+            _, last_id = self.boundary('id DESC', 'WHERE category_id = 1', offset)
+            keyset = (
+                f'SELECT {columns} FROM {BENCH_TABLE} WHERE category_id = 1 AND id <= %s AND id < %s '
+                f'ORDER BY id DESC LIMIT {limit}'
+            )
+            params = [last_id, last_id]
+        else:
+            keyset = f'SELECT {columns} FROM {BENCH_TABLE} WHERE category_id = 1 ORDER BY id DESC LIMIT {limit}'
+            params = None
+        yield ('category', 'keyset', keyset, params)
+
+    def time_query(self, sql, params, repeat):
+        samples = []
+        with connection.cursor() as cursor:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for statement in sql.split(';'):
+                    if statement.strip():
+                        cursor.execute(statement, params if '%s' in statement else None)
+                        cursor.fetchall()
+                samples.append((time.perf_counter() - start) * 1000)
+        return samples
+
+    def write_row(self, size, listing, strategy, page, summary):
+        self.stdout.write(
+            f"{size:>9} {listing:>9} {strategy:>16} {page:>7} {summary['p50']:>9.2f} {summary['p99']:>9.2f}"
+        )
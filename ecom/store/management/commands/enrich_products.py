@@ -0,0 +1,71 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from store.enrichment import OPERATIONS, run_enrichment, start_job
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Enrich products from Google Books / Azacán in parallel (see store/enrichment.py).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('operation', choices=sorted(OPERATIONS), help='Enrichment operation to run')
+        parser.add_argument(
+            '--product-ids',
+            nargs='+',
+            type=int,
+            help='Specific product IDs to enrich (space-separated; default: every product)'
+        )
+        parser.add_argument(
+            '--missing-only',
+            action='store_true',
+            help='Only products without an image (image operations) or dimensions (google_dimensions)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Parallel fetches (default: STORE_ENRICHMENT_WORKERS)'
+        )
+        parser.add_argument(
+            '--background',
+            action='store_true',
+            help='Queue an EnrichmentJob on Celery instead of running here'
+        )
+
+    def handle(self, *args, **options):
+        operation = options['operation']
+        products = Product.objects.all()
+        if options.get('product_ids'):
+            products = products.filter(id__in=options['product_ids'])
+        if options['missing_only']:
+            if operation == 'google_dimensions':
+                products = products.filter(dimensions__isnull=True)
+            elif 'image' in operation:
+                products = products.filter(Q(image='') | Q(image__isnull=True))
+            else:
+                raise CommandError(f'--missing-only does not apply to {operation}')
+        product_ids = list(products.order_by('id').values_list('id', flat=True))
+
+        if options['background']:
+            job = start_job(operation, product_ids)
+            self.stdout.write(self.style.SUCCESS(f'Queued enrichment job #{job.id} for {len(product_ids)} products.'))
+            return
+
+        self.stdout.write(f'{OPERATIONS[operation].description} for {len(product_ids)} products...')
+        start = time.perf_counter()
+
+        def report(counts):
+            done = sum(counts.values())
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"Progress: {done}/{len(product_ids)} ({done / elapsed if elapsed else 0:.1f} products/sec, "
+                f"{counts['updated']} updated, {counts['failed']} failed)"
+            )
+
+        counts = run_enrichment(operation, product_ids, workers=options['workers'], progress=report)
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {time.perf_counter() - start:.1f}s: {counts['updated']} updated, "
+            f"{counts['not_found']} not found, {counts['missing_key']} without "
+            f"{OPERATIONS[operation].key_field}, {counts['failed']} failed."
+        ))
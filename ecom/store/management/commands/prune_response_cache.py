@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from store.response_cache import prune
+
+
+class Command(BaseCommand):
+    help = 'Delete long-expired external metadata responses (ExternalResponse), including cached misses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days',
+            type=float,
+            default=None,
+            help='Delete entries expired for more than this many days (default: STORE_EXTERNAL_CACHE_TTL)'
+        )
+
+    def handle(self, *args, **options):
+        days = options['older_than_days']
+        deleted = prune(timedelta(days=days) if days is not None else None)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired cache entries."))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Draw a new random home page position (shuffle_rank) for every product'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        table = connection.ops.quote_name(Product._meta.db_table)
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'UPDATE {table} SET shuffle_rank = random()')
+            else:
+                cursor.execute(f'UPDATE {table} SET shuffle_rank = (random() / 18446744073709551616.0) + 0.5')
+            count = cursor.rowcount
+        self.stdout.write(self.style.SUCCESS(
+            f"Reshuffled {count} products in {time.perf_counter() - start:.2f}s."
+        ))
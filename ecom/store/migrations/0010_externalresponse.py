@@ -0,0 +1,29 @@
+# Generated by Django 5.2.10 on 2026-10-17 03:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_enrichmentjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExternalResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='sha256 of the full request URL', max_length=64, unique=True)),
+                ('url', models.TextField()),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('content', models.BinaryField()),
+                ('content_type', models.CharField(blank=True, default='', max_length=100)),
+                ('etag', models.CharField(blank=True, default='', max_length=255)),
+                ('last_modified', models.CharField(blank=True, default='', max_length=64)),
+                ('is_miss', models.BooleanField(default=False, help_text='Not found / no results; kept for the shorter negative TTL')),
+                ('fetched_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
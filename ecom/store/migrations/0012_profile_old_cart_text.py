@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-17 03:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_syncstate'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='old_cart',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
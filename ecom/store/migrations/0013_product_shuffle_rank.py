@@ -0,0 +1,41 @@
+# Generated by Django 5.2.10 on 2026-10-17 03:57
+
+import store.models
+from django.db import migrations, models
+
+
+def randomize_existing(apps, schema_editor):
+    """
+    AddField gives every existing row the same default: draw one per row.
+    """
+    Product = apps.get_model('store', 'Product')
+    table = schema_editor.quote_name(Product._meta.db_table)
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'UPDATE {table} SET shuffle_rank = random()')
+    else:
+        # SQLite: random() is a signed 64-bit integer
+        schema_editor.execute(f'UPDATE {table} SET shuffle_rank = (random() / 18446744073709551616.0) + 0.5')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_profile_old_cart_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='shuffle_rank',
+            field=models.FloatField(default=store.models.random_rank),
+        ),
+        migrations.RunPython(randomize_existing, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['shuffle_rank', 'id'], name='product_shuffle_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', '-id'], name='product_category_id_idx'),
+        ),
+    ]
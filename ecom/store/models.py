@@ -1,5 +1,6 @@
 from django.db import models
 import datetime
+import random
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 
@@ -17,7 +18,8 @@ class Profile(models.Model):
     state = models.CharField(max_length=100, blank=True, null=True)
     zip_code = models.CharField(max_length=20, blank=True, null=True)
     country = models.CharField(max_length=100, blank=True, null=True)
-    old_cart = models.CharField(max_length=255, blank=True, null=True)
+    # JSON snapshot of the user's cart (cart.CartItem), refreshed in the background
+    old_cart = models.TextField(blank=True, null=True)
 
     def __str__(self):
         return f'{self.user.first_name} {self.user.last_name}'
@@ -81,6 +83,10 @@ class Customer(models.Model):
     def __str__(self):
         return f'{self.first_name} {self.last_name}'
 
+def random_rank():
+    return random.random()
+
+
 class Product(models.Model):
     name = models.CharField(max_length=255, db_index=True)  # Index for search queries
     price = models.DecimalField(default=0, decimal_places=2, max_digits=10)
@@ -102,6 +108,15 @@ class Product(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Random position in the home page shuffle (store/pagination.py)
+    shuffle_rank = models.FloatField(default=random_rank)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination: home page shuffle and category listings
+            models.Index(fields=['shuffle_rank', 'id'], name='product_shuffle_idx'),
+            models.Index(fields=['category', '-id'], name='product_category_id_idx'),
+        ]
 
     def print_dimensions(self):
         dims = self.dimensions or {}
@@ -122,3 +137,74 @@ class Order(models.Model):
     def __str__(self):
         return f'Order #{self.id} by {self.customer.first_name} {self.customer.last_name}'
 
+
+
+class EnrichmentJob(models.Model):
+    """
+    A background run of one enrichment operation (store/enrichment.py) over a
+    set of products, with its progress.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    operation = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    total = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    missing_key = models.PositiveIntegerField(default=0, help_text="Products without the ISBN/reference the operation looks up")
+    not_found = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    @property
+    def processed(self):
+        return self.updated + self.missing_key + self.not_found + self.failed
+
+    def __str__(self):
+        return f'Enrichment job #{self.id} ({self.operation}, {self.status})'
+
+    class Meta:
+        ordering = ['-created_at']
+
+
+class ExternalResponse(models.Model):
+    """
+    A cached response from an external book-metadata source (store/response_cache.py).
+    """
+    key = models.CharField(max_length=64, unique=True, help_text="sha256 of the full request URL")
+    url = models.TextField()
+    status_code = models.PositiveSmallIntegerField()
+    content = models.BinaryField()
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    etag = models.CharField(max_length=255, blank=True, default='')
+    last_modified = models.CharField(max_length=64, blank=True, default='')
+    is_miss = models.BooleanField(default=False, help_text="Not found / no results; kept for the shorter negative TTL")
+    fetched_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f'{self.status_code} {self.url}'
+
+
+class SyncState(models.Model):
+    """
+    Watermark of an incremental sync (store/sync.py): source rows changed at
+    or after `watermark` still need syncing.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    watermark = models.DateTimeField(blank=True, null=True)
+    last_run_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f'{self.name} (watermark {self.watermark})'
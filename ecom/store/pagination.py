@@ -0,0 +1,161 @@
+"""
+Keyset (cursor) pagination for storefront listings.
+
+The home, category and search pages used Django's Paginator: a COUNT(*) on
+every page view, then OFFSET n, which reads and throws away every row
+before the page (and on the home page, ORDER BY RANDOM() sorted the whole
+table first). CursorPaginator instead:
+
+- orders by a fixed list of fields ending in a unique one, so the order is
+  stable while rows are added,
+- remembers the boundary row's values in an opaque cursor, and
+- fetches the next (or previous) page with `WHERE (ordering) > (cursor)
+  ORDER BY ... LIMIT per_page + 1`, an index range scan however deep the
+  page, with the extra row telling whether there is another page. No COUNT.
+
+The home page's shuffle comes from Product.shuffle_rank, a random number
+stored per product (reshuffled with `manage.py shuffle_products`), instead of
+ORDER BY RANDOM().
+
+Ordering fields must be non-null columns of the model.
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class CursorPage:
+    """
+    One page of a CursorPaginator, usable like a Paginator Page in templates.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    def __init__(self, queryset, per_page: int, ordering=('id',)):
+        """
+        Args:
+            queryset: Rows to paginate (its own ordering is replaced)
+            per_page (int): Rows per page
+            ordering: Field names, '-' prefixed for descending; 'id' is
+                appended unless the last field is already the primary key
+        """
+        ordering = list(ordering)
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering.append('id')
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = ordering
+        opts = queryset.model._meta
+        # (lookup name, model field, descending)
+        self.fields = [
+            (name.lstrip('-'), opts.get_field(name.lstrip('-')), name.startswith('-'))
+            for name in ordering
+        ]
+
+    def encode_cursor(self, obj, direction: str) -> str:
+        values = [getattr(obj, field.attname) for _, field, _ in self.fields]
+        raw = json.dumps([direction, values], cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, cursor: str):
+        """
+        (direction, values), or None for a missing or malformed cursor.
+
+        Values are converted with each field's to_python(), so a tampered
+        cursor falls back to the first page instead of failing in the query.
+        """
+        if not cursor:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, values = json.loads(raw)
+        except (ValueError, TypeError, binascii.Error):
+            return None
+        if direction not in (NEXT, PREVIOUS) or not isinstance(values, list) or len(values) != len(self.fields):
+            return None
+        try:
+            values = [field.to_python(value) for (_, field, _), value in zip(self.fields, values)]
+        except (ValidationError, TypeError):
+            return None
+        if None in values:
+            # Ordering fields are non-null
+            return None
+        return direction, values
+
+    def _after(self, values, backwards: bool) -> Q:
+        """
+        Rows strictly after `values` in the ordering (before it if backwards).
+        """
+        def op(descending):
+            return 'lt' if descending != backwards else 'gt'
+
+        condition = Q()
+        equal = Q()
+        for (name, _, descending), value in zip(self.fields, values):
+            condition |= equal & Q(**{f'{name}__{op(descending)}': value})
+            equal &= Q(**{name: value})
+        # Redundant bound on the leading column, so the planner can range-scan its index
+        name, _, descending = self.fields[0]
+        return Q(**{f"{name}__{op(descending)[0]}te": values[0]}) & condition
+
+    def page(self, cursor: str | None = None) -> CursorPage:
+        """
+        The page a cursor points to; the first page if it is missing or invalid.
+        """
+        decoded = self.decode_cursor(cursor)
+        backwards = decoded is not None and decoded[0] == PREVIOUS
+        queryset = self.queryset
+        if decoded is not None:
+            queryset = queryset.filter(self._after(decoded[1], backwards))
+        if backwards:
+            ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+        else:
+            ordering = self.ordering
+
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+        if not rows:
+            return CursorPage([])
+
+        # Going forwards there is a previous page iff we came from a cursor;
+        # going backwards there is a next page (the one we came from)
+        has_next = has_more if not backwards else True
+        has_previous = decoded is not None if not backwards else has_more
+        return CursorPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1], NEXT) if has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], PREVIOUS) if has_previous else None,
+        )
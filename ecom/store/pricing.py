@@ -0,0 +1,133 @@
+"""
+Product prices and cached cart totals.
+
+Cart totals used to be recomputed (`sale_price if is_sale else price` per
+product, from fresh rows) on every page view, three times in a row across
+checkout, billing and order placement. Prices now go through this module:
+
+- unit_price() is the one place the effective price rule lives,
+- get_prices() looks up the effective prices of many products at once,
+  from the cache where possible and with one query for the rest, and
+- cart_total() caches a total keyed by the cart's contents.
+
+Every cache key includes the catalog *price version*, a counter bumped when a
+Product is saved or deleted (store/signals.py) or bulk-updated by the Book
+sync, so a price change is never served stale: old entries are simply no
+longer read and expire after CART_PRICING_CACHE_TTL.
+"""
+import hashlib
+import logging
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+
+from store.models import Product
+
+logger = logging.getLogger(__name__)
+
+PRICE_VERSION_KEY = 'catalog_price_version'
+PRICE_PREFIX = 'product_price'
+CART_TOTAL_PREFIX = 'cart_total'
+
+# Product fields the effective price depends on
+PRICE_FIELDS = ('price', 'is_sale', 'sale_price')
+
+
+def _ttl() -> int:
+    return getattr(settings, 'CART_PRICING_CACHE_TTL', 60 * 60)
+
+
+def price_version() -> int:
+    """
+    Current catalog price version.
+    """
+    version = cache.get(PRICE_VERSION_KEY)
+    if version is None:
+        # A fresh start value (not 1) so entries of an evicted version are never reused
+        cache.add(PRICE_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(PRICE_VERSION_KEY)
+    return version
+
+
+def bump_price_version():
+    """
+    Invalidate every cached price and cart total.
+    """
+    try:
+        cache.incr(PRICE_VERSION_KEY)
+    except ValueError:
+        cache.set(PRICE_VERSION_KEY, time.time_ns(), None)
+
+
+def unit_price(product) -> Decimal:
+    """
+    Price a product sells at: its sale price while on sale.
+    """
+    return product.sale_price if product.is_sale else product.price
+
+
+def get_prices(product_ids) -> dict:
+    """
+    Effective prices of many products: {product id: Decimal}.
+
+    Unknown ids are left out.
+    """
+    product_ids = {int(product_id) for product_id in product_ids}
+    if not product_ids:
+        return {}
+    version = price_version()
+    keys = {f'{PRICE_PREFIX}:{version}:{product_id}': product_id for product_id in product_ids}
+    prices = {keys[key]: Decimal(value) for key, value in cache.get_many(keys).items()}
+
+    missing = product_ids - prices.keys()
+    if missing:
+        loaded = {
+            product_id: price if is_sale else regular
+            for product_id, regular, is_sale, price in
+            Product.objects.filter(id__in=missing).values_list('id', *PRICE_FIELDS)
+        }
+        cache.set_many({f'{PRICE_PREFIX}:{version}:{product_id}': str(price) for product_id, price in loaded.items()}, _ttl())
+        prices.update(loaded)
+    return prices
+
+
+def _quantity(value) -> int:
+    return value['quantity'] if isinstance(value, dict) else int(value)
+
+
+def _cart_total_key(quantities: dict, version: int) -> str:
+    contents = ','.join(f'{int(product_id)}x{_quantity(value)}' for product_id, value in
+                        sorted(quantities.items(), key=lambda item: int(item[0])))
+    return f"{CART_TOTAL_PREFIX}:{version}:{hashlib.sha1(contents.encode('utf-8')).hexdigest()}"
+
+
+def remember_cart_total(quantities: dict, total: Decimal, version: int):
+    """
+    Cache a total computed elsewhere, at the price version read before its prices were.
+    """
+    cache.set(_cart_total_key(quantities, version), str(total), _ttl())
+
+
+def cart_total(quantities: dict) -> Decimal:
+    """
+    Total of a cart, {product id: quantity or {'quantity': n}}, cached per
+    cart contents and price version.
+    """
+    if not quantities:
+        return Decimal('0')
+    version = price_version()
+    key = _cart_total_key(quantities, version)
+    cached = cache.get(key)
+    if cached is not None:
+        return Decimal(cached)
+
+    prices = get_prices(quantities)
+    total = sum(
+        (prices[int(product_id)] * _quantity(value) for product_id, value in quantities.items()
+         if int(product_id) in prices),
+        Decimal('0'),
+    )
+    cache.set(key, str(total), _ttl())
+    return total
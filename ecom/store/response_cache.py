@@ -0,0 +1,177 @@
+"""
+Persistent cache of external book-metadata responses.
+
+Every enrichment fetcher starts with the same search request for an ISBN or
+reference, so running "fetch image" and then "fetch details" (or re-running
+an import) asked Azacán and Google Books the same questions again. cached_get()
+keeps responses in ExternalResponse, keyed by the full request URL:
+
+- fresh entries (younger than STORE_EXTERNAL_CACHE_TTL) are served without a
+  request,
+- expired entries are revalidated with If-None-Match / If-Modified-Since when
+  the source sent an ETag or Last-Modified; a 304 just extends them,
+- misses (404/410, or a page the caller's `is_miss` says has no results) are
+  cached too, for the shorter STORE_EXTERNAL_CACHE_NEGATIVE_TTL, so unknown
+  ISBNs are not looked up on every run, and
+- if the source fails, an expired entry is served rather than nothing.
+
+Transient failures (429/5xx, connection errors) are never cached. Images are
+not cached here: once downloaded they are stored on the product.
+
+Entries are kept past expiry for revalidation; `manage.py prune_response_cache`
+(run it daily, e.g. from cron) deletes the ones long expired.
+"""
+import hashlib
+import logging
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+from prometheus_client import Counter
+
+from store.http_client import get_client
+from store.models import ExternalResponse
+
+logger = logging.getLogger(__name__)
+
+# Statuses that mean "this does not exist" rather than "try again later"
+NEGATIVE_STATUSES = frozenset({404, 410})
+
+EXTERNAL_CACHE_EVENTS = Counter(
+    'store_external_cache_events_total',
+    'External metadata requests by cache result (hit/miss/revalidated/stale)',
+    ['result'],
+)
+
+
+def request_url(url: str, params: dict | None = None) -> str:
+    """
+    The full URL a GET with these params would request.
+    """
+    return requests.Request('GET', url, params=params).prepare().url
+
+
+def cache_key(full_url: str) -> str:
+    return hashlib.sha256(full_url.encode('utf-8')).hexdigest()
+
+
+def _ttl(is_miss: bool) -> timedelta:
+    if is_miss:
+        return timedelta(seconds=getattr(settings, 'STORE_EXTERNAL_CACHE_NEGATIVE_TTL', 60 * 60 * 24))
+    return timedelta(seconds=getattr(settings, 'STORE_EXTERNAL_CACHE_TTL', 60 * 60 * 24 * 7))
+
+
+def _to_response(entry: ExternalResponse) -> requests.Response:
+    """
+    Rebuild a requests.Response from a cache entry, so fetchers treat both alike.
+    """
+    response = requests.Response()
+    response.status_code = entry.status_code
+    response._content = bytes(entry.content)
+    response.url = entry.url
+    response.encoding = None
+    if entry.content_type:
+        response.headers['Content-Type'] = entry.content_type
+    return response
+
+
+def _store(key, full_url, response, is_miss, now):
+    defaults = {
+        'url': full_url,
+        'status_code': response.status_code,
+        'content': response.content,
+        'content_type': response.headers.get('Content-Type', '')[:100],
+        'etag': response.headers.get('ETag', '')[:255],
+        'last_modified': response.headers.get('Last-Modified', '')[:64],
+        'is_miss': is_miss,
+        'fetched_at': now,
+        'expires_at': now + _ttl(is_miss),
+    }
+    try:
+        ExternalResponse.objects.update_or_create(key=key, defaults=defaults)
+    except IntegrityError:
+        # Another worker cached the same URL first
+        pass
+
+
+def cached_get(url: str, params: dict | None = None, headers: dict | None = None, timeout: float | None = None,
+               is_miss=None) -> requests.Response:
+    """
+    GET through the shared HTTP client, answering from / filling the cache.
+
+    Args:
+        url (str): Request URL
+        params (dict): Query parameters (part of the cache key)
+        headers (dict): Extra request headers (not part of the cache key)
+        timeout (float): Request timeout
+        is_miss (callable): Given a 200 response, True if it is a "no results"
+            page that should only be cached for the negative TTL
+
+    Returns:
+        requests.Response: Live or cached response; callers still raise_for_status()
+    """
+    full_url = request_url(url, params)
+    key = cache_key(full_url)
+    now = timezone.now()
+    entry = ExternalResponse.objects.filter(key=key).first()
+    if entry is not None and entry.expires_at > now:
+        EXTERNAL_CACHE_EVENTS.labels('hit').inc()
+        return _to_response(entry)
+
+    request_headers = dict(headers or {})
+    if entry is not None:
+        if entry.etag:
+            request_headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            request_headers['If-Modified-Since'] = entry.last_modified
+
+    kwargs = {'headers': request_headers}
+    if timeout is not None:
+        kwargs['timeout'] = timeout
+    try:
+        response = get_client().get(full_url, **kwargs)
+    except requests.RequestException as e:
+        if entry is None:
+            raise
+        logger.warning(f"Serving expired cache entry for {full_url}: {e}")
+        EXTERNAL_CACHE_EVENTS.labels('stale').inc()
+        return _to_response(entry)
+
+    if response.status_code == 304 and entry is not None:
+        entry.fetched_at = now
+        entry.expires_at = now + _ttl(entry.is_miss)
+        entry.save(update_fields=['fetched_at', 'expires_at'])
+        EXTERNAL_CACHE_EVENTS.labels('revalidated').inc()
+        return _to_response(entry)
+
+    if response.status_code == 200 or response.status_code in NEGATIVE_STATUSES:
+        miss = response.status_code in NEGATIVE_STATUSES
+        if not miss and is_miss is not None:
+            try:
+                miss = bool(is_miss(response))
+            except Exception:
+                miss = False
+        _store(key, full_url, response, miss, now)
+        EXTERNAL_CACHE_EVENTS.labels('miss').inc()
+        return response
+
+    if entry is not None:
+        logger.warning(f"Serving expired cache entry for {full_url}: HTTP {response.status_code}")
+        EXTERNAL_CACHE_EVENTS.labels('stale').inc()
+        return _to_response(entry)
+    return response
+
+
+def prune(older_than: timedelta | None = None) -> int:
+    """
+    Delete entries that expired more than older_than ago (default: one
+    positive TTL; until then they are still useful for revalidation).
+
+    Returns:
+        int: Number of entries deleted
+    """
+    cutoff = timezone.now() - (older_than if older_than is not None else _ttl(False))
+    deleted, _ = ExternalResponse.objects.filter(expires_at__lt=cutoff).delete()
+    return deleted
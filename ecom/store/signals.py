@@ -0,0 +1,22 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Product
+from .pricing import PRICE_FIELDS, bump_price_version
+
+
+@receiver(post_save, sender=Product)
+def invalidate_prices_on_save(sender, instance, update_fields=None, **kwargs):
+    """
+    Bump the catalog price version once the save commits, unless the save
+    is known to leave the price fields alone.
+    """
+    if update_fields is not None and not set(update_fields) & set(PRICE_FIELDS):
+        return
+    transaction.on_commit(bump_price_version)
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_prices_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(bump_price_version)
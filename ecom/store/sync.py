@@ -0,0 +1,194 @@
+"""
+Set-based Book -> Product sync.
+
+The sync used to run one update_or_create (a SELECT plus an INSERT or UPDATE,
+in its own transaction) per book, and rewrote every product whether or not
+anything had changed. sync_books_to_products() instead works in keyset pages
+of books:
+
+- one query loads the products matching the page (by reference, or by name
+  for books without one),
+- the desired product fields are diffed against them in memory,
+- new products go in with one bulk_create, and changed products are
+  written with bulk_update, grouped by the set of fields that changed so
+  only those columns are touched; unchanged products cost nothing.
+
+New products are put in the "Libros" category; after that the category
+belongs to the genre categorization (store/categorization.py and the admin
+action), so the sync never resets it.
+
+With `since`, only books whose updated_at is at or after it are read. The
+watermark of the last completed sync is kept in SyncState, so
+`manage.py sync_books_to_products --incremental` only looks at books changed
+since then.
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from recommendations.models import Book
+from store.models import Category, Product, SyncState
+from store.pricing import PRICE_FIELDS, bump_price_version
+
+logger = logging.getLogger(__name__)
+
+SYNC_NAME = 'books_to_products'
+CATEGORY_NAME = 'Libros'
+CATEGORY_DESCRIPTION = 'Catálogo completo de libros importados.'
+
+# Book columns the sync reads
+BOOK_FIELDS = ('id', 'reference', 'title', 'price', 'description', 'author', 'image')
+# Product columns the sync keeps in step with the book (category_id is only
+# set when the product is created)
+PRODUCT_FIELDS = ('name', 'price', 'description', 'publisher', 'image', 'reference')
+
+
+def get_category() -> tuple[Category, bool]:
+    return Category.objects.get_or_create(name=CATEGORY_NAME, defaults={'description': CATEGORY_DESCRIPTION})
+
+
+def product_values(book: dict, category_id: int) -> dict:
+    """
+    The Product field values a book maps to; category_id is for new products.
+    """
+    return {
+        'name': book['title'],
+        'price': book['price'] if book['price'] is not None else Decimal('0'),
+        'category_id': category_id,
+        'description': book['description'],
+        'publisher': book['author'],
+        'image': book['image'] or '',
+        'reference': book['reference'],
+    }
+
+
+def _current_value(product: Product, field: str):
+    value = getattr(product, field)
+    if field == 'image':
+        return value.name or ''
+    return value
+
+
+def _iter_book_pages(books, page_size: int):
+    last_id = 0
+    while True:
+        page = list(books.filter(id__gt=last_id).order_by('id').values(*BOOK_FIELDS)[:page_size])
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        last_id = page[-1]['id']
+
+
+def _match_products(page) -> tuple[dict, dict]:
+    """
+    Existing products for a page of books: ({reference: product}, {name: product}).
+    The lowest id wins when several products share a key.
+    """
+    references = {b['reference'] for b in page if b['reference']}
+    names = {b['title'] for b in page if not b['reference']}
+    by_reference = {}
+    by_name = {}
+    if references:
+        for product in Product.objects.filter(reference__in=references).order_by('-id'):
+            by_reference[product.reference] = product
+    if names:
+        for product in Product.objects.filter(name__in=names).order_by('-id'):
+            by_name[product.name] = product
+    return by_reference, by_name
+
+
+def sync_page(page, category_id: int) -> dict:
+    """
+    Create or update the products for one page of books (dicts of BOOK_FIELDS).
+
+    Returns:
+        dict: created, updated, unchanged
+    """
+    by_reference, by_name = _match_products(page)
+    to_create = []
+    to_update = defaultdict(list)
+    unchanged = 0
+    now = timezone.now()
+
+    for book in page:
+        values = product_values(book, category_id)
+        product = by_reference.get(book['reference']) if book['reference'] else by_name.get(book['title'])
+        if product is None:
+            product = Product(**values)
+            to_create.append(product)
+            # Later duplicates of the same key in this page update this product
+            if book['reference']:
+                by_reference[book['reference']] = product
+            else:
+                by_name[book['title']] = product
+            continue
+
+        changed = [field for field in PRODUCT_FIELDS if _current_value(product, field) != values[field]]
+        if not changed:
+            unchanged += 1
+            continue
+        for field in changed:
+            setattr(product, field, values[field])
+        if product.pk is None:
+            continue
+        product.updated_at = now
+        to_update[tuple(changed) + ('updated_at',)].append(product)
+
+    with transaction.atomic():
+        Product.objects.bulk_create(to_create)
+        for fields, products in to_update.items():
+            Product.objects.bulk_update(products, fields)
+        # bulk_update sends no post_save: invalidate cached prices here
+        if any(set(fields) & set(PRICE_FIELDS) for fields in to_update):
+            transaction.on_commit(bump_price_version)
+
+    return {
+        'created': len(to_create),
+        'updated': sum(len(products) for products in to_update.values()),
+        'unchanged': unchanged,
+    }
+
+
+def sync_books_to_products(since=None, page_size: int = 2000, progress=None) -> dict:
+    """
+    Sync books (all, or those updated at/after `since`) into products.
+
+    Returns:
+        dict: books, created, updated, unchanged, category_created
+    """
+    category, category_created = get_category()
+    books = Book.objects.all()
+    if since is not None:
+        books = books.filter(updated_at__gte=since)
+
+    totals = {'books': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'category_created': category_created}
+    for page in _iter_book_pages(books, page_size):
+        counts = sync_page(page, category.id)
+        totals['books'] += len(page)
+        for name, value in counts.items():
+            totals[name] += value
+        if progress:
+            progress(totals)
+    return totals
+
+
+def run_sync(incremental: bool = False, page_size: int = 2000, progress=None) -> dict:
+    """
+    Sync and advance the stored watermark. Incremental runs start from the
+    previous watermark (a full sync if there is none).
+    """
+    state, _ = SyncState.objects.get_or_create(name=SYNC_NAME)
+    since = state.watermark if incremental else None
+    # Books saved while the sync runs are picked up again next time
+    started_at = timezone.now()
+    totals = sync_books_to_products(since=since, page_size=page_size, progress=progress)
+    state.watermark = started_at
+    state.last_run_at = timezone.now()
+    state.save(update_fields=['watermark', 'last_run_at'])
+    totals['since'] = since
+    return totals
@@ -16,3 +16,14 @@ def send_email_task(subject, message, recipient_list, from_email=None):
     except Exception as e:
         logger.error(f"Failed to send email '{subject}': {e}")
         return f"Failed: {e}"
+
+
+@shared_task
+def enrich_products_task(job_id, product_ids):
+    """
+    Run a queued EnrichmentJob (see store/enrichment.py).
+    """
+    from store.enrichment import run_job
+
+    job = run_job(job_id, product_ids)
+    return f"Enrichment job {job.id} {job.status}: {job.updated}/{job.total} updated"
@@ -182,6 +182,210 @@ class CartTestCase(TestCase):
             self.assertIn('price', item)
             self.assertIn('total_price', item)
 
+    def test_cart_mutations_are_single_statements(self):
+        """add/update/remove each issue one query, with no profile UPDATE"""
+        self.client.login(username='testuser', password='testpass123')
+        request = self.client.get('/').wsgi_request
+        cart = Cart(request)
+        cart.add(product=self.product1, quantity=1)
+
+        with self.assertNumQueries(1):
+            cart.add(product=self.product2, quantity=2)
+        with self.assertNumQueries(1):
+            cart.update(product=self.product2, quantity=4)
+        with self.assertNumQueries(1):
+            cart.remove(product=self.product1)
+        self.assertEqual(cart.cart, {str(self.product2.id): {'quantity': 4}})
+
+    def test_profile_sync_is_debounced(self):
+        """Cart writes queue one background profile sync, which stores the cart as JSON"""
+        import json
+        from unittest.mock import patch
+        from django.core.cache import cache
+        from cart.cart import sync_profile_cart
+
+        cache.clear()
+        self.client.login(username='testuser', password='testpass123')
+        request = self.client.get('/').wsgi_request
+        cart = Cart(request)
+        with patch('cart.tasks.sync_profile_cart_task.apply_async') as mock_sync, \
+                self.captureOnCommitCallbacks(execute=True):
+            cart.add(product=self.product1, quantity=2)
+            cart.add(product=self.product2, quantity=1)
+        self.assertEqual(mock_sync.call_count, 1)
+
+        sync_profile_cart(self.user.id)
+        saved = json.loads(Profile.objects.get(user=self.user).old_cart)
+        self.assertEqual(saved, {str(self.product1.id): {'quantity': 2}, str(self.product2.id): {'quantity': 1}})
+
+    def test_guest_cart_merges_on_login(self):
+        """Items added as a guest join the user's saved cart when they log in"""
+        from cart.models import CartItem
+
+        CartItem.objects.create(cart_key=f'user:{self.user.id}', product=self.product1, quantity=1)
+        self.client.session.save()
+        request = self.client.get('/').wsgi_request
+        guest = Cart(request)
+        guest.add(product=self.product2, quantity=3)
+        request.session.save()
+
+        self.client.post('/login/', {'username': 'testuser', 'password': 'testpass123'})
+        cart = Cart(self.client.get('/').wsgi_request)
+
+        self.assertEqual(cart.cart, {
+            str(self.product1.id): {'quantity': 1},
+            str(self.product2.id): {'quantity': 3},
+        })
+        self.assertFalse(CartItem.objects.filter(cart_key__startswith='guest:').exists())
+
+    def test_cart_pages_query_products_once(self):
+        """The cart page and the cart API load the cart's products with a single query"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.client.session.save()
+        request = self.client.get('/').wsgi_request
+        cart = Cart(request)
+        cart.add(product=self.product1, quantity=2)
+        cart.add(product=self.product2, quantity=1)
+        request.session.save()
+
+        for url in ('/cart/', '/api/cart/'):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            product_queries = [q['sql'] for q in queries if 'FROM "store_product"' in q['sql']]
+            self.assertEqual(len(product_queries), 1, url)
+            cart_queries = [q['sql'] for q in queries if 'FROM "cart_cartitem"' in q['sql']]
+            self.assertEqual(len(cart_queries), 1, url)
+        self.assertEqual(response.json()['total'], 35.0)
+
+    def test_legacy_session_cart_is_imported(self):
+        """A session cart from before CartItem (including bare quantities) is carried over"""
+        session = self.client.session
+        session['session_key'] = {str(self.product1.id): 2, str(self.product2.id): {'quantity': 1}}
+        session.save()
+
+        cart = Cart(self.client.get('/').wsgi_request)
+
+        self.assertEqual(cart.cart[str(self.product1.id)]['quantity'], 2)
+        self.assertEqual(cart.cart[str(self.product2.id)]['quantity'], 1)
+        self.assertNotIn('session_key', cart.session)
+
+    def test_legacy_session_cart_drops_stale_and_malformed_lines(self):
+        """Deleted products, non-numeric keys and bad quantities are skipped in one INSERT"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        session = self.client.session
+        session['session_key'] = {
+            str(self.product1.id): 2, '999999': 1, 'abc': 1, str(self.product2.id): {'quantity': 0},
+        }
+        session.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            cart = Cart(self.client.get('/').wsgi_request)
+        inserts = [q['sql'] for q in queries if q['sql'].startswith('INSERT INTO "cart_cartitem"')]
+        self.assertEqual(len(inserts), 1)
+
+        self.assertEqual(cart.cart, {str(self.product1.id): {'quantity': 2}})
+
+    def test_profile_cart_migration_skips_bad_lines(self):
+        """Migration 0002 imports Profile.old_cart lines with the same filters as the session import"""
+        import importlib
+        import json
+        from django.apps import apps
+        from cart.models import CartItem
+
+        migration = importlib.import_module('cart.migrations.0002_import_profile_carts')
+        other = User.objects.create_user(username='listcart', password='testpass123')
+        Profile.objects.filter(user=self.user).update(old_cart=json.dumps({
+            str(self.product1.id): {'quantity': 2}, str(self.product2.id): -1,
+            'abc': 1, '999999': 1, str(self.product2.id + 1000): {'qty': 1},
+        }))
+        Profile.objects.filter(user=other).update(old_cart=json.dumps([self.product1.id]))
+
+        migration.import_profile_carts(apps, None)
+
+        self.assertEqual(
+            list(CartItem.objects.values_list('cart_key', 'product_id', 'quantity')),
+            [(f'user:{self.user.id}', self.product1.id, 2)],
+        )
+
+    def test_quantities_below_one(self):
+        """Adding less than one unit adds nothing; updating to zero removes the line"""
+        from cart.models import CartItem
+
+        cart = Cart(self.client.get('/').wsgi_request)
+        cart.add(self.product1, 0)
+        self.assertEqual(len(cart), 0)
+
+        cart.add(self.product1, 2)
+        cart.update(self.product1.id, 0)
+        self.assertEqual(len(cart), 0)
+        self.assertFalse(CartItem.objects.exists())
+
+        self.client.force_login(self.user)
+        response = self.client.post(
+            '/api/cart/', {'product_id': self.product1.id, 'quantity': -1}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class PricingTestCase(TestCase):
+    """Test cases for cached product prices and cart totals (store/pricing.py)"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.category = Category.objects.create(name='Pricing')
+        self.regular = Product.objects.create(name='Regular', price=Decimal('10.00'), category=self.category)
+        self.on_sale = Product.objects.create(
+            name='On sale', price=Decimal('20.00'), is_sale=True, sale_price=Decimal('15.00'), category=self.category
+        )
+
+    def test_batch_prices_use_sale_price_and_cache(self):
+        """get_prices returns effective prices with one query, then none"""
+        from store.pricing import get_prices
+
+        with self.assertNumQueries(1):
+            prices = get_prices([self.regular.id, self.on_sale.id, 999999])
+        self.assertEqual(prices, {self.regular.id: Decimal('10.00'), self.on_sale.id: Decimal('15.00')})
+        with self.assertNumQueries(0):
+            self.assertEqual(get_prices([self.on_sale.id]), {self.on_sale.id: Decimal('15.00')})
+
+    def test_cart_total_cached_until_price_changes(self):
+        """Totals are served from the cache until a Product save bumps the price version"""
+        from store.pricing import cart_total
+
+        quantities = {str(self.regular.id): {'quantity': 2}, str(self.on_sale.id): {'quantity': 1}}
+        self.assertEqual(cart_total(quantities), Decimal('35.00'))
+        with self.assertNumQueries(0):
+            self.assertEqual(cart_total(quantities), Decimal('35.00'))
+
+        self.regular.price = Decimal('12.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.regular.save()
+        self.assertEqual(cart_total(quantities), Decimal('39.00'))
+
+    def test_checkout_total_reused_by_billing(self):
+        """The total priced on the cart page is reused by later requests without loading products"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.client.session.save()
+        request = self.client.get('/').wsgi_request
+        cart = Cart(request)
+        cart.add(product=self.regular, quantity=1)
+        cart.add(product=self.on_sale, quantity=2)
+        request.session.save()
+        self.client.get('/cart/')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/payment/billing_info', {'shipping_full_name': 'Someone'})
+        self.assertContains(response, '40.00')
+        self.assertFalse([q for q in queries if 'FROM "store_product"' in q['sql']])
+
 
 class ProductModelTestCase(TestCase):
     """Test cases for Product model"""
@@ -337,3 +541,474 @@ class ProfileModelTestCase(TestCase):
         self.assertEqual(profile.phone, '555-1234')
         self.assertEqual(profile.address1, '123 Main St')
         self.assertEqual(profile.city, 'Test City')
+
+
+class EnrichmentTestCase(TestCase):
+    """Test cases for the parallel enrichment engine against a local stub server"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        import json
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import parse_qs, urlsplit
+
+        cls.hits = []
+        cls.flaky_failures = 0
+        test_case = cls
+
+        class StubHandler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                test_case.hits.append(url.path)
+                if url.path == '/flaky':
+                    if test_case.flaky_failures > 0:
+                        test_case.flaky_failures -= 1
+                        return self.send_json(503, {})
+                    return self.send_json(200, {'ok': True})
+                if url.path == '/etag':
+                    if self.headers.get('If-None-Match') == '"v1"':
+                        self.send_response(304)
+                        self.end_headers()
+                        return
+                    body = b'{"version": 1}'
+                    self.send_response(200)
+                    self.send_header('ETag', '"v1"')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                if url.path == '/down':
+                    return self.send_json(503, {})
+                if url.path == '/books/v1/volumes':
+                    isbn = parse_qs(url.query)['q'][0].split(':', 1)[1]
+                    items = [] if isbn.startswith('000') else [{'id': f'vol{isbn}'}]
+                    return self.send_json(200, {'items': items})
+                if url.path.startswith('/books/v1/volumes/vol'):
+                    return self.send_json(200, {'volumeInfo': {
+                        'dimensions': {'height': '20 cm', 'width': '13 cm', 'thickness': '2 cm'}
+                    }})
+                self.send_json(404, {})
+
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        from unittest.mock import patch
+        from django.test import override_settings
+        from store.http_client import reset_client
+
+        self.hits.clear()
+        settings_override = override_settings(
+            STORE_ENRICHMENT_RATE_PER_HOST=0, STORE_ENRICHMENT_BACKOFF_SECONDS=0, STORE_ENRICHMENT_MAX_RETRIES=2
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        reset_client()
+        self.addCleanup(reset_client)
+        api_url = patch('store.google_books.GOOGLE_BOOKS_API_URL', f'{self.base_url}/books/v1/volumes')
+        api_url.start()
+        self.addCleanup(api_url.stop)
+        self.category = Category.objects.create(name='Books', description='Books')
+
+    def test_retries_transient_errors(self):
+        """5xx responses are retried until one succeeds"""
+        from store.http_client import get_client
+
+        type(self).flaky_failures = 2
+        response = get_client().get(f'{self.base_url}/flaky')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.hits.count('/flaky'), 3)
+
+    def test_rate_limit_spaces_requests_per_host(self):
+        """Requests to one host are spaced by the per-host rate"""
+        import time
+        from store.http_client import HostRateLimiter
+
+        limiter = HostRateLimiter(rate=20)
+        start = time.monotonic()
+        for _ in range(4):
+            limiter.wait('books.example')
+        limiter.wait('other.example')
+        self.assertGreaterEqual(time.monotonic() - start, 0.15 - 0.01)
+
+    def test_run_enrichment_updates_products_in_parallel(self):
+        """Products are fetched on the pool and saved; missing keys and misses are counted"""
+        from store.enrichment import run_enrichment
+
+        found = [
+            Product.objects.create(name=f'Book {i}', category=self.category, isbn=f'97800000000{i}')
+            for i in range(5)
+        ]
+        missing = Product.objects.create(name='Unknown', category=self.category, isbn='0001234567')
+        no_isbn = Product.objects.create(name='No ISBN', category=self.category)
+
+        counts = run_enrichment(
+            'google_dimensions', [p.id for p in found] + [missing.id, no_isbn.id], workers=4, chunk_size=3
+        )
+
+        self.assertEqual(counts, {'updated': 5, 'missing_key': 1, 'not_found': 1, 'failed': 0})
+        found[0].refresh_from_db()
+        self.assertEqual(found[0].dimensions, {'height': '20 cm', 'width': '13 cm', 'thickness': '2 cm'})
+
+    def test_admin_action_queues_job(self):
+        """Admin actions record an EnrichmentJob and hand it to Celery"""
+        from unittest.mock import patch
+        from store.models import EnrichmentJob
+
+        product = Product.objects.create(name='Queued', category=self.category, isbn='9780000000001')
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'adminpass')
+        client = Client()
+        client.force_login(admin_user)
+
+        with patch('store.tasks.enrich_products_task.delay') as mock_delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                client.post('/admin/store/product/', {
+                    'action': 'fetch_dimensions_from_google_books', '_selected_action': [product.id],
+                })
+
+        job = EnrichmentJob.objects.get()
+        self.assertEqual((job.operation, job.total, job.status), ('google_dimensions', 1, EnrichmentJob.STATUS_PENDING))
+        mock_delay.assert_called_once_with(job.id, [product.id])
+
+    def test_response_cache_hit_and_revalidation(self):
+        """Fresh entries are served from the cache; expired ones are revalidated with the ETag"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from store.models import ExternalResponse
+        from store.response_cache import cached_get
+
+        url = f'{self.base_url}/etag'
+        self.assertEqual(cached_get(url).json(), {'version': 1})
+        self.assertEqual(cached_get(url).json(), {'version': 1})
+        self.assertEqual(self.hits.count('/etag'), 1)
+
+        ExternalResponse.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = cached_get(url)
+        self.assertEqual(response.json(), {'version': 1})
+        self.assertEqual(self.hits.count('/etag'), 2)
+        self.assertGreater(ExternalResponse.objects.get().expires_at, timezone.now())
+
+    def test_response_cache_remembers_misses(self):
+        """Unknown ISBNs are cached as misses with the negative TTL"""
+        from datetime import timedelta
+        from django.test import override_settings
+        from django.utils import timezone
+        from store.google_books import fetch_dimensions_by_isbn
+        from store.models import ExternalResponse
+
+        with override_settings(STORE_EXTERNAL_CACHE_NEGATIVE_TTL=60):
+            self.assertIsNone(fetch_dimensions_by_isbn('0009999999'))
+            self.assertIsNone(fetch_dimensions_by_isbn('0009999999'))
+
+        self.assertEqual(self.hits.count('/books/v1/volumes'), 1)
+        entry = ExternalResponse.objects.get()
+        self.assertTrue(entry.is_miss)
+        self.assertLess(entry.expires_at, timezone.now() + timedelta(seconds=61))
+
+    def test_response_cache_serves_stale_on_error(self):
+        """An expired entry is served when the source is failing"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from store.models import ExternalResponse
+        from store.response_cache import cache_key, cached_get
+
+        url = f'{self.base_url}/down'
+        ExternalResponse.objects.create(
+            key=cache_key(url), url=url, status_code=200, content=b'{"cached": true}',
+            fetched_at=timezone.now() - timedelta(days=30), expires_at=timezone.now() - timedelta(days=1),
+        )
+        response = cached_get(url)
+        self.assertEqual(response.json(), {'cached': True})
+        self.assertEqual(self.hits.count('/down'), 3)
+
+    def test_prune_response_cache_deletes_long_expired_entries(self):
+        """prune_response_cache drops entries (misses included) expired longer than the cutoff"""
+        from datetime import timedelta
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from store.models import ExternalResponse
+
+        now = timezone.now()
+        for name, expired_days_ago, is_miss in (('fresh', -1, False), ('recent', 2, False),
+                                                ('old', 30, False), ('old-miss', 30, True)):
+            ExternalResponse.objects.create(
+                key=name, url=name, status_code=404 if is_miss else 200, content=b'', is_miss=is_miss,
+                fetched_at=now - timedelta(days=40), expires_at=now - timedelta(days=expired_days_ago),
+            )
+
+        call_command('prune_response_cache', stdout=StringIO())
+        self.assertEqual(sorted(ExternalResponse.objects.values_list('key', flat=True)), ['fresh', 'recent'])
+
+        call_command('prune_response_cache', older_than_days=1, stdout=StringIO())
+        self.assertEqual(list(ExternalResponse.objects.values_list('key', flat=True)), ['fresh'])
+
+
+class BookProductSyncTestCase(TestCase):
+    """Test cases for the set-based Book -> Product sync"""
+
+    def setUp(self):
+        from unittest.mock import patch
+        from recommendations.models import Book
+
+        # Keep the embedding signal from queueing tasks
+        signal_task = patch('recommendations.signals.generate_embeddings_task')
+        signal_task.start()
+        self.addCleanup(signal_task.stop)
+        self.books = [
+            Book.objects.create(title=f'Synced {i}', reference=f'SYNC{i}', price=Decimal('10.00'), author='Writer')
+            for i in range(4)
+        ]
+        self.unreferenced = Book.objects.create(title='No Reference', price=Decimal('5.00'))
+
+    def test_full_sync_creates_then_only_updates_changes(self):
+        """A second sync writes only the products whose book changed"""
+        from store.sync import run_sync
+
+        totals = run_sync()
+        self.assertEqual((totals['created'], totals['updated']), (5, 0))
+        product = Product.objects.get(reference='SYNC0')
+        self.assertEqual((product.name, product.price, product.publisher), ('Synced 0', Decimal('10.00'), 'Writer'))
+        self.assertEqual(product.category.name, 'Libros')
+        self.assertTrue(Product.objects.filter(name='No Reference', reference__isnull=True).exists())
+
+        self.books[1].price = Decimal('12.50')
+        self.books[1].save()
+        # State, category, one page of books, its products (by reference and by
+        # name), one UPDATE in a savepoint, state update
+        with self.assertNumQueries(9):
+            totals = run_sync(page_size=10)
+        self.assertEqual((totals['created'], totals['updated'], totals['unchanged']), (0, 1, 4))
+        self.assertEqual(Product.objects.get(reference='SYNC1').price, Decimal('12.50'))
+
+    def test_incremental_sync_reads_only_books_after_watermark(self):
+        """--incremental only looks at books updated since the last sync"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from recommendations.models import Book
+        from store.models import SyncState
+        from store.sync import SYNC_NAME, run_sync
+
+        run_sync()
+        SyncState.objects.filter(name=SYNC_NAME).update(watermark=timezone.now() + timedelta(seconds=1))
+        Book.objects.filter(id=self.books[0].id).update(
+            title='Retitled', updated_at=timezone.now() + timedelta(seconds=2)
+        )
+        Book.objects.filter(id=self.books[2].id).update(title='Missed by incremental')
+
+        totals = run_sync(incremental=True)
+
+        self.assertEqual((totals['books'], totals['updated']), (1, 1))
+        self.assertEqual(Product.objects.get(reference='SYNC0').name, 'Retitled')
+        self.assertEqual(Product.objects.get(reference='SYNC2').name, 'Synced 2')
+
+
+    def test_sync_keeps_assigned_genres(self):
+        """A genre set by categorization survives later syncs, which then write nothing"""
+        from unittest.mock import patch
+        from recommendations.category_classifier import Prediction
+        from store.categorization import categorize_products
+        from store.sync import run_sync
+
+        run_sync()
+        products = Product.objects.filter(category__name='Libros')
+        with patch('store.categorization.classify_products',
+                   side_effect=lambda page: [Prediction('Poetry', 0.9, 0.5) for _ in page]):
+            categorize_products(products, use_llm=False)
+
+        self.books[1].price = Decimal('12.50')
+        self.books[1].save()
+        totals = run_sync()
+
+        self.assertEqual((totals['created'], totals['updated'], totals['unchanged']), (0, 1, 4))
+        self.assertEqual(
+            set(Product.objects.values_list('category__name', flat=True)), {'Poetry'}
+        )
+
+
+class CategorizationTestCase(TestCase):
+    """Test cases for the classifier-prefiltered, batched LLM categorization job"""
+
+    def setUp(self):
+        from unittest.mock import MagicMock, patch
+        import numpy as np
+        from recommendations.category_classifier import CATEGORIES, CATEGORY_DESCRIPTIONS, reset_centroid_cache
+
+        def encode(texts, **kwargs):
+            vectors = np.zeros((len(texts), 384), dtype=np.float32)
+            for row, text in enumerate(texts):
+                for index, name in enumerate(CATEGORIES):
+                    if text in (name, CATEGORY_DESCRIPTIONS[name]):
+                        vectors[row, index] = 1.0
+                if text.startswith('Dragon'):
+                    vectors[row, CATEGORIES.index('Science Fiction & Fantasy')] = 1.0
+                if text.startswith('Ambiguous'):
+                    vectors[row, CATEGORIES.index('Romance')] = 1.0
+                    vectors[row, CATEGORIES.index('History')] = 1.0
+            return vectors
+
+        self.model = MagicMock()
+        self.model.encode.side_effect = encode
+        model_patch = patch('recommendations.rag.get_sentence_transformer_model', return_value=self.model)
+        model_patch.start()
+        self.addCleanup(model_patch.stop)
+        from django.core.cache import cache
+        cache.clear()
+        reset_centroid_cache()
+        self.addCleanup(reset_centroid_cache)
+
+        self.books = Category.objects.create(name='Libros', description='Catch-all')
+        self.clear = [Product.objects.create(name=f'Dragon {i}', category=self.books) for i in range(3)]
+        self.ambiguous = [Product.objects.create(name=f'Ambiguous {i}', category=self.books) for i in range(2)]
+
+    def test_only_ambiguous_products_reach_llm_in_one_prompt(self):
+        """Clear-cut products skip the LLM; ambiguous ones share a single prompt"""
+        from unittest.mock import patch
+        from store.categorization import categorize_products
+
+        with patch('store.categorization.generate', return_value='1: History\n2: Romance') as mock_generate:
+            stats = categorize_products(Product.objects.filter(category=self.books), llm_batch_size=10)
+
+        self.assertEqual(mock_generate.call_count, 1)
+        self.assertEqual((stats['classifier'], stats['llm'], stats['llm_calls']), (3, 2, 1))
+        self.assertEqual(Product.objects.get(id=self.clear[0].id).category.name, 'Science Fiction & Fantasy')
+        self.assertEqual(Product.objects.get(id=self.ambiguous[0].id).category.name, 'History')
+        self.assertEqual(Product.objects.get(id=self.ambiguous[1].id).category.name, 'Romance')
+
+    def test_unparseable_llm_answer_falls_back_to_classifier(self):
+        """Products the LLM answer does not cover keep the classifier's guess"""
+        from unittest.mock import patch
+        from store.categorization import categorize_products
+
+        with patch('store.categorization.generate', return_value='I am not sure.'):
+            stats = categorize_products(Product.objects.filter(category=self.books))
+
+        self.assertEqual(stats['llm_fallback'], 2)
+        self.assertFalse(Product.objects.filter(category=self.books).exists())
+
+    def test_batch_answer_parsing(self):
+        """Numbered answers map to known categories; Non-Fiction is not read as Fiction"""
+        from store.categorization import parse_batch_answer
+
+        answer = "1: Non-Fiction\n2) Poetry.\n3: Cookbooks\n9: History"
+        self.assertEqual(parse_batch_answer(answer, 3), {1: 'Non-Fiction', 2: 'Poetry'})
+
+
+class CursorPaginationTestCase(TestCase):
+    """Test cases for keyset pagination of the storefront listings (store/pagination.py)"""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Listing')
+        # Repeated ranks: the id tie-breaker must keep the order total
+        self.products = [
+            Product.objects.create(name=f'Listed {i}', category=self.category, shuffle_rank=(i % 4) / 4)
+            for i in range(11)
+        ]
+
+    def walk(self, paginator):
+        pages = []
+        page = paginator.page()
+        pages.append(page)
+        while page.has_next():
+            page = paginator.page(page.next_cursor)
+            pages.append(page)
+        return pages
+
+    def test_pages_cover_every_row_once_in_order(self):
+        """Walking forwards yields each product once, in (shuffle_rank, id) order"""
+        from store.pagination import CursorPaginator
+
+        paginator = CursorPaginator(Product.objects.all(), 4, ordering=('shuffle_rank',))
+        pages = self.walk(paginator)
+
+        expected = sorted(self.products, key=lambda p: (p.shuffle_rank, p.id))
+        self.assertEqual([p.id for page in pages for p in page], [p.id for p in expected])
+        self.assertEqual([len(page) for page in pages], [4, 4, 3])
+        self.assertFalse(pages[0].has_previous())
+
+    def test_previous_cursor_returns_the_same_page(self):
+        """Going back from a page lands on exactly the page before it"""
+        from store.pagination import CursorPaginator
+
+        paginator = CursorPaginator(Product.objects.filter(category=self.category), 4, ordering=('-id',))
+        first, second, third = self.walk(paginator)
+
+        back = paginator.page(third.previous_cursor)
+        self.assertEqual([p.id for p in back], [p.id for p in second])
+        back = paginator.page(back.previous_cursor)
+        self.assertEqual([p.id for p in back], [p.id for p in first])
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        """Cursor values of the wrong type are rejected before they reach the query"""
+        import base64
+        import json
+        from store.pagination import CursorPaginator
+
+        paginator = CursorPaginator(Product.objects.all(), 4, ordering=('shuffle_rank',))
+        first = [p.id for p in paginator.page()]
+        for values in (['x', 1], [[1], 1], [0.5, None], [0.5, 'y']):
+            cursor = base64.urlsafe_b64encode(json.dumps(['n', values]).encode()).decode()
+            self.assertIsNone(paginator.decode_cursor(cursor), values)
+            self.assertEqual([p.id for p in paginator.page(cursor)], first)
+
+        cursor = base64.urlsafe_b64encode(b'["n",["x",1]]').decode()
+        self.assertEqual(self.client.get('/', {'cursor': cursor}).status_code, 200)
+
+    def test_pages_use_one_query_without_count(self):
+        """A page is a single LIMIT query; a bad cursor falls back to the first page"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from store.pagination import CursorPaginator
+
+        paginator = CursorPaginator(Product.objects.all(), 4, ordering=('shuffle_rank',))
+        cursor = paginator.page().next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            paginator.page(cursor)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT(', queries[0]['sql'].upper())
+        self.assertNotIn('RANDOM()', queries[0]['sql'].upper())
+
+        self.assertEqual(
+            [p.id for p in paginator.page('not-a-cursor')], [p.id for p in paginator.page()]
+        )
+
+    def test_listing_pages_link_with_cursors(self):
+        """Home, category and search pages render cursor links"""
+        from unittest.mock import patch
+
+        response = self.client.get('/')
+        self.assertEqual(len(response.context['products']), 8)
+        next_cursor = response.context['products'].next_cursor
+        self.assertContains(response, f'?cursor={next_cursor}')
+        response = self.client.get('/', {'cursor': next_cursor})
+        self.assertEqual(len(response.context['products']), 3)
+
+        response = self.client.get(f'/category/{self.category.name}')
+        self.assertEqual(len(response.context['products']), 8)
+
+        with patch('recommendations.rag.search_books', return_value=[]):
+            response = self.client.get('/search/', {'search': 'Listed'})
+        self.assertEqual(len(response.context['products']), 6)
+        self.assertContains(response, f"?cursor={response.context['products'].next_cursor}&search=Listed")
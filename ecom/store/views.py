@@ -1,6 +1,6 @@
 from django.shortcuts import render,redirect
 from .models import Product, Category, Profile
-from django.core.paginator import Paginator
+from .pagination import CursorPaginator
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.contrib.auth.models import User
@@ -12,8 +12,7 @@ from payment.models import ShippingAddress
 
 from django import forms
 from django.db.models import Q
-from cart.cart import Cart
-import json
+from cart.cart import get_cart
 
 def search(request):
     # Determine if they filled out the form
@@ -56,10 +55,9 @@ def search(request):
         # Original code returned empty render.
         products = []
 
-    if products:
-        paginator = Paginator(products, 6) # Show 6 products per page
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+    # Show 6 products per page, newest first
+    page_obj = CursorPaginator(products, 6, ordering=('-id',)).page(request.GET.get('cursor')) if query else None
+    if page_obj:
         return render(request, 'search.html', {'products': page_obj, 'query': query})
     else:
         # If query was present but no results found (handled above with messages)
@@ -154,10 +152,8 @@ def category(request, name):
              
     products = Product.objects.filter(category=category)
     
-    # Pagination for category page
-    paginator = Paginator(products, 8)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination for category page, newest first
+    page_obj = CursorPaginator(products, 8, ordering=('-id',)).page(request.GET.get('cursor'))
     
     return render(request, 'category.html', {'category': category, 'products': page_obj})
 def product(request, pk):
@@ -165,13 +161,12 @@ def product(request, pk):
     return render(request, 'product.html', {'product': product})
 
 def home(request):
-    # Obtener todos los productos (puedes filtrar, ordenar o paginar aquí)
-    products_list = Product.objects.all().order_by('?') # Randomize for variety or '-created_at'
+    # Shuffled by the precomputed Product.shuffle_rank, not ORDER BY RANDOM()
+    products_list = Product.objects.all()
 
     # Pagination: Show 8 products per page
-    paginator = Paginator(products_list, 8)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(products_list, 8, ordering=('shuffle_rank',))
+    page_obj = paginator.page(request.GET.get('cursor'))
 
     # ¡IMPORTANTE! Devolver la respuesta HTTP con el template
     context = {
@@ -190,21 +185,9 @@ def login_user(request):
         user = authenticate(request, username=username, password=password)
         if user is not None:
             login(request, user)
-            #Do some shopping cart magic
-            current_user = Profile.objects.get(user__id=request.user.id)
-            saved_cart = current_user.old_cart
-            if saved_cart != "{}":
-                converted_cart = json.loads(saved_cart)
-                cart = Cart(request)
-                #Loop through the cart and add items to the new cart
-                for key, value in converted_cart.items():
-                    cart.db_add(product=key, quantity=value['quantity'])
-                    #ßcart.add(int(item['product_id']), int(item['quantity']))  
-            
-
-
-
-
+            # The user's cart is stored server-side; this merges in what they
+            # added as a guest before logging in
+            get_cart(request)
 
             messages.success(request, 'Has iniciado sesión correctamente.')
             return redirect('home')